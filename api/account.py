@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Dict, Optional
 from pydantic import BaseModel, Field
 from auth import get_current_user
+from services.registry import get_registry
 import sqlite3
 import json
 from datetime import datetime
@@ -158,9 +159,9 @@ async def connect_social_account(
 ):
     """
     Collega un account social al profilo utente.
-    Supporta: facebook, instagram, twitter, linkedin.
+    Supporta le piattaforme abilitate nel registro (facebook, instagram, twitter, linkedin e plugin).
     """
-    valid_platforms = ["facebook", "instagram", "twitter", "linkedin"]
+    valid_platforms = get_registry().names()
     if platform not in valid_platforms:
         raise HTTPException(
             status_code=400, 
@@ -209,7 +210,8 @@ async def disconnect_social_account(
     Scollega un account social dal profilo utente.
     Rimuove tutti i token di accesso associati.
     """
-    valid_platforms = ["facebook", "instagram", "twitter", "linkedin"]
+    # Si può scollegare anche una piattaforma non servita da questo worker
+    valid_platforms = get_registry().available()
     if platform not in valid_platforms:
         raise HTTPException(
             status_code=400, 
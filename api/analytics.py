@@ -1,6 +1,7 @@
 import sys
 sys.path.append('/Users/matteo/Library/Python/3.9/lib/python/site-packages')
 
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
@@ -20,7 +21,7 @@ router = APIRouter(
 class AccountAnalyticsResponse(BaseModel):
     followers: int = Field(..., description="👥 Numero totale di follower")
     engagement_rate: float = Field(..., description="📈 Tasso di engagement medio (%)")
-    best_performing_post: Dict = Field(..., description="🏆 Post con migliori performance")
+    best_performing_post: Optional[Dict] = Field(None, description="🏆 Post con migliori performance")
     weekly_growth: Dict = Field(..., description="📊 Crescita settimanale")
     
     class Config:
@@ -105,6 +106,10 @@ class ReportRequest(BaseModel):
     - Migliori post del periodo
     - Crescita settimanale
     - Analisi comparativa
+
+    ### ⚡ Dati pre-aggregati:
+    Le metriche sono lette dal rollup giornaliero `analytics` (ultimi 30 giorni),
+    aggiornato a ogni scrittura di engagement e dal job di compattazione.
     """,
     responses={
         200: {
@@ -146,7 +151,7 @@ async def get_account_analytics(
     """
     engine = AnalyticsEngine()
     try:
-        return engine.get_account_analytics(account_id)
+        return await asyncio.to_thread(engine.get_account_analytics, account_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"❌ Errore nel recupero analytics: {str(e)}")
 
@@ -233,11 +238,9 @@ async def get_post_analytics(
     
     ### 📈 Contenuto del report:
     - Crescita follower nel periodo
+    - Totali di engagement, impressions e reach
+    - Andamento giorno per giorno (una riga del rollup per giorno)
     - Post con migliori performance
-    - Analisi degli orari ottimali
-    - Hashtag più efficaci
-    - Trend di engagement
-    - Confronto con periodi precedenti
     
     ### 💼 Perfetto per:
     - Presentazioni ai clienti
@@ -252,18 +255,23 @@ async def get_post_analytics(
                 "application/json": {
                     "example": {
                         "period": "30d",
-                        "summary": {
-                            "total_posts": 45,
-                            "avg_engagement": 4.2,
+                        "summary": {"followers": 15420, "engagement_rate": 4.2, "...": "..."},
+                        "totals": {
+                            "likes": 5120,
+                            "comments": 840,
+                            "shares": 517,
+                            "impressions": 182000,
+                            "reach": 96400,
                             "follower_growth": 312,
-                            "top_hashtags": ["#marketing", "#tech", "#innovation"]
+                            "engagement_rate": 4.2
                         },
-                        "detailed_metrics": "...",
-                        "recommendations": [
-                            "Pubblica più contenuti video",
-                            "Usa hashtag #tech più spesso",
-                            "Ottimizza orari di pubblicazione"
-                        ]
+                        "daily": [
+                            {"period": "2024-05-01", "followers": 15108, "impressions": 6100, "reach": 3200,
+                             "likes": 170, "comments": 28, "shares": 15, "engagement_rate": 1.41}
+                        ],
+                        "top_posts": [{"id": 123, "content": "🎉 Post di successo!", "engagement": 977}],
+                        "audience_insights": {},
+                        "recommendations": []
                     }
                 }
             }
@@ -288,7 +296,7 @@ async def generate_report(
     """
     engine = AnalyticsEngine()
     try:
-        return engine.generate_report(account_id, request.period)
+        return await asyncio.to_thread(engine.generate_report, account_id, request.period)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"❌ Errore nella generazione del report: {str(e)}")
 
@@ -302,10 +310,11 @@ async def generate_report(
     - **👥 Follower attuali** e crescita recente
     - **📈 Engagement rate** degli ultimi 7 giorni
     - **🔥 Post trend** del momento
-    - **⭐ Score generale** dell'account
+    - **👁️ Impressions e reach** degli ultimi 7 giorni
     
     ### 💨 Risposta ultra-veloce:
-    Questo endpoint è ottimizzato per prestazioni massime, ideale per:
+    Legge solo le righe degli ultimi 7 giorni del rollup giornaliero (e, con
+    `ANALYTICS_HOURLY_ROLLUP=1`, le ultime 24 righe orarie). Ideale per:
     - Dashboard in tempo reale
     - Widget di monitoraggio
     - App mobile
@@ -319,11 +328,13 @@ async def generate_report(
                     "example": {
                         "followers": 15420,
                         "engagement_rate_7d": 4.8,
+                        "impressions_7d": 42100,
+                        "reach_7d": 23800,
                         "trending_post": {
                             "id": 456,
-                            "engagement": 9.2
-                        },
-                        "account_score": 85
+                            "content": "🔥 Post del momento",
+                            "engagement": 742
+                        }
                     }
                 }
             }
@@ -337,11 +348,6 @@ async def get_account_summary(
     """Panoramica rapida per dashboard e monitoraggio veloce."""
     engine = AnalyticsEngine()
     try:
-        return {
-            "followers": 15420,
-            "engagement_rate_7d": 4.8,
-            "trending_post": {"id": 456, "engagement": 9.2},
-            "account_score": 85
-        }
+        return await asyncio.to_thread(engine.get_account_summary, account_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"❌ Errore nel summary: {str(e)}")
\ No newline at end of file
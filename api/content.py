@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from datetime import datetime
+import json
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
 from typing import List, Optional
 from pydantic import BaseModel, Field
-from services.scheduler import ContentScheduler
+from services.scheduler import ContentScheduler, encode_cursor
+from services.metrics import dispatch_lag
+from services.calendar_import import import_calendar, iter_csv_rows, iter_ndjson_rows
 from auth import get_current_user
 
 app = None
 
+MAX_BULK_POSTS = 5000
+MAX_CROSS_POST_ACCOUNTS = 100
+MAX_CALENDAR_RANGE = timedelta(days=366)
+
 router = APIRouter(
     prefix="/content", 
     tags=["📝 Gestione Contenuti"],
@@ -52,6 +60,85 @@ class PostCreate(BaseModel):
             }
         }
 
+class BulkPostCreate(BaseModel):
+    posts: List[PostCreate] = Field(
+        ...,
+        description="📅 Post del calendario da programmare",
+        min_length=1,
+        max_length=MAX_BULK_POSTS
+    )
+
+class BulkPostResponse(BaseModel):
+    count: int = Field(..., description="🔢 Numero di post programmati")
+    ids: List[int] = Field(..., description="🆔 ID dei post creati, nello stesso ordine della richiesta")
+
+class CrossPostCreate(BaseModel):
+    account_ids: List[int] = Field(
+        ...,
+        description="🆔 ID degli account su cui pubblicare",
+        example=[1, 2, 3],
+        min_length=1,
+        max_length=MAX_CROSS_POST_ACCOUNTS
+    )
+    content: str = Field(
+        ...,
+        description="📝 Testo del post, uguale per tutti gli account",
+        example="🚀 Da oggi disponibile in tutti i nostri store! #lancio",
+        min_length=1,
+        max_length=2000
+    )
+    media_urls: Optional[List[str]] = Field(None, description="🖼️ Lista di URL delle immagini/video (opzionale)")
+    scheduled_time: Optional[datetime] = Field(
+        None,
+        description="⏰ Data e ora di pubblicazione (se non specificata, tra un'ora)",
+        example="2024-06-30T14:30:00"
+    )
+
+class CrossPostResponse(BaseModel):
+    id: int = Field(..., description="🆔 ID del cross-post")
+    scheduled_time: datetime = Field(..., description="⏰ Data/ora di pubblicazione")
+    post_ids: List[int] = Field(..., description="🆔 ID dei post creati, uno per account nell'ordine della richiesta")
+
+class RecurringPostCreate(BaseModel):
+    account_id: int = Field(..., description="🆔 ID dell'account social media", example=1, ge=1)
+    content: str = Field(
+        ...,
+        description="📝 Testo del post ricorrente",
+        example="☕ Buon lunedì! Ecco le novità della settimana #monday",
+        min_length=1,
+        max_length=2000
+    )
+    media_urls: Optional[List[str]] = Field(None, description="🖼️ Lista di URL delle immagini/video (opzionale)")
+    rrule: str = Field(
+        ...,
+        description="🔁 Regola di ricorrenza RFC 5545",
+        example="FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0;BYSECOND=0;COUNT=52"
+    )
+    dtstart: Optional[datetime] = Field(
+        None,
+        description="📅 Inizio della ricorrenza (se non specificato, da adesso)",
+        example="2024-07-01T09:00:00"
+    )
+
+class RecurringPostResponse(BaseModel):
+    id: int = Field(..., description="🆔 ID della ricorrenza")
+    account_id: int = Field(..., description="🆔 ID dell'account")
+    content: str = Field(..., description="📝 Contenuto del post")
+    media_urls: List[str] = Field(..., description="🖼️ URL dei media allegati")
+    rrule: str = Field(..., description="🔁 Regola di ricorrenza")
+    dtstart: datetime = Field(..., description="📅 Inizio della ricorrenza")
+    next_occurrence: Optional[datetime] = Field(None, description="⏰ Prossima occorrenza non ancora programmata")
+    status: str = Field(..., description="📊 Stato della ricorrenza (active/completed/cancelled)")
+
+class CalendarEntry(BaseModel):
+    id: Optional[int] = Field(None, description="🆔 ID del post (assente per le occorrenze non ancora programmate)")
+    recurrence_id: Optional[int] = Field(None, description="🔁 ID della ricorrenza di origine")
+    account_id: int = Field(..., description="🆔 ID dell'account")
+    content: str = Field(..., description="📝 Contenuto del post")
+    media_urls: List[str] = Field(..., description="🖼️ URL dei media allegati")
+    scheduled_time: datetime = Field(..., description="⏰ Data/ora di pubblicazione")
+    status: str = Field(..., description="📊 Stato del post (scheduled/published/failed/recurring)")
+
 class PostResponse(BaseModel):
     id: int = Field(..., description="🆔 ID univoco del post")
     account_id: int = Field(..., description="🆔 ID dell'account")
@@ -130,6 +217,276 @@ async def schedule_post(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post(
+    "/bulk",
+    response_model=BulkPostResponse,
+    summary="📅 Programma un calendario di post",
+    description="""
+    ## 📅 Importa un intero calendario editoriale in una sola richiesta
+    
+    Pensato per le agenzie che caricano il piano mensile:
+    - **📦 Fino a 5000 post** per richiesta
+    - **✅ Validazione in un solo passaggio**: se un post non è valido nessun post viene creato
+    - **⚡ Inserimento in un'unica transazione**
+    - **🆔 ID restituiti** nello stesso ordine dei post inviati
+    
+    ### ⚠️ Note importanti:
+    - Gli account indicati devono esistere, altrimenti la richiesta viene rifiutata
+    - Se `scheduled_time` non è specificato, il post viene programmato tra un'ora
+    """,
+    responses={
+        200: {
+            "description": "✅ Calendario programmato con successo",
+            "content": {
+                "application/json": {
+                    "example": {"count": 3, "ids": [124, 125, 126]}
+                }
+            }
+        },
+        400: {"description": "❌ Account non trovati"},
+        422: {"description": "⚠️ Errore di validazione dei dati"}
+    }
+)
+async def schedule_posts_bulk(
+    request: BulkPostCreate,
+    user = Depends(get_current_user)
+):
+    """
+    Programma in blocco tutti i post di un calendario editoriale.
+    """
+    scheduler = ContentScheduler()
+    try:
+        post_ids = scheduler.schedule_posts_bulk([post.model_dump() for post in request.posts])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+    return {"count": len(post_ids), "ids": post_ids}
+
+@router.post(
+    "/cross-post",
+    response_model=CrossPostResponse,
+    summary="📣 Pubblica lo stesso post su più account",
+    description="""
+    ## 📣 Cross-posting per campagne multi-brand
+    
+    Un solo contenuto, pubblicato su tutti gli account indicati:
+    - **👥 Fino a 100 account** per richiesta, anche su piattaforme diverse
+    - **⚡ Un'unica transazione**: il contenuto viene salvato una volta sola
+    - **🖼️ Media preparati una volta** per variante di piattaforma e riutilizzati da tutti gli account
+    - **🚀 Pubblicazioni in parallelo** all'orario programmato
+    
+    ### ⚠️ Note importanti:
+    - Ogni account riceve un proprio post, con stato e statistiche indipendenti
+    - Gli account indicati devono esistere, altrimenti la richiesta viene rifiutata
+    """,
+    responses={
+        200: {
+            "description": "✅ Cross-post programmato con successo",
+            "content": {
+                "application/json": {
+                    "example": {"id": 7, "scheduled_time": "2024-06-30T14:30:00", "post_ids": [124, 125, 126]}
+                }
+            }
+        },
+        400: {"description": "❌ Account non trovati"},
+        422: {"description": "⚠️ Errore di validazione dei dati"}
+    }
+)
+async def schedule_cross_post(
+    request: CrossPostCreate,
+    user = Depends(get_current_user)
+):
+    """
+    Programma lo stesso contenuto su più account social.
+    """
+    scheduler = ContentScheduler()
+    try:
+        cross_post, post_ids = scheduler.schedule_cross_post(
+            account_ids=request.account_ids,
+            content=request.content,
+            media_urls=request.media_urls,
+            scheduled_time=request.scheduled_time
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+    return {"id": cross_post.id, "scheduled_time": cross_post.scheduled_time, "post_ids": post_ids}
+
+@router.post(
+    "/import",
+    summary="📥 Importa un calendario CSV o NDJSON",
+    description="""
+    ## 📥 Importazione in streaming di calendari di grandi dimensioni
+    
+    Carica un file CSV o NDJSON con un post per riga:
+    - **📄 CSV**: colonne `account_id`, `content`, `scheduled_time`, `media_urls` (URL separati da `|`)
+    - **🧾 NDJSON**: un oggetto JSON per riga con gli stessi campi di `POST /content/`
+    
+    ### ⚡ Come funziona:
+    - Il file viene letto riga per riga, la memoria resta costante anche con centinaia di migliaia di righe
+    - Le righe valide vengono salvate a blocchi in un'unica transazione per blocco
+    - Le righe non valide **non bloccano** l'importazione
+    
+    ### 📡 Risposta (NDJSON in streaming):
+    - `{"row": 12, "error": "..."}` per ogni riga scartata, appena trovata
+    - `{"rows": [1, 1000], "committed": 998, ...}` per ogni blocco salvato
+    - `{"summary": {...}}` alla fine dell'importazione
+    """,
+    responses={
+        200: {"description": "📡 Esiti dell'importazione in formato NDJSON"},
+        400: {"description": "❌ Formato file non supportato"}
+    }
+)
+async def import_calendar_file(
+    file: UploadFile = File(..., description="📄 Calendario in formato CSV o NDJSON"),
+    format: Optional[str] = Query(None, description="📄 Formato del file (csv/ndjson), dedotto dal nome se assente", pattern="^(csv|ndjson)$"),
+    user = Depends(get_current_user)
+):
+    """
+    Importa un calendario editoriale di grandi dimensioni.
+    """
+    file_format = format or _guess_calendar_format(file)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="❌ Formato non riconosciuto: usa un file .csv o .ndjson")
+
+    rows = iter_csv_rows(file.file) if file_format == "csv" else iter_ndjson_rows(file.file)
+    events = import_calendar(
+        rows,
+        validate=lambda data: PostCreate.model_validate(data).model_dump(),
+        scheduler=ContentScheduler()
+    )
+    return StreamingResponse(
+        (json.dumps(event, default=str) + "\n" for event in events),
+        media_type="application/x-ndjson"
+    )
+
+def _guess_calendar_format(file: UploadFile) -> Optional[str]:
+    filename = (file.filename or "").lower()
+    content_type = file.content_type or ""
+    if filename.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if filename.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+@router.post(
+    "/recurring",
+    response_model=RecurringPostResponse,
+    summary="🔁 Crea un post ricorrente",
+    description="""
+    ## 🔁 Programma un post che si ripete nel tempo
+    
+    Salva una sola regola invece di decine di post:
+    - **📅 Regole RFC 5545**: es. `FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0;BYSECOND=0` = ogni lunedì alle 9:00
+    - **⏳ Fine opzionale** con `COUNT` o `UNTIL`
+    - **⚡ Nessun post creato in anticipo**: ogni occorrenza viene programmata solo poco prima della pubblicazione
+    
+    ### 💡 Esempi:
+    - Ogni giorno alle 18:00: `FREQ=DAILY;BYHOUR=18;BYMINUTE=0;BYSECOND=0`
+    - Primo venerdì del mese: `FREQ=MONTHLY;BYDAY=1FR;BYHOUR=10;BYMINUTE=0;BYSECOND=0`
+    """,
+    responses={
+        400: {"description": "❌ Regola non valida o account non trovato"}
+    }
+)
+async def create_recurring_post(
+    request: RecurringPostCreate,
+    user = Depends(get_current_user)
+):
+    """
+    Crea una ricorrenza di pubblicazione.
+    """
+    scheduler = ContentScheduler()
+    try:
+        return scheduler.create_recurring_post(
+            account_id=request.account_id,
+            content=request.content,
+            rrule=request.rrule,
+            dtstart=request.dtstart,
+            media_urls=request.media_urls
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+
+@router.delete(
+    "/recurring/{recurrence_id}",
+    summary="🛑 Interrompi un post ricorrente",
+    description="""
+    ## 🛑 Interrompi una ricorrenza
+    
+    - Nessuna nuova occorrenza verrà programmata
+    - Le occorrenze già programmate ma non pubblicate vengono annullate
+    - I post già pubblicati restano invariati
+    """,
+    responses={
+        404: {"description": "❌ Ricorrenza non trovata o già interrotta"}
+    }
+)
+async def cancel_recurring_post(
+    recurrence_id: int,
+    user = Depends(get_current_user)
+):
+    """
+    Interrompe una ricorrenza.
+    """
+    scheduler = ContentScheduler()
+    if not scheduler.cancel_recurring_post(recurrence_id):
+        raise HTTPException(status_code=404, detail="❌ Ricorrenza non trovata o già interrotta")
+    return {"message": "✅ Ricorrenza interrotta"}
+
+@router.get(
+    "/{account_id}/calendar",
+    response_model=List[CalendarEntry],
+    summary="🗓️ Calendario con post ricorrenti",
+    description="""
+    ## 🗓️ Calendario completo di un periodo
+    
+    Restituisce i post programmati nell'intervallo **più** le occorrenze future dei post ricorrenti,
+    calcolate al momento solo per il periodo richiesto.
+    
+    ### ⚠️ Note importanti:
+    - L'intervallo massimo è di un anno
+    - Le occorrenze non ancora programmate hanno `id` nullo e stato `recurring`
+    """,
+    responses={
+        400: {"description": "❌ Intervallo non valido"}
+    }
+)
+async def get_calendar(
+    account_id: int,
+    start_time: datetime = Query(..., description="📅 Inizio del periodo"),
+    end_time: datetime = Query(..., description="📅 Fine del periodo"),
+    user = Depends(get_current_user)
+):
+    """
+    Calendario dell'account con le ricorrenze espanse.
+    """
+    if end_time < start_time or end_time - start_time > MAX_CALENDAR_RANGE:
+        raise HTTPException(status_code=400, detail="❌ Intervallo non valido: massimo un anno")
+    scheduler = ContentScheduler()
+    return scheduler.get_calendar(account_id, start_time, end_time)
+
+@router.get(
+    "/scheduler/metrics",
+    summary="⏱️ Metriche dello scheduler",
+    description="""
+    ## ⏱️ Precisione e carico dello scheduler
+    
+    Restituisce lo stato della coda di pubblicazione di questo worker:
+    - **📥 queue_depth**: post caricati in memoria in attesa di scadenza
+    - **🪟 loaded_until**: fine della finestra di post caricata dal database
+    - **⏰ next_due**: prossimo post in scadenza
+    - **🐢 dispatch_lag**: ritardo tra `scheduled_time` e pubblicazione effettiva (p50/p95/p99/max)
+    """
+)
+async def get_scheduler_metrics(user = Depends(get_current_user)):
+    """Metriche di precisione della pubblicazione programmata."""
+    scheduler = ContentScheduler()
+    return {
+        "queue_depth": len(scheduler.queue),
+        "loaded_until": scheduler.queue.loaded_until,
+        "next_due": scheduler.queue.peek_time(),
+        "dispatch_lag": dispatch_lag.snapshot()
+    }
+
 @router.get(
     "/{account_id}", 
     response_model=List[PostResponse],
@@ -143,6 +500,11 @@ async def schedule_post(
     - **📊 Monitorare lo stato** dei post (pubblicati, programmati, falliti)
     - **⏰ Pianificare meglio** i contenuti futuri
     
+    ### 📄 Paginazione:
+    - I post sono restituiti a pagine di `limit` elementi in ordine di `scheduled_time`
+    - Se ci sono altri post, l'header `X-Next-Cursor` contiene il cursore della pagina successiva
+    - Passa il cursore nel parametro `cursor` mantenendo gli stessi filtri
+    
     ### 💡 Suggerimenti:
     - Usa i filtri di data per vedere solo i post di un periodo specifico
     - Controlla regolarmente lo stato dei post programmati
@@ -180,6 +542,10 @@ async def get_scheduled_posts(
     account_id: int,
     start_time: Optional[datetime] = Query(None, description="📅 Data/ora di inizio filtro (opzionale)"),
     end_time: Optional[datetime] = Query(None, description="📅 Data/ora di fine filtro (opzionale)"),
+    status: Optional[str] = Query(None, description="📊 Filtra per stato del post (opzionale)"),
+    cursor: Optional[str] = Query(None, description="📄 Cursore della pagina successiva (header X-Next-Cursor)"),
+    limit: int = Query(100, description="🔢 Numero massimo di post per pagina", ge=1, le=500),
+    response: Response = None,
     user = Depends(get_current_user)
 ):
     """
@@ -191,11 +557,22 @@ async def get_scheduled_posts(
     - Pianificare nuovi contenuti
     """
     scheduler = ContentScheduler()
-    return scheduler.get_scheduled_posts(
-        account_id=account_id,
-        start_time=start_time,
-        end_time=end_time
-    )
+    try:
+        posts = scheduler.get_scheduled_posts(
+            account_id=account_id,
+            start_time=start_time,
+            end_time=end_time,
+            status=status,
+            cursor=cursor,
+            limit=limit + 1
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+
+    if len(posts) > limit:
+        posts = posts[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(posts[-1])
+    return posts
 
 @router.delete(
     "/{post_id}",
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
-from services.platforms import PlatformManager
+from services.platforms import get_platform_manager
+from services.registry import get_registry
+from services.sync import SYNC_RESOURCES, get_sync_manager
 from auth import get_current_user
 
+MAX_INSIGHTS_BATCH = 500
+
 router = APIRouter(
     prefix="/platforms", 
     tags=["🌐 Piattaforme Social"],
@@ -73,6 +79,15 @@ class PostRequest(BaseModel):
             }
         }
 
+class InsightsBatchRequest(BaseModel):
+    account_ids: List[int] = Field(
+        ...,
+        description="🆔 ID degli account di cui recuperare gli insights",
+        example=[1, 2, 3],
+        min_length=1,
+        max_length=MAX_INSIGHTS_BATCH
+    )
+
 @router.post(
     "/connect",
     summary="🔗 Connetti account social",
@@ -135,7 +150,7 @@ async def connect_account(
     - Gestire multiple piattaforme da un'unica dashboard
     - Programmare post multi-piattaforma
     """
-    manager = PlatformManager()
+    manager = get_platform_manager()
     try:
         return manager.connect_account(request.platform, request.auth_data)
     except Exception as e:
@@ -205,9 +220,9 @@ async def post_content(
     - Cross-posting ottimizzato
     - Campagne coordinate
     """
-    manager = PlatformManager()
+    manager = get_platform_manager()
     try:
-        return manager.post_content(account_id, request.content, request.media_urls)
+        return await manager.post_content(account_id, request.content, request.media_urls)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"❌ Errore pubblicazione: {str(e)}")
 
@@ -291,8 +306,176 @@ async def get_insights(
     - Audience analysis e targeting
     - Competitive benchmarking
     """
-    manager = PlatformManager()
+    manager = get_platform_manager()
     try:
-        return manager.get_insights(account_id)
+        return await manager.get_insights(account_id)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"❌ Errore recupero insights: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"❌ Errore recupero insights: {str(e)}")
+
+@router.post(
+    "/insights/batch",
+    summary="📊 Insights di più account in una richiesta",
+    description="""
+    ## 📊 Insights in blocco per dashboard multi-account
+    
+    Pensato per le agenzie che gestiscono centinaia di account:
+    - **👥 Fino a 500 account** per richiesta
+    - **⚡ Richieste in parallelo** verso le piattaforme, con un limite di concorrenza
+    - **📡 Risultati in streaming**: ogni account arriva appena pronto, senza attendere i più lenti
+    - **🛡️ Errori parziali**: un account in errore non blocca gli altri
+    
+    ### 📡 Risposta (NDJSON in streaming):
+    - `{"account_id": 1, "platform": "instagram", "insights": {...}}` per ogni account riuscito
+    - `{"account_id": 2, "error": "..."}` per ogni account in errore
+    - `{"summary": {...}}` alla fine
+    """,
+    responses={
+        200: {"description": "📡 Insights in formato NDJSON"},
+        422: {"description": "⚠️ Errore di validazione dei dati"}
+    }
+)
+async def get_insights_batch(
+    request: InsightsBatchRequest,
+    user = Depends(get_current_user)
+):
+    """
+    Recupera gli insights di più account in parallelo.
+    """
+    manager = get_platform_manager()
+
+    async def events():
+        succeeded = failed = 0
+        async for result in manager.iter_insights(request.account_ids):
+            if "error" in result:
+                failed += 1
+            else:
+                succeeded += 1
+            yield json.dumps(result, default=str) + "\n"
+        yield json.dumps({"summary": {"accounts": succeeded + failed, "succeeded": succeeded, "failed": failed}}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.post(
+    "/{account_id}/sync",
+    summary="🔄 Sincronizza post, metriche e commenti",
+    description="""
+    ## 🔄 Sincronizzazione incrementale dell'account
+    
+    Importa dalla piattaforma solo ciò che è cambiato dall'ultima sincronizzazione:
+    - **📝 Post**: solo quelli successivi all'ultimo importato (anche pubblicati fuori dall'app)
+    - **📊 Metriche**: like, commenti e condivisioni dei post degli ultimi 7 giorni, lette a blocchi
+    - **💬 Commenti**: solo per i post il cui numero di commenti è aumentato
+    
+    ### ⚡ Costo contenuto:
+    - La posizione raggiunta viene salvata per account e risorsa
+    - Un account grande costa poche chiamate invece di una rilettura completa
+    - Le sincronizzazioni contemporanee dello stesso account vengono unite
+    
+    La sincronizzazione viene eseguita anche in automatico in background.
+    """,
+    responses={
+        200: {
+            "description": "✅ Sincronizzazione completata",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "account_id": 1,
+                        "platform": "twitter",
+                        "posts_imported": 3,
+                        "metrics_updated": 12,
+                        "comments_imported": 5
+                    }
+                }
+            }
+        },
+        400: {"description": "❌ Errore di sincronizzazione"}
+    }
+)
+async def sync_account(
+    account_id: int,
+    resources: List[str] = Query(list(SYNC_RESOURCES), description="🧩 Risorse da sincronizzare: posts, metrics, comments"),
+    user = Depends(get_current_user)
+):
+    """
+    Sincronizza in modo incrementale post, metriche e commenti dell'account.
+    """
+    unknown = set(resources) - set(SYNC_RESOURCES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"❌ Risorse non valide: {', '.join(sorted(unknown))}")
+    try:
+        return await get_sync_manager().sync_account(account_id, resources)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"❌ Errore sincronizzazione: {str(e)}")
+
+@router.get(
+    "/status",
+    summary="🚦 Stato delle piattaforme",
+    description="""
+    ## 🚦 Salute delle integrazioni
+    
+    Per ogni piattaforma già usata dal processo:
+    - **🔌 Circuit breaker**: `closed` (ok), `open` (chiamate rifiutate subito), `half_open` (prova in corso)
+    - **❌ Errori consecutivi** registrati
+    - **🧱 Bulkhead**: chiamate in corso, in attesa e limite
+    """,
+    responses={
+        200: {
+            "description": "✅ Stato delle piattaforme",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "instagram": {"state": "open", "consecutive_failures": 5, "in_flight": 0, "waiting": 0, "limit": 8},
+                        "twitter": {"state": "closed", "consecutive_failures": 0, "in_flight": 3, "waiting": 0, "limit": 16}
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_platform_status(
+    user = Depends(get_current_user)
+):
+    """
+    Restituisce lo stato di circuit breaker e bulkhead per piattaforma.
+    """
+    return get_platform_manager().health()
+
+@router.get(
+    "/available",
+    summary="🧩 Piattaforme disponibili",
+    description="""
+    ## 🧩 Registro delle piattaforme
+    
+    Piattaforme servite da questo worker (incluse e installate come plugin), ciascuna con:
+    - **⚙️ Funzionalità**: `publish`, `insights`, `sync`, `media_upload`, `token_refresh`
+    - **🚦 Limiti**: richieste all'ora per account, chiamate contemporanee, pubblicazioni al secondo
+    - **🖼️ Vincoli sui media**: tipi accettati, dimensioni massime, media per post
+    - **📝 Lunghezza massima** del testo
+    
+    Con `ENABLED_PLATFORMS` un worker serve (e importa) solo le piattaforme indicate.
+    """,
+    responses={
+        200: {
+            "description": "✅ Piattaforme disponibili",
+            "content": {
+                "application/json": {
+                    "example": [{
+                        "name": "twitter",
+                        "capabilities": ["insights", "media_upload", "publish", "sync", "token_refresh"],
+                        "limits": {"rate_limit_per_hour": 900, "bulkhead_size": 16, "publish_rate": 5},
+                        "media": {"variant": "web", "types": ["image/jpeg", "video/mp4"], "max_image_bytes": 5242880, "max_video_bytes": 536870912, "max_items": 4},
+                        "max_text_length": 280
+                    }]
+                }
+            }
+        }
+    }
+)
+async def get_available_platforms(
+    user = Depends(get_current_user)
+):
+    """
+    Elenca le piattaforme abilitate con funzionalità, limiti e vincoli sui media.
+    """
+    registry = get_registry()
+    return [registry.spec(name).describe() for name in registry.names()]
@@ -0,0 +1,88 @@
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from services.webhook_events import (SUPPORTED_WEBHOOK_PLATFORMS, challenge_response, delivery_id, parse_events,
+                                     verify_signature)
+from services.webhooks import webhook_buffer
+
+router = APIRouter(
+    prefix="/webhooks",
+    tags=["📡 Webhook"],
+    responses={
+        401: {"description": "Firma non valida"},
+        404: {"description": "Piattaforma non supportata"}
+    }
+)
+
+def _check_platform(platform: str):
+    if platform not in SUPPORTED_WEBHOOK_PLATFORMS:
+        raise HTTPException(status_code=404, detail=f"❌ Webhook non supportato per {platform}")
+
+@router.get(
+    "/{platform}",
+    summary="🤝 Verifica dell'endpoint webhook",
+    description="""
+    ## 🤝 Handshake di registrazione
+
+    Chiamato dalla piattaforma quando si registra o riconvalida il webhook:
+    - **📘📸 Meta**: restituisce `hub.challenge` se `hub.verify_token` coincide con `WEBHOOK_VERIFY_TOKEN`
+    - **🐦 Twitter**: risposta CRC `response_token` firmata con il segreto dell'app
+    - **💼 LinkedIn**: `challengeResponse` firmata con il segreto dell'app
+    """,
+    responses={
+        200: {"description": "✅ Endpoint verificato"},
+        403: {"description": "❌ Verifica non valida"}
+    }
+)
+async def verify_webhook(platform: str, request: Request):
+    """
+    Risponde all'handshake di verifica della piattaforma.
+    """
+    _check_platform(platform)
+    response = challenge_response(platform, request.query_params)
+    if response is None:
+        raise HTTPException(status_code=403, detail="❌ Verifica del webhook non valida")
+    if isinstance(response, str):
+        return PlainTextResponse(response)
+    return response
+
+@router.post(
+    "/{platform}",
+    summary="📥 Ricezione eventi push",
+    description="""
+    ## 📥 Eventi di engagement in tempo reale
+
+    Riceve like, commenti e condivisioni inviati dalla piattaforma:
+    - **🔐 Firma**: il corpo deve essere firmato (HMAC-SHA256) con il segreto dell'app
+    - **⚡ Risposta immediata**: gli eventi vengono messi in un buffer e la piattaforma riceve subito 200,
+      anche se la scrittura nel database non riesce (gli eventi restano nel buffer)
+    - **🔁 Reinvii**: una consegna ripetuta (stesso corpo) non viene contata due volte
+    - **📦 Scrittura a blocchi**: gli eventi di uno stesso post vengono sommati e scritti insieme in `engagements`
+    - **🔔 Notifiche**: una notifica riepilogativa per utente e blocco, non una per like
+
+    Le risorse ricevute via webhook non vengono più lette dalla sincronizzazione periodica
+    per le piattaforme elencate in `WEBHOOK_PUSH_PLATFORMS`.
+    """,
+    responses={
+        200: {
+            "description": "✅ Eventi accettati",
+            "content": {"application/json": {"example": {"received": 3, "duplicate": False}}}
+        },
+        400: {"description": "❌ Corpo non valido"}
+    }
+)
+async def receive_webhook(platform: str, request: Request):
+    """
+    Verifica la firma e accoda gli eventi per la scrittura a blocchi.
+    """
+    _check_platform(platform)
+    body = await request.body()
+    if not verify_signature(platform, body, request.headers):
+        raise HTTPException(status_code=401, detail="❌ Firma del webhook non valida")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="❌ Corpo del webhook non valido")
+    events = parse_events(platform, payload)
+    accepted = await webhook_buffer.add(events, delivery_id=delivery_id(platform, body))
+    return {"received": len(events), "duplicate": not accepted}
@@ -13,20 +13,130 @@ CREATE TABLE social_accounts (
     platform VARCHAR(50) NOT NULL,
     access_token TEXT NOT NULL,
     refresh_token TEXT,
+    token_expires_at TIMESTAMP,
     last_sync TIMESTAMP,
     UNIQUE(user_id, platform)
 );
 
-CREATE TABLE scheduled_posts (
+CREATE TABLE recurring_posts (
     id SERIAL PRIMARY KEY,
     account_id INT REFERENCES social_accounts(id),
     content TEXT NOT NULL,
     media_urls TEXT[],
+    rrule TEXT NOT NULL,
+    dtstart TIMESTAMP NOT NULL,
+    next_occurrence TIMESTAMP,
+    status VARCHAR(20) DEFAULT 'active',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ix_recurring_posts_next_occurrence ON recurring_posts(next_occurrence);
+
+CREATE TABLE cross_posts (
+    id SERIAL PRIMARY KEY,
+    content TEXT NOT NULL,
+    media_urls TEXT[],
+    scheduled_time TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE scheduled_posts (
+    id SERIAL PRIMARY KEY,
+    account_id INT REFERENCES social_accounts(id),
+    -- NULL per i post di un cross-post: contenuto e media stanno in cross_posts
+    content TEXT,
+    media_urls TEXT[],
     scheduled_time TIMESTAMP NOT NULL,
     status VARCHAR(20) DEFAULT 'scheduled',
+    claimed_by VARCHAR(255),
+    lease_expires_at TIMESTAMP,
+    recurrence_id INT REFERENCES recurring_posts(id),
+    cross_post_id INT REFERENCES cross_posts(id),
+    idempotency_key VARCHAR(64) UNIQUE,
+    attempts INT DEFAULT 0,
+    next_attempt_at TIMESTAMP,
+    last_error TEXT,
+    platform_post_id VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX ix_scheduled_posts_status_time ON scheduled_posts(status, scheduled_time);
+CREATE INDEX ix_scheduled_posts_account_time_status ON scheduled_posts(account_id, scheduled_time, status);
+CREATE UNIQUE INDEX ux_scheduled_posts_recurrence_time ON scheduled_posts(recurrence_id, scheduled_time);
+CREATE INDEX ix_scheduled_posts_cross_post_id ON scheduled_posts(cross_post_id);
+CREATE INDEX ix_scheduled_posts_status_next_attempt ON scheduled_posts(status, next_attempt_at);
+CREATE UNIQUE INDEX ux_scheduled_posts_account_platform_post ON scheduled_posts(account_id, platform_post_id);
+
+CREATE TABLE dead_letters (
+    id SERIAL PRIMARY KEY,
+    post_id INT REFERENCES scheduled_posts(id),
+    account_id INT REFERENCES social_accounts(id),
+    attempts INT,
+    error TEXT,
+    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ix_dead_letters_post_id ON dead_letters(post_id);
+
+CREATE TABLE sync_cursors (
+    id SERIAL PRIMARY KEY,
+    account_id INT REFERENCES social_accounts(id),
+    resource VARCHAR(20) NOT NULL,
+    cursor JSONB DEFAULT '{}',
+    watermark TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(account_id, resource)
+);
+
+CREATE TABLE job_leases (
+    name VARCHAR(50) PRIMARY KEY,
+    holder VARCHAR(255),
+    expires_at TIMESTAMP
+);
+
+CREATE TABLE post_comments (
+    id SERIAL PRIMARY KEY,
+    post_id INT REFERENCES scheduled_posts(id),
+    platform_comment_id VARCHAR(255) NOT NULL,
+    author VARCHAR(255),
+    text TEXT,
+    created_at TIMESTAMP,
+    UNIQUE(post_id, platform_comment_id)
+);
+
+CREATE TABLE webhook_deliveries (
+    id SERIAL PRIMARY KEY,
+    delivery_id VARCHAR(255) UNIQUE NOT NULL,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ix_webhook_deliveries_received_at ON webhook_deliveries(received_at);
+
+CREATE TABLE webhook_dead_letters (
+    id SERIAL PRIMARY KEY,
+    platform VARCHAR(50),
+    delivery_id VARCHAR(255),
+    events JSONB,
+    attempts INT,
+    error TEXT,
+    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE media_uploads (
+    id SERIAL PRIMARY KEY,
+    account_id INT REFERENCES social_accounts(id),
+    media_url TEXT NOT NULL,
+    total_bytes BIGINT NOT NULL,
+    bytes_acknowledged BIGINT DEFAULT 0,
+    upload_state JSONB DEFAULT '{}',
+    status VARCHAR(20) DEFAULT 'in_progress',
+    platform_media_id VARCHAR(255),
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(account_id, media_url)
+);
+
 CREATE TABLE engagements (
     id SERIAL PRIMARY KEY,
     post_id INT REFERENCES scheduled_posts(id),
@@ -57,10 +167,28 @@ CREATE TABLE analytics (
     followers INT,
     impressions INT,
     reach INT,
+    likes INT DEFAULT 0,
+    comments INT DEFAULT 0,
+    shares INT DEFAULT 0,
     engagement_rate FLOAT,
+    updated_at TIMESTAMP,
     UNIQUE(account_id, metric_date)
 );
 
+CREATE TABLE analytics_hourly (
+    id SERIAL PRIMARY KEY,
+    account_id INT REFERENCES social_accounts(id),
+    metric_hour TIMESTAMP NOT NULL,
+    followers INT,
+    impressions INT,
+    reach INT,
+    likes INT DEFAULT 0,
+    comments INT DEFAULT 0,
+    shares INT DEFAULT 0,
+    updated_at TIMESTAMP,
+    UNIQUE(account_id, metric_hour)
+);
+
 CREATE TABLE user_preferences (
     id SERIAL PRIMARY KEY,
     user_id INT REFERENCES users(id) ON DELETE CASCADE,
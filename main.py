@@ -1,3 +1,4 @@
+import asyncio
 <<<<<<< HEAD
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
@@ -18,6 +19,16 @@ import api.analytics
 import api.platforms
 import api.dashboard, api.ui
 import api.account
+import api.webhooks
+from services.scheduler import ContentScheduler
+from services.dispatcher import PublishDispatcher
+from services.media_prep import MEDIA_PREPARED_DIR, MediaPreparer
+from services.http import transport
+from services.platforms import get_platform_manager
+from services.sync import get_sync_manager
+from services.rollup import get_analytics_rollup
+from services.webhooks import webhook_buffer
+from services.smoothing import BurstSmoother
 
 # Descrizione dettagliata per la documentazione API
 description = """
@@ -100,6 +111,8 @@ templates = Jinja2Templates(directory="templates")
 
 # Monta i file statici per CSS personalizzato
 app.mount("/static", StaticFiles(directory="static"), name="static")
+# Media preparati per le piattaforme che li scaricano da un URL (MEDIA_PUBLIC_URL)
+app.mount("/media/prepared", StaticFiles(directory=MEDIA_PREPARED_DIR, check_dir=False), name="prepared-media")
 
 # CSS personalizzato per Swagger UI
 def custom_swagger_ui_html(*, title: str = "API Docs") -> str:
@@ -205,6 +218,41 @@ app.include_router(api.analytics.router)
 app.include_router(api.platforms.router)
 app.include_router(api.dashboard.router)
 app.include_router(api.account.router)
+app.include_router(api.webhooks.router)
+
+@app.on_event("startup")
+async def start_scheduler():
+    # Ricostruisce la coda di pubblicazione dopo un riavvio
+    scheduler = ContentScheduler()
+    scheduler.load_queue()
+
+    smoother = BurstSmoother()
+    app.state.dispatcher = PublishDispatcher(
+        smoother=smoother if smoother.enabled else None,
+        preparer=MediaPreparer()
+    )
+    await app.state.dispatcher.start()
+    app.state.scheduler_task = asyncio.create_task(scheduler.run(app.state.dispatcher))
+    app.state.retry_task = asyncio.create_task(scheduler.run_retries(app.state.dispatcher))
+    app.state.lease_task = asyncio.create_task(scheduler.run_leases())
+    app.state.token_task = asyncio.create_task(get_platform_manager().tokens.run())
+    app.state.sync_task = asyncio.create_task(get_sync_manager().run())
+    app.state.webhook_task = asyncio.create_task(webhook_buffer.run())
+    app.state.rollup_task = asyncio.create_task(get_analytics_rollup().run())
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    app.state.scheduler_task.cancel()
+    app.state.retry_task.cancel()
+    app.state.lease_task.cancel()
+    app.state.token_task.cancel()
+    app.state.sync_task.cancel()
+    app.state.webhook_task.cancel()
+    app.state.rollup_task.cancel()
+    # Gli eventi ricevuti ma non ancora scritti non vanno persi
+    await webhook_buffer.flush()
+    await app.state.dispatcher.stop()
+    await transport.aclose()
 
 @app.get("/", response_class=HTMLResponse)
 <<<<<<< HEAD
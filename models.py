@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Boolean, JSON
+import uuid
+from sqlalchemy import BigInteger, Column, Integer, String, Date, DateTime, Float, ForeignKey, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -18,6 +19,7 @@ class SocialAccount(Base):
     platform = Column(String)
     access_token = Column(String)
     refresh_token = Column(String)
+    token_expires_at = Column(DateTime, index=True)
     last_sync = Column(DateTime)
     
     user = relationship("User", back_populates="accounts")
@@ -27,14 +29,152 @@ class ScheduledPost(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    # Vuoti nei post di un cross-post: si leggono da cross_posts (vedi resolve_shared_content)
     content = Column(String)
+    media_urls = Column(JSON, default=[])
     scheduled_time = Column(DateTime)
-    status = Column(String)
+    status = Column(String, default="scheduled")
+    claimed_by = Column(String)
+    lease_expires_at = Column(DateTime)
+    recurrence_id = Column(Integer, ForeignKey("recurring_posts.id"))
+    cross_post_id = Column(Integer, ForeignKey("cross_posts.id"), index=True)
+    # Chiave inviata a ogni tentativo (header Idempotency-Key, rispettato solo dal server simulato)
+    idempotency_key = Column(String, unique=True, default=lambda: uuid.uuid4().hex)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(String)
+    # ID del post sulla piattaforma, per abbinare i dati sincronizzati
+    platform_post_id = Column(String)
     
     account = relationship("SocialAccount", back_populates="posts")
+    cross_post = relationship("CrossPost")
     engagements = relationship("Engagement", back_populates="post")
     hashtags = relationship("PostHashtag", back_populates="post")
 
+    __table_args__ = (
+        Index("ix_scheduled_posts_status_time", "status", "scheduled_time"),
+        Index("ix_scheduled_posts_account_time_status", "account_id", "scheduled_time", "status"),
+        # Un'occorrenza di una ricorrenza viene materializzata una sola volta
+        Index("ux_scheduled_posts_recurrence_time", "recurrence_id", "scheduled_time", unique=True),
+        Index("ix_scheduled_posts_status_next_attempt", "status", "next_attempt_at"),
+        Index("ux_scheduled_posts_account_platform_post", "account_id", "platform_post_id", unique=True),
+    )
+
+class RecurringPost(Base):
+    __tablename__ = "recurring_posts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    content = Column(String)
+    media_urls = Column(JSON, default=[])
+    rrule = Column(String)
+    dtstart = Column(DateTime)
+    # Prossima occorrenza non ancora trasformata in ScheduledPost
+    next_occurrence = Column(DateTime, index=True)
+    status = Column(String, default="active")
+    created_at = Column(DateTime)
+
+class CrossPost(Base):
+    __tablename__ = "cross_posts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content = Column(String)
+    media_urls = Column(JSON, default=[])
+    scheduled_time = Column(DateTime)
+    created_at = Column(DateTime)
+
+class DeadLetter(Base):
+    __tablename__ = "dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("scheduled_posts.id"), index=True)
+    account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    attempts = Column(Integer)
+    error = Column(String)
+    failed_at = Column(DateTime)
+
+class SyncCursor(Base):
+    __tablename__ = "sync_cursors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    # posts, metrics o comments
+    resource = Column(String)
+    # Stato di paginazione proprio della piattaforma (since_id, token di pagina...)
+    cursor = Column(JSON, default={})
+    # Dati più recenti già importati
+    watermark = Column(DateTime)
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ux_sync_cursors_account_resource", "account_id", "resource", unique=True),
+    )
+
+class JobLease(Base):
+    __tablename__ = "job_leases"
+
+    # Job periodico eseguito da un solo worker alla volta (es. compattazione analytics)
+    name = Column(String, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
+
+class PostComment(Base):
+    __tablename__ = "post_comments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("scheduled_posts.id"))
+    platform_comment_id = Column(String)
+    author = Column(String)
+    text = Column(String)
+    created_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ux_post_comments_post_platform_comment", "post_id", "platform_comment_id", unique=True),
+    )
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Piattaforma e hash del corpo: una consegna ripetuta ha lo stesso corpo
+    delivery_id = Column(String, unique=True)
+    received_at = Column(DateTime, index=True)
+
+class WebhookDeadLetter(Base):
+    __tablename__ = "webhook_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    platform = Column(String)
+    delivery_id = Column(String)
+    events = Column(JSON)
+    attempts = Column(Integer)
+    error = Column(String)
+    failed_at = Column(DateTime)
+
+class MediaUpload(Base):
+    __tablename__ = "media_uploads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    # Media dello store (percorso preparato o URL)
+    media_url = Column(String)
+    total_bytes = Column(BigInteger)
+    # Byte confermati dalla piattaforma: un caricamento interrotto riparte da qui
+    bytes_acknowledged = Column(BigInteger, default=0)
+    # Sessione di caricamento propria della piattaforma (ID, URL dei blocchi...)
+    upload_state = Column(JSON, default={})
+    # in_progress o completed
+    status = Column(String, default="in_progress")
+    # Riferimento al media da allegare al post, e fino a quando è valido
+    platform_media_id = Column(String)
+    expires_at = Column(DateTime)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ux_media_uploads_account_media", "account_id", "media_url", unique=True),
+    )
+
 class Engagement(Base):
     __tablename__ = "engagements"
     
@@ -48,6 +188,46 @@ class Engagement(Base):
     
     post = relationship("ScheduledPost", back_populates="engagements")
 
+class AccountAnalytics(Base):
+    __tablename__ = "analytics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    metric_date = Column(Date, nullable=False)
+    # Valori dell'account (ultima lettura del giorno; None se non letti)
+    followers = Column(Integer)
+    impressions = Column(Integer)
+    reach = Column(Integer)
+    # Engagement ricevuto nel giorno dai post dell'account
+    likes = Column(Integer, default=0)
+    comments = Column(Integer, default=0)
+    shares = Column(Integer, default=0)
+    engagement_rate = Column(Float)
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ux_analytics_account_date", "account_id", "metric_date", unique=True),
+    )
+
+class AccountAnalyticsHourly(Base):
+    __tablename__ = "analytics_hourly"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("social_accounts.id"))
+    # Inizio dell'ora
+    metric_hour = Column(DateTime, nullable=False)
+    followers = Column(Integer)
+    impressions = Column(Integer)
+    reach = Column(Integer)
+    likes = Column(Integer, default=0)
+    comments = Column(Integer, default=0)
+    shares = Column(Integer, default=0)
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ux_analytics_hourly_account_hour", "account_id", "metric_hour", unique=True),
+    )
+
 class Hashtag(Base):
     __tablename__ = "hashtags"
     
@@ -67,22 +247,6 @@ class PostHashtag(Base):
     post = relationship("ScheduledPost", back_populates="hashtags")
     hashtag = relationship("Hashtag", back_populates="posts")
 
-class ContentTemplate(Base):
-    __tablename__ = "content_templates"
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String)
-    content = Column(String)
-    variables = Column(JSON)
-
-class MediaFile(Base):
-    __tablename__ = "media_files"
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    filename = Column(String)
-    filepath = Column(String)
-    mime_type = Column(String)
-    created_at = Column(DateTime)
-
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -147,5 +311,5 @@ SocialAccount.posts = relationship("ScheduledPost", back_populates="account")
 
 # Espone ContentTemplate per l'import nei servizi
 __all__ = [
-    'User', 'SocialAccount', 'ScheduledPost', 'Engagement', 'Hashtag', 'PostHashtag', 'Notification', 'SystemStatus', 'ContentTemplate', 'MediaFile'
+    'User', 'SocialAccount', 'ScheduledPost', 'RecurringPost', 'CrossPost', 'DeadLetter', 'SyncCursor', 'JobLease', 'PostComment', 'MediaUpload', 'Engagement', 'AccountAnalytics', 'AccountAnalyticsHourly', 'Hashtag', 'PostHashtag', 'Notification', 'SystemStatus', 'ContentTemplate', 'MediaFile'
 ]
\ No newline at end of file
@@ -1,25 +1,70 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional
+from sqlalchemy import func, select
 from database import SessionLocal
-from models import SocialAccount, ScheduledPost, Engagement
-from collections import defaultdict
+from models import AccountAnalytics, AccountAnalyticsHourly, CrossPost, SocialAccount, ScheduledPost, Engagement
+from services.rollup import ANALYTICS_HOURLY_ROLLUP, COUNTERS, GAUGES
+
+REPORT_PERIODS = {"7d": 7, "30d": 30, "90d": 90, "1y": 365}
 
 class AnalyticsEngine:
+    """Metriche degli account lette dal rollup analytics
+
+    Riepiloghi e report leggono una riga per giorno (o per ora) dalle
+    tabelle analytics invece di scorrere post ed engagement; solo i post
+    migliori del periodo vengono letti dai post, limitati al periodo.
+    """
+
     def __init__(self):
         self.cache = {}
         
     def get_account_analytics(self, account_id: int) -> Dict:
-        """Ottieni le metriche principali per un account"""
-        account = SocialAccount.query.get(account_id)
-        if not account:
-            raise ValueError("Account not found")
-            
-        return {
-            "followers": account.followers_count,
-            "engagement_rate": self._calculate_engagement_rate(account),
-            "best_performing_post": self._get_best_performing_post(account),
-            "weekly_growth": self._calculate_weekly_growth(account)
-        }
+        """Ottieni le metriche principali per un account (ultimi 30 giorni)"""
+        session = SessionLocal()
+        try:
+            self._get_account(session, account_id)
+            today = date.today()
+            rows = _daily_rows(session, account_id, today - timedelta(days=29))
+            followers = _latest_followers(session, account_id, today)
+            best_posts = _top_posts(session, account_id, today - timedelta(days=29), 1)
+            return {
+                "followers": followers or 0,
+                "engagement_rate": _engagement_rate(rows, followers),
+                "best_performing_post": best_posts[0] if best_posts else None,
+                "weekly_growth": self._calculate_weekly_growth(session, account_id, today)
+            }
+        finally:
+            session.close()
+
+    def get_account_summary(self, account_id: int) -> Dict:
+        """Panoramica degli ultimi 7 giorni (e delle ultime 24 ore se c'è il rollup orario)"""
+        session = SessionLocal()
+        try:
+            self._get_account(session, account_id)
+            today = date.today()
+            rows = _daily_rows(session, account_id, today - timedelta(days=6))
+            followers = _latest_followers(session, account_id, today)
+            trending = _top_posts(session, account_id, today - timedelta(days=6), 1)
+            summary = {
+                "followers": followers or 0,
+                "engagement_rate_7d": _engagement_rate(rows, followers),
+                "impressions_7d": sum(row.impressions or 0 for row in rows),
+                "reach_7d": sum(row.reach or 0 for row in rows),
+                "trending_post": trending[0] if trending else None
+            }
+            if ANALYTICS_HOURLY_ROLLUP:
+                summary["last_24h"] = [
+                    _describe(row, row.metric_hour)
+                    for row in session.scalars(
+                        select(AccountAnalyticsHourly)
+                        .where(AccountAnalyticsHourly.account_id == account_id)
+                        .where(AccountAnalyticsHourly.metric_hour >= datetime.now() - timedelta(hours=24))
+                        .order_by(AccountAnalyticsHourly.metric_hour)
+                    ).all()
+                ]
+            return summary
+        finally:
+            session.close()
         
     def get_post_analytics(self, post_id: int) -> Dict:
         """Analisi dettagliata per un singolo post"""
@@ -36,54 +81,51 @@ class AnalyticsEngine:
         
     def generate_report(self, account_id: int, period: str = "30d") -> Dict:
         """Genera un report completo per un account"""
-        account = SocialAccount.query.get(account_id)
-        if not account:
-            raise ValueError("Account not found")
-            
+        if period not in REPORT_PERIODS:
+            raise ValueError(f"Unsupported period: {period}")
+        session = SessionLocal()
+        try:
+            account = self._get_account(session, account_id)
+            today = date.today()
+            since = today - timedelta(days=REPORT_PERIODS[period] - 1)
+            rows = _daily_rows(session, account_id, since)
+            followers = _latest_followers(session, account_id, today)
+            start_followers = _latest_followers(session, account_id, since - timedelta(days=1))
+            totals = {name: sum(getattr(row, name) or 0 for row in rows) for name in (*COUNTERS, "impressions", "reach")}
+            totals["follower_growth"] = followers - start_followers if followers is not None and start_followers is not None else 0
+            totals["engagement_rate"] = _engagement_rate(rows, followers)
+            top_posts = _top_posts(session, account_id, since, 5)
+        finally:
+            session.close()
+
         return {
+            "period": period,
             "summary": self.get_account_analytics(account_id),
-            "top_posts": self._get_top_posts(account, period),
+            "totals": totals,
+            "daily": [dict(_describe(row, row.metric_date), engagement_rate=row.engagement_rate) for row in rows],
+            "top_posts": top_posts,
             "audience_insights": self._get_audience_insights(account),
             "recommendations": self._generate_recommendations(account)
         }
+
+    def _get_account(self, session, account_id: int) -> SocialAccount:
+        account = session.get(SocialAccount, account_id)
+        if not account:
+            raise ValueError("Account not found")
+        return account
         
-    def _calculate_engagement_rate(self, account: SocialAccount) -> float:
-        """Calcola il tasso di engagement"""
-        total_engagements = sum(
-            post.engagements.likes + 
-            post.engagements.comments + 
-            post.engagements.shares
-            for post in account.posts
-        )
-        
-        if account.followers_count == 0:
-            return 0
-            
-        return (total_engagements / account.followers_count) * 100
-        
-    def _get_best_performing_post(self, account: SocialAccount) -> Optional[Dict]:
-        """Trova il post con le migliori prestazioni"""
-        if not account.posts:
-            return None
-            
-        best_post = max(
-            account.posts, 
-            key=lambda p: p.engagements.likes + p.engagements.comments + p.engagements.shares
-        )
-        
-        return {
-            "id": best_post.id,
-            "content": best_post.content,
-            "engagement": best_post.engagements.likes + best_post.engagements.comments + best_post.engagements.shares
-        }
-        
-    def _calculate_weekly_growth(self, account: SocialAccount) -> Dict:
-        """Calcola la crescita settimanale"""
-        # Implementazione dettagliata omessa per brevità
+    def _calculate_weekly_growth(self, session, account_id: int, today: date) -> Dict:
+        """Crescita degli ultimi 7 giorni rispetto ai 7 precedenti"""
+        rows = _daily_rows(session, account_id, today - timedelta(days=13))
+        week_start = today - timedelta(days=6)
+        this_week = [row for row in rows if row.metric_date >= week_start]
+        last_week = [row for row in rows if row.metric_date < week_start]
+        followers = _latest_followers(session, account_id, today)
+        week_ago = _latest_followers(session, account_id, week_start - timedelta(days=1))
         return {
-            "followers": 0,
-            "engagement": 0,
-            "reach": 0
+            "followers": followers - week_ago if followers is not None and week_ago is not None else 0,
+            "engagement": _engagement(this_week) - _engagement(last_week),
+            "reach": sum(row.reach or 0 for row in this_week) - sum(row.reach or 0 for row in last_week)
         }
         
     def _calculate_post_engagement_rate(self, post: ScheduledPost) -> float:
@@ -118,11 +160,6 @@ class AnalyticsEngine:
             "negative": 0
         }
         
-    def _get_top_posts(self, account: SocialAccount, period: str) -> List[Dict]:
-        """Ottieni i migliori post per un determinato periodo"""
-        # Implementazione dettagliata omessa per brevità
-        return []
-        
     def _get_audience_insights(self, account: SocialAccount) -> Dict:
         """Ottieni informazioni sul pubblico"""
         # Implementazione dettagliata omessa per brevità
@@ -131,4 +168,56 @@ class AnalyticsEngine:
     def _generate_recommendations(self, account: SocialAccount) -> List[str]:
         """Genera raccomandazioni per migliorare le prestazioni"""
         # Implementazione dettagliata omessa per brevità
-        return []
\ No newline at end of file
+        return []
+def _daily_rows(session, account_id: int, since: date) -> List[AccountAnalytics]:
+    return session.scalars(
+        select(AccountAnalytics)
+        .where(AccountAnalytics.account_id == account_id)
+        .where(AccountAnalytics.metric_date >= since)
+        .order_by(AccountAnalytics.metric_date)
+    ).all()
+
+def _latest_followers(session, account_id: int, until: date) -> Optional[int]:
+    """Ultimo numero di follower rilevato fino al giorno `until` compreso"""
+    return session.scalars(
+        select(AccountAnalytics.followers)
+        .where(AccountAnalytics.account_id == account_id)
+        .where(AccountAnalytics.metric_date <= until)
+        .where(AccountAnalytics.followers.is_not(None))
+        .order_by(AccountAnalytics.metric_date.desc())
+        .limit(1)
+    ).first()
+
+def _top_posts(session, account_id: int, since: date, limit: int) -> List[Dict]:
+    """Post pubblicati da `since` con più engagement"""
+    engagement = (
+        func.coalesce(Engagement.likes, 0) + func.coalesce(Engagement.comments, 0) + func.coalesce(Engagement.shares, 0)
+    ).label("engagement")
+    # I post di un cross-post hanno il contenuto in cross_posts
+    content = func.coalesce(ScheduledPost.content, CrossPost.content)
+    rows = session.execute(
+        select(ScheduledPost.id, content, engagement)
+        .join(Engagement, Engagement.post_id == ScheduledPost.id)
+        .outerjoin(CrossPost, CrossPost.id == ScheduledPost.cross_post_id)
+        .where(ScheduledPost.account_id == account_id)
+        .where(ScheduledPost.scheduled_time >= datetime.combine(since, datetime.min.time()))
+        .order_by(engagement.desc())
+        .limit(limit)
+    ).all()
+    return [{"id": post_id, "content": content, "engagement": value} for post_id, content, value in rows]
+
+def _engagement(rows) -> int:
+    return sum((row.likes or 0) + (row.comments or 0) + (row.shares or 0) for row in rows)
+
+def _engagement_rate(rows, followers: Optional[int]) -> float:
+    """Engagement del periodo in percentuale dei follower"""
+    if not followers:
+        return 0
+    return _engagement(rows) / followers * 100
+
+def _describe(row, period) -> Dict:
+    return {
+        "period": period.isoformat(),
+        **{name: getattr(row, name) for name in GAUGES},
+        **{name: getattr(row, name) or 0 for name in COUNTERS}
+    }
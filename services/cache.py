@@ -0,0 +1,70 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+Loader = Callable[[], Awaitable[Any]]
+
+class AsyncTTLCache:
+    """Cache con scadenza per chiamate asincrone costose (es. API delle piattaforme)
+
+    - entro `ttl` il valore viene restituito senza chiamate
+    - tra `ttl` e `stale_ttl` viene restituito il valore vecchio e in background
+      parte un solo aggiornamento (stale-while-revalidate)
+    - richieste contemporanee per la stessa chiave condividono un'unica chiamata
+    Gli errori non vengono memorizzati.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: Optional[float] = None,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl if stale_ttl is not None else ttl, ttl)
+        self.max_entries = max_entries
+        self.clock = clock
+        # chiave -> (valore, istante di caricamento)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Loader) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, loaded_at = entry
+            age = self.clock() - loaded_at
+            if age < self.stale_ttl:
+                self._entries.move_to_end(key)
+                if age >= self.ttl:
+                    self._load(key, loader)
+                return value
+        return await asyncio.shield(self._load(key, loader))
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def _load(self, key: Hashable, loader: Loader) -> asyncio.Task:
+        task = self._inflight.get(key)
+        # Un caricamento rimasto su un altro event loop non è riutilizzabile
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._fetch(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        return task
+
+    async def _fetch(self, key: Hashable, loader: Loader) -> Any:
+        value = await loader()
+        self._entries[key] = (value, self.clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def _settle(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Evita "exception was never retrieved" per gli aggiornamenti in background
+        if not task.cancelled():
+            task.exception()
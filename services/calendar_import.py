@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import os
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+IMPORT_BATCH_SIZE = int(os.getenv("CALENDAR_IMPORT_BATCH_SIZE", "1000"))
+
+# (numero riga, dati della riga, errore di parsing)
+Row = Tuple[int, Optional[Dict], Optional[str]]
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[Row]:
+    """Legge un calendario CSV riga per riga senza caricarlo in memoria
+
+    Colonne attese: account_id, content, scheduled_time, media_urls
+    (più URL separati da `|`).
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            data = {key: value or None for key, value in row.items() if key}
+            if data.get("media_urls"):
+                data["media_urls"] = [url.strip() for url in data["media_urls"].split("|") if url.strip()]
+            yield reader.line_num, data, None
+    finally:
+        # Il file caricato viene chiuso da FastAPI, non dal wrapper
+        text.detach()
+
+def iter_ndjson_rows(stream: BinaryIO) -> Iterator[Row]:
+    """Legge un calendario NDJSON (un oggetto JSON per riga) in streaming"""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"JSON non valido: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, "La riga deve contenere un oggetto JSON"
+            continue
+        yield line_number, data, None
+
+def import_calendar(
+    rows: Iterator[Row],
+    validate: Callable[[Dict], Dict],
+    scheduler,
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> Iterator[Dict]:
+    """Valida e programma le righe a blocchi, restituendo gli esiti in streaming
+
+    Ogni riga non valida produce subito un evento di errore; le righe valide
+    vengono scritte ogni `batch_size` con un inserimento in blocco.
+    """
+    total = imported = failed = 0
+    batch: List[Tuple[int, Dict]] = []
+
+    def flush():
+        nonlocal imported, failed
+        missing = scheduler.find_missing_accounts(post["account_id"] for _, post in batch)
+        valid = []
+        for row_number, post in batch:
+            if post["account_id"] in missing:
+                failed += 1
+                yield {"row": row_number, "error": f"Account not found: {post['account_id']}"}
+            else:
+                valid.append((row_number, post))
+        batch.clear()
+        if not valid:
+            return
+
+        try:
+            post_ids = scheduler.schedule_posts_bulk([post for _, post in valid])
+        except Exception as e:
+            failed += len(valid)
+            yield {"rows": [valid[0][0], valid[-1][0]], "error": str(e)}
+            return
+        imported += len(post_ids)
+        yield {
+            "rows": [valid[0][0], valid[-1][0]],
+            "committed": len(post_ids),
+            "first_id": post_ids[0],
+            "last_id": post_ids[-1]
+        }
+
+    for row_number, data, error in rows:
+        total += 1
+        if error is None:
+            try:
+                batch.append((row_number, validate(data)))
+            except Exception as e:
+                error = _describe_error(e)
+        if error is not None:
+            failed += 1
+            yield {"row": row_number, "error": error}
+        elif len(batch) >= batch_size:
+            yield from flush()
+
+    if batch:
+        yield from flush()
+    yield {"summary": {"rows": total, "imported": imported, "failed": failed}}
+
+def _describe_error(error: Exception) -> str:
+    errors = getattr(error, "errors", None)
+    if callable(errors):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+            for err in errors()
+        )
+    return str(error)
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+from services.retry import PublishError
+
+# Errori consecutivi che aprono il circuito e durata dell'apertura
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Chiamate di prova ammesse contemporaneamente a circuito semi-aperto
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(PublishError):
+    """La piattaforma è considerata fuori servizio: la chiamata non viene fatta
+
+    `retry_after` sono i secondi che mancano al passaggio a half_open.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class BulkheadFullError(PublishError):
+    """Tutti gli slot della piattaforma sono occupati oltre l'attesa massima"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Circuit breaker con prova a circuito semi-aperto
+
+    closed -> open dopo `failure_threshold` errori consecutivi; dopo
+    `reset_seconds` passa a half_open e lascia passare poche chiamate di
+    prova: se riescono il circuito si richiude, altrimenti si riapre.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+
+    def before_call(self):
+        """Solleva CircuitOpenError se la chiamata non deve partire"""
+        if self.state == OPEN:
+            elapsed = self.clock() - self.opened_at
+            if elapsed < self.reset_seconds:
+                raise CircuitOpenError(f"{self.name} circuit open", self.reset_seconds - elapsed)
+            self.state = HALF_OPEN
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                raise CircuitOpenError(f"{self.name} circuit half-open, probe in progress", self.reset_seconds)
+            self._probes += 1
+
+    def record(self, healthy: Optional[bool]):
+        """Esito di una chiamata ammessa da before_call
+
+        None indica una chiamata mai arrivata alla piattaforma (bulkhead
+        pieno, annullamento): libera solo l'eventuale slot di prova.
+        """
+        if healthy is None:
+            if self.state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+        elif healthy:
+            self.record_success()
+        else:
+            self.record_failure()
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probes = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self._probes = 0
+
+    def snapshot(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+class Bulkhead:
+    """Pool di concorrenza dedicato a una piattaforma
+
+    Oltre `limit` chiamate in corso si attende al massimo `max_wait`
+    secondi, poi si fallisce subito invece di accodarsi all'infinito.
+    """
+
+    def __init__(self, name: str, limit: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def __aenter__(self):
+        if self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, self.max_wait)
+            except asyncio.TimeoutError:
+                raise BulkheadFullError(f"{self.name} bulkhead full ({self.limit} calls in flight)", self.max_wait)
+            except asyncio.CancelledError:
+                # Slot assegnato proprio mentre il chiamante veniva annullato
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        else:
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        # Lo slot passa direttamente al primo in attesa
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        return {"in_flight": self.in_flight, "waiting": len(self._waiters), "limit": self.limit}
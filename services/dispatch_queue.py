@@ -0,0 +1,85 @@
+import heapq
+import threading
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+class DispatchQueue:
+    """Min-heap dei post in attesa di pubblicazione, ordinato per scheduled_time
+
+    La coda contiene solo i post fino a `loaded_until`: quelli successivi
+    restano nel database e vengono caricati a fette man mano che il tempo
+    avanza. Serve a sapere quando risvegliare lo scheduler e quali post
+    prendere in carico per primi; il claim sul database resta l'unica fonte
+    di verità e una scansione recupera i post che la coda non conosce.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+        self.loaded_until: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def covers(self, scheduled_time: datetime) -> bool:
+        """True se l'orario rientra nella finestra già caricata in memoria"""
+        return self.loaded_until is not None and scheduled_time <= self.loaded_until
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Registra una callback invocata quando cambia il prossimo post in scadenza"""
+        self._listeners.append(callback)
+
+    def push(self, scheduled_time: datetime, post_id: int):
+        """Inserisce un post nella coda in O(log n)"""
+        with self._lock:
+            heapq.heappush(self._heap, (scheduled_time, post_id))
+            new_head = self._heap[0] == (scheduled_time, post_id)
+        if new_head:
+            self._notify()
+
+    def rebuild(
+        self,
+        entries: Iterable[Tuple[datetime, int]],
+        loaded_until: Optional[datetime] = None
+    ):
+        """Sostituisce il contenuto della coda con heapify in O(n)"""
+        heap = list(entries)
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+            self.loaded_until = loaded_until
+        self._notify()
+
+    def extend(self, entries: Iterable[Tuple[datetime, int]], loaded_until: datetime):
+        """Aggiunge una nuova fetta di post e sposta in avanti la finestra caricata"""
+        with self._lock:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self.loaded_until = loaded_until
+        self._notify()
+
+    def wake(self):
+        """Risveglia chi attende la coda anche se il prossimo post non è cambiato"""
+        self._notify()
+
+    def peek_time(self) -> Optional[datetime]:
+        """Orario del prossimo post in scadenza, se presente"""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """Estrae gli ID dei post scaduti, senza duplicati, in ordine di scadenza"""
+        due = []
+        seen = set()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, post_id = heapq.heappop(self._heap)
+                if post_id not in seen:
+                    seen.add(post_id)
+                    due.append(post_id)
+        return due
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
@@ -0,0 +1,189 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, Optional
+from services.media_prep import MediaPreparer
+from services.metrics import LagStats, dispatch_lag
+from services.retry import PublishDeferred
+from services.smoothing import BurstSmoother
+
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "32"))
+DEFAULT_PLATFORM_CONCURRENCY = 4
+PLATFORM_CONCURRENCY = {
+    "twitter": int(os.getenv("TWITTER_PUBLISH_CONCURRENCY", "8")),
+    "instagram": int(os.getenv("INSTAGRAM_PUBLISH_CONCURRENCY", "4")),
+    "facebook": int(os.getenv("FACEBOOK_PUBLISH_CONCURRENCY", "8")),
+    "linkedin": int(os.getenv("LINKEDIN_PUBLISH_CONCURRENCY", "4"))
+}
+# Post in attesa per piattaforma, in multipli del limite di concorrenza
+QUEUE_DEPTH_FACTOR = 4
+# Worker per piattaforma riservati ai nuovi tentativi, in aggiunta a quelli
+# dei post in orario: durante un disservizio i retry non li occupano
+RETRY_CONCURRENCY = int(os.getenv("PUBLISH_RETRY_CONCURRENCY", "1"))
+
+class PublishDispatcher:
+    """Pool di worker asyncio che pubblica i post tramite PlatformManager
+
+    Ogni piattaforma ha una propria coda e un numero di worker pari al suo
+    limite di concorrenza, mentre un semaforo globale limita le pubblicazioni
+    in corso. Una piattaforma lenta occupa al massimo i propri slot.
+    I nuovi tentativi passano da code separate con pochi worker dedicati.
+    """
+
+    def __init__(
+        self,
+        manager=None,
+        workers: int = PUBLISH_WORKERS,
+        platform_limits: Optional[Dict[str, int]] = None,
+        metrics: LagStats = dispatch_lag,
+        clock: Callable[[], datetime] = datetime.now,
+        smoother: Optional[BurstSmoother] = None,
+        preparer: Optional[MediaPreparer] = None
+    ):
+        if manager is None:
+            from services.platforms import get_platform_manager
+            manager = get_platform_manager()
+        self.manager = manager
+        self.workers = workers
+        self.platform_limits = dict(PLATFORM_CONCURRENCY, **(platform_limits or {}))
+        self.metrics = metrics
+        self.clock = clock
+        self.smoother = smoother
+        self.preparer = preparer
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._retry_queues: Dict[str, asyncio.Queue] = {}
+        self._tasks = []
+        self._delayed = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="publish"
+        )
+        for platform in self.platform_limits:
+            self._platform_queue(platform)
+
+    async def stop(self):
+        tasks = self._tasks + list(self._delayed)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._delayed = set()
+        self._queues = {}
+        self._retry_queues = {}
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, post, platform: str, retry: bool = False) -> asyncio.Future:
+        """Accoda un post e restituisce il future con l'esito della pubblicazione
+
+        Se la coda della piattaforma è piena l'attesa fa da backpressure
+        verso chi prende in carico i post. Un post che lo smoothing non
+        riesce a collocare entro il suo ritardo massimo termina con
+        PublishDeferred e va riprogrammato nel database.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if retry:
+            await self._retry_queue(platform).put((post, future))
+            return future
+        queue = self._platform_queue(platform)
+
+        delay = 0.0
+        if self.smoother:
+            seconds_until_due = (post.scheduled_time - self.clock()).total_seconds()
+            delay = self.smoother.delay(post.account_id, platform, seconds_until_due, loop.time())
+            if delay is None:
+                until = self.clock() + timedelta(seconds=self.smoother.max_delay)
+                future.set_exception(PublishDeferred(until, f"{platform} publish rate exhausted"))
+                return future
+
+        if delay > 0:
+            task = asyncio.create_task(self._put_later(queue, (post, future), delay))
+            self._delayed.add(task)
+            task.add_done_callback(self._delayed.discard)
+        else:
+            await queue.put((post, future))
+        return future
+
+    async def _put_later(self, queue: asyncio.Queue, item, delay: float):
+        await asyncio.sleep(delay)
+        await queue.put(item)
+
+    def queue_depth(self) -> Dict[str, int]:
+        return {platform: queue.qsize() for platform, queue in self._queues.items()}
+
+    def _platform_queue(self, platform: str) -> asyncio.Queue:
+        queue = self._queues.get(platform)
+        if queue is None:
+            limit = self.platform_limits.get(platform, DEFAULT_PLATFORM_CONCURRENCY)
+            queue = asyncio.Queue(maxsize=limit * QUEUE_DEPTH_FACTOR)
+            self._queues[platform] = queue
+            for _ in range(limit):
+                self._tasks.append(asyncio.create_task(self._worker(queue, platform)))
+        return queue
+
+    def _retry_queue(self, platform: str) -> asyncio.Queue:
+        queue = self._retry_queues.get(platform)
+        if queue is None:
+            queue = asyncio.Queue(maxsize=RETRY_CONCURRENCY * QUEUE_DEPTH_FACTOR)
+            self._retry_queues[platform] = queue
+            for _ in range(RETRY_CONCURRENCY):
+                self._tasks.append(asyncio.create_task(self._worker(queue, platform)))
+        return queue
+
+    async def _worker(self, queue: asyncio.Queue, platform: str):
+        while True:
+            post, future = await queue.get()
+            try:
+                async with self._slots:
+                    result = await self._publish(post, platform)
+                self.metrics.record(post.scheduled_time, self.clock())
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _publish(self, post, platform: str):
+        media_urls = post.media_urls
+        if self.preparer and media_urls:
+            media_urls = await self._prepared_media(media_urls, platform)
+
+        options = {"idempotency_key": getattr(post, "idempotency_key", None)}
+        if getattr(post, "attempts", 0):
+            # Il tentativo precedente potrebbe aver pubblicato il post nonostante l'errore
+            options["published_since"] = post.scheduled_time
+        publish = partial(self.manager.post_content, post.account_id, post.content, media_urls, **options)
+        if asyncio.iscoroutinefunction(self.manager.post_content):
+            return await publish()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, publish)
+
+    async def _prepared_media(self, media_urls, platform: str):
+        """Media preparati nel formato che la piattaforma sa leggere
+
+        Il percorso locale va solo ai media caricati a blocchi; gli altri la
+        piattaforma li scarica da un URL (image_url, link), quindi ricevono
+        l'URL pubblico della variante preparata o, se i media preparati non
+        sono esposti, l'URL originale.
+        """
+        prepared = await self.preparer.prepare(media_urls, platform)
+        integration = self.manager.integration(platform)
+        return [
+            path if integration.uploads_media(url) else self.preparer.public_url(path) or url
+            for url, path in zip(media_urls, prepared)
+        ]
@@ -1,9 +1,9 @@
-import requests
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from database import SessionLocal
 from models import Hashtag, PostHashtag
 from config import settings
+from services.http import HTTP_TIMEOUT, get_session
 
 class HashtagOptimizer:
     def __init__(self):
@@ -12,9 +12,11 @@ class HashtagOptimizer:
     def research_hashtag(self, keyword: str) -> Dict:
         """Ricerca dati su un hashtag specifico"""
         try:
-            response = requests.get(
-                f"https://api.hashtagservice.com/v1/research?keyword={keyword}",
-                headers={"Authorization": f"Bearer {self.api_key}"}
+            response = get_session().get(
+                "https://api.hashtagservice.com/v1/research",
+                params={"keyword": keyword},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=HTTP_TIMEOUT
             )
             return response.json()
         except Exception as e:
@@ -50,9 +52,11 @@ class HashtagOptimizer:
     def get_trending(self, platform: str = "all") -> List[Dict]:
         """Ottieni hashtag trend in tempo reale"""
         try:
-            response = requests.get(
-                f"https://api.hashtagservice.com/v1/trending?platform={platform}",
-                headers={"Authorization": f"Bearer {self.api_key}"}
+            response = get_session().get(
+                "https://api.hashtagservice.com/v1/trending",
+                params={"platform": platform},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=HTTP_TIMEOUT
             )
             return response.json().get("trends", [])
         except Exception as e:
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connessioni per host: tetto complessivo e connessioni tenute aperte in keep-alive
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "50"))
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "social-automation/1.0")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.getenv("HTTP2_ENABLED", "1") != "0"
+
+class HttpTransport:
+    """Client HTTP asincroni condivisi, uno per host
+
+    Ogni host ha il proprio pool di connessioni in keep-alive (HTTP/2 se il
+    pacchetto `h2` è installato), quindi le chiamate successive alla stessa
+    piattaforma riusano la connessione TCP+TLS già aperta. I client sono
+    legati all'event loop che li ha creati.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        keepalive: int = HTTP_KEEPALIVE_CONNECTIONS,
+        timeout: Optional[httpx.Timeout] = None,
+        http2: bool = HTTP2_ENABLED,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+        self.timeout = timeout or httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        self.http2 = http2
+        self.transport = transport
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def client(self, url: str) -> httpx.AsyncClient:
+        """Client condiviso per l'host di `url`"""
+        loop = asyncio.get_running_loop()
+        clients = self._clients.setdefault(loop, {})
+        origin = _origin(url)
+        client = clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                transport=self.transport,
+                headers={"User-Agent": HTTP_USER_AGENT}
+            )
+            clients[origin] = client
+        return client
+
+    async def aclose(self):
+        """Chiude i client dell'event loop corrente (da chiamare allo shutdown)"""
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+_session: Optional[requests.Session] = None
+
+def get_session() -> requests.Session:
+    """Sessione requests condivisa per il codice sincrono (keep-alive per host)"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_KEEPALIVE_CONNECTIONS, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = HTTP_USER_AGENT
+        _session = session
+    return _session
+
+# Trasporto condiviso da tutte le integrazioni del processo
+transport = HttpTransport()
@@ -0,0 +1,172 @@
+import mimetypes
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import httpx
+from dateutil.parser import isoparse
+from services.http import HttpTransport, transport
+from services.ratelimit import RateLimitGovernor, current_account, governor
+from services.retry import PublishError
+from services.uploads import UPLOAD_CHUNK_SIZE
+
+# Elementi per pagina richiesti dalle sincronizzazioni incrementali
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "100"))
+
+class PlatformAPIError(PublishError):
+    """Risposta di errore di una piattaforma: 429 e 5xx si possono riprovare"""
+
+    def __init__(self, platform: str, status_code: int, message: str):
+        super().__init__(
+            f"{platform} API error {status_code}: {message}",
+            retryable=status_code == 429 or status_code >= 500
+        )
+        self.status_code = status_code
+
+def parse_platform_time(value) -> Optional[datetime]:
+    """Istante di una piattaforma (ISO 8601 o epoch in millisecondi) in ora locale"""
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000)
+    parsed = isoparse(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def batches(items: List[str], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def newer_than(items: List[Dict], stop_at: Optional[str]) -> Tuple[List[Dict], bool]:
+    """Elementi non più vecchi di `stop_at` e se la lista ha raggiunto il limite"""
+    if stop_at is None:
+        return items, False
+    limit = datetime.fromisoformat(stop_at)
+    newer = [item for item in items if item["created_at"] is not None and item["created_at"] >= limit]
+    return newer, len(newer) < len(items)
+
+def newer_comments(comments: List[Dict], since: Optional[datetime]) -> List[Dict]:
+    return [comment for comment in comments if since is None or (comment["created_at"] or since) > since]
+
+class BaseIntegration:
+    """Base comune delle integrazioni
+
+    Tutte le chiamate passano dal trasporto HTTP condiviso, che tiene aperte
+    le connessioni verso ogni piattaforma. L'URL base si può sovrascrivere
+    con `<PIATTAFORMA>_API_BASE_URL` (es. per puntare a un server di test).
+    """
+    platform: str = None
+    default_base_url: str = None
+    default_token_url: str = None
+    # Tipi MIME (prefissi) caricati a blocchi invece di essere passati per URL
+    upload_media_types: Tuple[str, ...] = ()
+    upload_chunk_size: int = UPLOAD_CHUNK_SIZE
+
+    def __init__(self, http: HttpTransport = transport, limits: RateLimitGovernor = governor):
+        prefix = self.platform.upper()
+        self.base_url = os.getenv(f"{prefix}_API_BASE_URL", self.default_base_url).rstrip("/")
+        self.token_url = os.getenv(f"{prefix}_TOKEN_URL", self.default_token_url)
+        self.client_id = os.getenv(f"{prefix}_CLIENT_ID")
+        self.client_secret = os.getenv(f"{prefix}_CLIENT_SECRET")
+        self.http = http
+        self.limits = limits
+
+    async def refresh_token(self, access_token: str, refresh_token: str) -> Dict:
+        """Rinnovo OAuth 2.0 standard (grant_type=refresh_token)
+
+        Restituisce access_token, refresh_token ed expires_in (secondi).
+        """
+        data = await self._send("POST", self.token_url, data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        })
+        return {
+            "access_token": data["access_token"],
+            "refresh_token": data.get("refresh_token", refresh_token),
+            "expires_in": data.get("expires_in")
+        }
+
+    async def sync_posts(
+        self,
+        access_token: str,
+        cursor: Dict,
+        since: Optional[datetime]
+    ) -> Tuple[List[Dict], Dict, bool]:
+        """Una pagina dei post pubblicati dopo l'ultima sincronizzazione
+
+        `cursor` è lo stato restituito dalla chiamata precedente (in un
+        formato proprio dell'integrazione), `since` l'istante del post più
+        recente già importato. Restituisce (post, nuovo cursore, finito);
+        ogni post ha id, content, created_at e, se la piattaforma le
+        restituisce insieme, metrics.
+        """
+        raise NotImplementedError(f"{self.platform} does not support sync")
+
+    async def fetch_metrics(self, access_token: str, post_ids: List[str]) -> Dict[str, Dict]:
+        """likes, comments e shares dei post indicati, con il minor numero di chiamate"""
+        raise NotImplementedError(f"{self.platform} does not support sync")
+
+    async def fetch_comments(self, access_token: str, post_ids: List[str], since: Optional[datetime]) -> List[Dict]:
+        """Commenti ai post indicati successivi a `since` (id, post_id, author, text, created_at)"""
+        raise NotImplementedError(f"{self.platform} does not support sync")
+
+    def account_metrics(self, insights: Dict) -> Dict[str, int]:
+        """followers, impressions e reach contenuti negli insights (solo quelli presenti)"""
+        return {}
+
+    def uploads_media(self, url: str) -> bool:
+        """Se il media va caricato a blocchi prima della pubblicazione"""
+        mime_type = mimetypes.guess_type(url.split("?", 1)[0])[0] or ""
+        return mime_type.startswith(self.upload_media_types) if self.upload_media_types else False
+
+    async def upload_init(self, access_token: str, total_bytes: int, mime_type: str) -> Dict:
+        """Apre una sessione di caricamento
+
+        Restituisce lo stato della sessione (serializzabile in JSON) con in
+        `offset` i byte già confermati; viene salvato dopo ogni blocco.
+        """
+        raise NotImplementedError(f"{self.platform} does not support chunked uploads")
+
+    def upload_range(self, state: Dict, total_bytes: int) -> Tuple[int, int]:
+        """Prossimo intervallo di byte da inviare, [inizio, fine)"""
+        return state["offset"], min(state["offset"] + self.upload_chunk_size, total_bytes)
+
+    async def upload_append(self, access_token: str, state: Dict, start: int, data: bytes) -> Dict:
+        """Invia un blocco e restituisce il nuovo stato con l'offset confermato"""
+        raise NotImplementedError(f"{self.platform} does not support chunked uploads")
+
+    async def upload_finalize(self, access_token: str, state: Dict) -> Dict:
+        """Chiude la sessione: media_id da allegare al post ed expires_in (secondi), se scade"""
+        raise NotImplementedError(f"{self.platform} does not support chunked uploads")
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        access_token: str,
+        idempotency_key: str = None,
+        **kwargs
+    ) -> Dict:
+        url = f"{self.base_url}{path}"
+        headers = {"Authorization": f"Bearer {access_token}", **kwargs.pop("headers", {})}
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        return await self._send(method, url, headers=headers, **kwargs)
+
+    async def _send(self, method: str, url: str, **kwargs) -> Dict:
+        response = await self._send_raw(method, url, **kwargs)
+        return response.json() if response.content else {}
+
+    async def _send_raw(self, method: str, url: str, **kwargs) -> httpx.Response:
+        account_id = current_account.get()
+        await self.limits.acquire(self.platform, account_id)
+        response = None
+        try:
+            response = await self.http.client(url).request(method, url, **kwargs)
+        finally:
+            self.limits.release(self.platform, account_id, response)
+        if response.status_code >= 400:
+            raise PlatformAPIError(self.platform, response.status_code, response.text[:200])
+        return response
@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from services.integrations.base import SYNC_PAGE_SIZE, newer_comments, parse_platform_time
+from services.integrations.graph import GraphIntegration
+
+FACEBOOK_METRIC_FIELDS = "reactions.summary(total_count).limit(0),comments.summary(total_count).limit(0),shares"
+
+class FacebookIntegration(GraphIntegration):
+    platform = "facebook"
+    default_base_url = "https://graph.facebook.com/v19.0"
+    insight_metrics = {"page_impressions": "impressions", "page_impressions_unique": "reach"}
+    # Video con il caricamento ripristinabile: gli intervalli dei blocchi li decide Facebook
+    upload_media_types = ("video/",)
+
+    async def refresh_token(self, access_token: str, refresh_token: str) -> Dict:
+        """Facebook scambia il token corrente con uno long-lived nuovo"""
+        data = await self._send("GET", f"{self.base_url}/oauth/access_token", params={
+            "grant_type": "fb_exchange_token",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "fb_exchange_token": access_token
+        })
+        return {"access_token": data["access_token"], "refresh_token": refresh_token, "expires_in": data.get("expires_in")}
+
+    def connect(self, auth_data: Dict) -> Dict:
+        """Implementazione connessione Facebook"""
+        # Implementazione dettagliata omessa per brevità
+        return {
+            "access_token": "facebook_access_token",
+            "user_id": "facebook_user_id",
+            "username": "facebook_username"
+        }
+        
+    async def post(
+        self,
+        access_token: str,
+        content: str,
+        media_urls: List[str] = None,
+        idempotency_key: str = None,
+        media_ids: List[str] = None
+    ) -> Dict:
+        """Implementazione pubblicazione Facebook"""
+        payload = {"message": content}
+        if media_ids:
+            payload["attached_media"] = [{"media_fbid": media_id} for media_id in media_ids]
+        elif media_urls:
+            payload["link"] = media_urls[0]
+        data = await self._request(
+            "POST", "/me/feed", access_token,
+            idempotency_key=idempotency_key,
+            json=payload
+        )
+        return {"status": "success", "post_id": data.get("id")}
+
+    async def get_insights(self, access_token: str) -> Dict:
+        return await self._request(
+            "GET", "/me/insights", access_token,
+            params={"metric": "page_impressions,page_impressions_unique,page_post_engagements", "period": "day"}
+        )
+
+    async def upload_init(self, access_token: str, total_bytes: int, mime_type: str) -> Dict:
+        data = await self._request(
+            "POST", "/me/videos", access_token,
+            data={"upload_phase": "start", "file_size": total_bytes}
+        )
+        return {
+            "video_id": data["video_id"],
+            "session_id": data["upload_session_id"],
+            "offset": int(data["start_offset"]),
+            "end": int(data["end_offset"])
+        }
+
+    def upload_range(self, state: Dict, total_bytes: int) -> Tuple[int, int]:
+        return state["offset"], state["end"]
+
+    async def upload_append(self, access_token: str, state: Dict, start: int, data: bytes) -> Dict:
+        """Ogni risposta indica l'intervallo successivo che Facebook si aspetta"""
+        result = await self._request(
+            "POST", "/me/videos", access_token,
+            data={"upload_phase": "transfer", "upload_session_id": state["session_id"], "start_offset": start},
+            files={"video_file_chunk": data}
+        )
+        return dict(state, offset=int(result["start_offset"]), end=int(result["end_offset"]))
+
+    async def upload_finalize(self, access_token: str, state: Dict) -> Dict:
+        """Il video resta non pubblicato: lo pubblica il post che lo allega"""
+        await self._request(
+            "POST", "/me/videos", access_token,
+            data={"upload_phase": "finish", "upload_session_id": state["session_id"], "published": "false"}
+        )
+        return {"media_id": state["video_id"]}
+
+    async def sync_posts(
+        self,
+        access_token: str,
+        cursor: Dict,
+        since: Optional[datetime]
+    ) -> Tuple[List[Dict], Dict, bool]:
+        params = {"fields": f"id,message,created_time,{FACEBOOK_METRIC_FIELDS}"}
+        if since is not None and not cursor.get("after"):
+            params["since"] = int(since.timestamp())
+        return await self._newest_first_page(
+            "/me/posts", access_token, params, cursor, since,
+            lambda post: {
+                "id": post["id"],
+                "content": post.get("message"),
+                "created_at": parse_platform_time(post.get("created_time")),
+                "metrics": _facebook_metrics(post)
+            }
+        )
+
+    async def fetch_metrics(self, access_token: str, post_ids: List[str]) -> Dict[str, Dict]:
+        objects = await self._objects(access_token, post_ids, FACEBOOK_METRIC_FIELDS)
+        return {post_id: _facebook_metrics(post) for post_id, post in objects.items()}
+
+    async def fetch_comments(self, access_token: str, post_ids: List[str], since: Optional[datetime]) -> List[Dict]:
+        objects = await self._objects(
+            access_token, post_ids, f"comments.limit({SYNC_PAGE_SIZE}){{id,message,from,created_time}}"
+        )
+        return newer_comments([
+            {
+                "id": comment["id"],
+                "post_id": post_id,
+                "author": comment.get("from", {}).get("name"),
+                "text": comment.get("message"),
+                "created_at": parse_platform_time(comment.get("created_time"))
+            }
+            for post_id, post in objects.items()
+            for comment in post.get("comments", {}).get("data", [])
+        ], since)
+
+def _facebook_metrics(post: Dict) -> Dict:
+    return {
+        "likes": post.get("reactions", {}).get("summary", {}).get("total_count", 0),
+        "comments": post.get("comments", {}).get("summary", {}).get("total_count", 0),
+        "shares": post.get("shares", {}).get("count", 0)
+    }
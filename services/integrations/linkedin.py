@@ -0,0 +1,193 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+from services.http import HttpTransport, transport
+from services.integrations.base import SYNC_PAGE_SIZE, BaseIntegration, batches, newer_comments, newer_than, parse_platform_time
+from services.ratelimit import RateLimitGovernor, governor
+
+class LinkedInIntegration(BaseIntegration):
+    platform = "linkedin"
+    default_base_url = "https://api.linkedin.com"
+    default_token_url = "https://www.linkedin.com/oauth/v2/accessToken"
+    # Post per chiamata batch di socialActions
+    batch_size = 50
+    # Video caricati a parti, con gli URL e gli intervalli restituiti da LinkedIn
+    upload_media_types = ("video/",)
+    api_version = os.getenv("LINKEDIN_API_VERSION", "202401")
+
+    def __init__(self, http: HttpTransport = transport, limits: RateLimitGovernor = governor):
+        super().__init__(http, limits)
+        # URN dell'autore per token: evita una chiamata a /userinfo per ogni post
+        self._authors: Dict[str, str] = {}
+
+    def connect(self, auth_data: Dict) -> Dict:
+        """Implementazione connessione LinkedIn"""
+        # Implementazione dettagliata omessa per brevità
+        return {
+            "access_token": "linkedin_access_token",
+            "user_id": "linkedin_user_id",
+            "username": "linkedin_username"
+        }
+        
+    async def post(
+        self,
+        access_token: str,
+        content: str,
+        media_urls: List[str] = None,
+        idempotency_key: str = None,
+        media_ids: List[str] = None
+    ) -> Dict:
+        """Implementazione pubblicazione LinkedIn"""
+        share = {"shareCommentary": {"text": content}, "shareMediaCategory": "NONE"}
+        if media_ids:
+            share["shareMediaCategory"] = "VIDEO"
+            share["media"] = [{"status": "READY", "media": media_id} for media_id in media_ids]
+        data = await self._request(
+            "POST", "/v2/ugcPosts", access_token,
+            idempotency_key=idempotency_key,
+            json={
+                "author": await self._author(access_token),
+                "lifecycleState": "PUBLISHED",
+                "specificContent": {"com.linkedin.ugc.ShareContent": share},
+                "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"}
+            }
+        )
+        return {"status": "success", "update_id": data.get("id")}
+
+    async def upload_init(self, access_token: str, total_bytes: int, mime_type: str) -> Dict:
+        data = await self._request(
+            "POST", "/rest/videos?action=initializeUpload", access_token,
+            headers={"LinkedIn-Version": self.api_version},
+            json={"initializeUploadRequest": {
+                "owner": await self._author(access_token),
+                "fileSizeBytes": total_bytes,
+                "uploadCaptions": False,
+                "uploadThumbnail": False
+            }}
+        )
+        value = data["value"]
+        return {
+            "video": value["video"],
+            "token": value.get("uploadToken", ""),
+            "parts": [
+                [instruction["uploadUrl"], instruction["firstByte"], instruction["lastByte"]]
+                for instruction in value["uploadInstructions"]
+            ],
+            "etags": [],
+            "offset": 0
+        }
+
+    def upload_range(self, state: Dict, total_bytes: int) -> Tuple[int, int]:
+        _, first_byte, last_byte = state["parts"][len(state["etags"])]
+        return first_byte, last_byte + 1
+
+    async def upload_append(self, access_token: str, state: Dict, start: int, data: bytes) -> Dict:
+        """Ogni parte va al proprio URL; l'ETag restituito serve a chiudere il caricamento"""
+        url, _, last_byte = state["parts"][len(state["etags"])]
+        response = await self._send_raw(
+            "PUT", url,
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/octet-stream"},
+            content=data
+        )
+        return dict(state, etags=state["etags"] + [response.headers.get("etag")], offset=last_byte + 1)
+
+    async def upload_finalize(self, access_token: str, state: Dict) -> Dict:
+        await self._request(
+            "POST", "/rest/videos?action=finalizeUpload", access_token,
+            headers={"LinkedIn-Version": self.api_version},
+            json={"finalizeUploadRequest": {
+                "video": state["video"],
+                "uploadToken": state["token"],
+                "uploadedPartIds": state["etags"]
+            }}
+        )
+        return {"media_id": state["video"]}
+
+    async def get_insights(self, access_token: str) -> Dict:
+        return await self._request(
+            "GET", f"/v2/networkSizes/{await self._author(access_token)}", access_token,
+            params={"edgeType": "CompanyFollowedByMember"}
+        )
+
+    def account_metrics(self, insights: Dict) -> Dict[str, int]:
+        if insights.get("firstDegreeSize") is None:
+            return {}
+        return {"followers": int(insights["firstDegreeSize"])}
+
+    async def sync_posts(
+        self,
+        access_token: str,
+        cursor: Dict,
+        since: Optional[datetime]
+    ) -> Tuple[List[Dict], Dict, bool]:
+        """Post dell'autore dal più recente, a pagine con start/count"""
+        start = cursor.get("start", 0)
+        stop_at = cursor["stop_at"] if start else (since.isoformat() if since else None)
+        data = await self._request(
+            "GET", "/v2/ugcPosts", access_token,
+            params={
+                "q": "authors",
+                "authors": f"List({await self._author(access_token)})",
+                "sortBy": "CREATED",
+                "start": start,
+                "count": SYNC_PAGE_SIZE
+            }
+        )
+        elements = data.get("elements", [])
+        posts, reached = newer_than([
+            {
+                "id": element["id"],
+                "content": element.get("specificContent", {})
+                    .get("com.linkedin.ugc.ShareContent", {})
+                    .get("shareCommentary", {})
+                    .get("text"),
+                "created_at": parse_platform_time(element.get("created", {}).get("time"))
+            }
+            for element in elements
+        ], stop_at)
+        if reached or len(elements) < SYNC_PAGE_SIZE:
+            return posts, {}, True
+        return posts, {"start": start + len(elements), "stop_at": stop_at}, False
+
+    async def fetch_metrics(self, access_token: str, post_ids: List[str]) -> Dict[str, Dict]:
+        metrics = {}
+        for batch in batches(post_ids, self.batch_size):
+            # Rest.li vuole gli URN già codificati dentro List(...)
+            ids = ",".join(quote(urn, safe="") for urn in batch)
+            data = await self._request("GET", f"/v2/socialActions?ids=List({ids})", access_token)
+            for urn, actions in data.get("results", {}).items():
+                metrics[urn] = {
+                    "likes": actions.get("likesSummary", {}).get("totalLikes", 0),
+                    "comments": actions.get("commentsSummary", {}).get("aggregatedTotalComments", 0),
+                    "shares": 0
+                }
+        return metrics
+
+    async def fetch_comments(self, access_token: str, post_ids: List[str], since: Optional[datetime]) -> List[Dict]:
+        """Una chiamata per post: il chiamante passa solo i post con nuovi commenti"""
+        comments = []
+        for urn in post_ids:
+            data = await self._request(
+                "GET", f"/v2/socialActions/{quote(urn, safe='')}/comments", access_token,
+                params={"count": SYNC_PAGE_SIZE}
+            )
+            comments.extend(
+                {
+                    "id": element.get("id"),
+                    "post_id": urn,
+                    "author": element.get("actor"),
+                    "text": element.get("message", {}).get("text"),
+                    "created_at": parse_platform_time(element.get("created", {}).get("time"))
+                }
+                for element in data.get("elements", [])
+            )
+        return newer_comments(comments, since)
+
+    async def _author(self, access_token: str) -> str:
+        author = self._authors.get(access_token)
+        if author is None:
+            profile = await self._request("GET", "/v2/userinfo", access_token)
+            author = f"urn:li:person:{profile.get('sub')}"
+            self._authors[access_token] = author
+        return author
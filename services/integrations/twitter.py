@@ -0,0 +1,194 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from services.cache import AsyncTTLCache
+from services.http import HttpTransport, transport
+from services.integrations.base import (
+    SYNC_PAGE_SIZE, BaseIntegration, PlatformAPIError, batches, parse_platform_time
+)
+from services.ratelimit import RateLimitGovernor, governor
+from services.uploads import UPLOAD_CHUNK_SIZE
+
+# ID utente associati ai token: i token ruotano, quindi la cache ha scadenza e dimensione massima
+USER_ID_CACHE_TTL = float(os.getenv("TWITTER_USER_ID_CACHE_TTL_SECONDS", "3600"))
+USER_ID_CACHE_SIZE = int(os.getenv("TWITTER_USER_ID_CACHE_SIZE", "1000"))
+
+class TwitterIntegration(BaseIntegration):
+    platform = "twitter"
+    default_base_url = "https://api.twitter.com"
+    default_token_url = "https://api.twitter.com/2/oauth2/token"
+    # Tweet per lookup e conversazioni per ricerca (la query ha un limite di lunghezza)
+    lookup_batch_size = 100
+    search_batch_size = 10
+    # Immagini e video si allegano solo dopo il caricamento (segmenti fino a 5 MB)
+    upload_media_types = ("image/", "video/")
+    upload_chunk_size = min(UPLOAD_CHUNK_SIZE, 5 * 1024 * 1024)
+
+    def __init__(self, http: HttpTransport = transport, limits: RateLimitGovernor = governor):
+        super().__init__(http, limits)
+        self._user_ids = AsyncTTLCache(ttl=USER_ID_CACHE_TTL, max_entries=USER_ID_CACHE_SIZE)
+
+    def connect(self, auth_data: Dict) -> Dict:
+        """Implementazione connessione Twitter"""
+        # Implementazione dettagliata omessa per brevità
+        return {
+            "access_token": "twitter_access_token",
+            "user_id": "twitter_user_id",
+            "username": "twitter_username"
+        }
+        
+    async def post(
+        self,
+        access_token: str,
+        content: str,
+        media_urls: List[str] = None,
+        idempotency_key: str = None,
+        media_ids: List[str] = None
+    ) -> Dict:
+        """Implementazione pubblicazione Twitter"""
+        payload = {"text": content}
+        if media_ids:
+            payload["media"] = {"media_ids": media_ids}
+        data = await self._request(
+            "POST", "/2/tweets", access_token,
+            idempotency_key=idempotency_key,
+            json=payload
+        )
+        return {"status": "success", "tweet_id": data.get("data", {}).get("id")}
+
+    async def upload_init(self, access_token: str, total_bytes: int, mime_type: str) -> Dict:
+        data = await self._request(
+            "POST", "/2/media/upload/initialize", access_token,
+            json={
+                "media_type": mime_type,
+                "total_bytes": total_bytes,
+                "media_category": "tweet_video" if mime_type.startswith("video/") else "tweet_image"
+            }
+        )
+        return {"media_id": data["data"]["id"], "segment": 0, "offset": 0}
+
+    async def upload_append(self, access_token: str, state: Dict, start: int, data: bytes) -> Dict:
+        """Segmenti numerati: reinviare un segmento dopo un errore lo sovrascrive"""
+        await self._request(
+            "POST", f"/2/media/upload/{state['media_id']}/append", access_token,
+            data={"segment_index": state["segment"]},
+            files={"media": data}
+        )
+        return dict(state, segment=state["segment"] + 1, offset=start + len(data))
+
+    async def upload_finalize(self, access_token: str, state: Dict) -> Dict:
+        """Chiude il caricamento e attende l'elaborazione dei video"""
+        data = (await self._request("POST", f"/2/media/upload/{state['media_id']}/finalize", access_token)).get("data", {})
+        expires_in = data.get("expires_after_secs")
+        processing = data.get("processing_info")
+        while processing and processing.get("state") in ("pending", "in_progress"):
+            await asyncio.sleep(processing.get("check_after_secs", 1))
+            data = (await self._request(
+                "GET", "/2/media/upload", access_token,
+                params={"command": "STATUS", "media_id": state["media_id"]}
+            )).get("data", {})
+            processing = data.get("processing_info")
+        if processing and processing.get("state") == "failed":
+            raise PlatformAPIError(self.platform, 400, f"media processing failed: {processing.get('error')}")
+        return {"media_id": state["media_id"], "expires_in": data.get("expires_after_secs", expires_in)}
+
+    async def get_insights(self, access_token: str) -> Dict:
+        data = await self._request(
+            "GET", "/2/users/me", access_token,
+            params={"user.fields": "public_metrics"}
+        )
+        return data.get("data", {}).get("public_metrics", {})
+
+    def account_metrics(self, insights: Dict) -> Dict[str, int]:
+        if insights.get("followers_count") is None:
+            return {}
+        return {"followers": int(insights["followers_count"])}
+
+    async def sync_posts(
+        self,
+        access_token: str,
+        cursor: Dict,
+        since: Optional[datetime]
+    ) -> Tuple[List[Dict], Dict, bool]:
+        """Timeline dell'utente dopo since_id; newest_id diventa il nuovo since_id a fine paginazione"""
+        params = {"max_results": SYNC_PAGE_SIZE, "tweet.fields": "created_at,public_metrics"}
+        if cursor.get("since_id"):
+            params["since_id"] = cursor["since_id"]
+        if cursor.get("next_token"):
+            params["pagination_token"] = cursor["next_token"]
+        data = await self._request(
+            "GET", f"/2/users/{await self._user_id(access_token)}/tweets", access_token,
+            params=params
+        )
+        posts = [
+            {
+                "id": tweet["id"],
+                "content": tweet.get("text"),
+                "created_at": parse_platform_time(tweet.get("created_at")),
+                "metrics": _tweet_metrics(tweet)
+            }
+            for tweet in data.get("data", [])
+        ]
+        meta = data.get("meta", {})
+        newest_id = cursor.get("newest_id") or meta.get("newest_id")
+        if meta.get("next_token"):
+            return posts, {"since_id": cursor.get("since_id"), "newest_id": newest_id, "next_token": meta["next_token"]}, False
+        return posts, {"since_id": newest_id or cursor.get("since_id")}, True
+
+    async def fetch_metrics(self, access_token: str, post_ids: List[str]) -> Dict[str, Dict]:
+        metrics = {}
+        for batch in batches(post_ids, self.lookup_batch_size):
+            data = await self._request(
+                "GET", "/2/tweets", access_token,
+                params={"ids": ",".join(batch), "tweet.fields": "public_metrics"}
+            )
+            metrics.update({tweet["id"]: _tweet_metrics(tweet) for tweet in data.get("data", [])})
+        return metrics
+
+    async def fetch_comments(self, access_token: str, post_ids: List[str], since: Optional[datetime]) -> List[Dict]:
+        """Risposte nelle conversazioni dei tweet (ricerca recente, ultimi 7 giorni)"""
+        start_time = datetime.now(timezone.utc) - timedelta(days=7) + timedelta(minutes=1)
+        if since is not None:
+            start_time = max(start_time, since.astimezone(timezone.utc))
+        comments = []
+        for batch in batches(post_ids, self.search_batch_size):
+            params = {
+                "query": " OR ".join(f"conversation_id:{post_id}" for post_id in batch),
+                "start_time": start_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "max_results": SYNC_PAGE_SIZE,
+                "tweet.fields": "author_id,created_at,conversation_id"
+            }
+            while True:
+                data = await self._request("GET", "/2/tweets/search/recent", access_token, params=params)
+                comments.extend(
+                    {
+                        "id": tweet["id"],
+                        "post_id": tweet.get("conversation_id"),
+                        "author": tweet.get("author_id"),
+                        "text": tweet.get("text"),
+                        "created_at": parse_platform_time(tweet.get("created_at"))
+                    }
+                    for tweet in data.get("data", [])
+                    if tweet["id"] != tweet.get("conversation_id")
+                )
+                next_token = data.get("meta", {}).get("next_token")
+                if not next_token:
+                    break
+                params["next_token"] = next_token
+        return comments
+
+    async def _user_id(self, access_token: str) -> str:
+        async def load() -> str:
+            data = await self._request("GET", "/2/users/me", access_token)
+            return data.get("data", {}).get("id")
+
+        return await self._user_ids.get(access_token, load)
+
+def _tweet_metrics(tweet: Dict) -> Dict:
+    metrics = tweet.get("public_metrics") or {}
+    return {
+        "likes": metrics.get("like_count", 0),
+        "comments": metrics.get("reply_count", 0),
+        "shares": metrics.get("retweet_count", 0) + metrics.get("quote_count", 0)
+    }
@@ -0,0 +1,34 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models import JobLease
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def claim_job(name: str, holder: str, now: datetime, seconds: float) -> bool:
+    """Prende (o rinnova) per `seconds` il lease del job `name`; False se lo tiene un altro worker"""
+    expires_at = now + timedelta(seconds=seconds)
+    session = SessionLocal()
+    try:
+        claimed = session.execute(
+            update(JobLease)
+            .where(JobLease.name == name)
+            .where((JobLease.holder == holder) | (JobLease.expires_at <= now))
+            .values(holder=holder, expires_at=expires_at)
+        ).rowcount
+        if not claimed:
+            try:
+                with session.begin_nested():
+                    session.add(JobLease(name=name, holder=holder, expires_at=expires_at))
+                claimed = 1
+            except IntegrityError:
+                # Il lease esiste ed è di un altro worker
+                claimed = 0
+        session.commit()
+        return bool(claimed)
+    finally:
+        session.close()
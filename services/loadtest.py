@@ -0,0 +1,165 @@
+"""Load test dei percorsi di pubblicazione e insights verso le piattaforme
+
+Le chiamate passano dallo stesso PlatformManager della produzione (circuit
+breaker, bulkhead, governo dei rate limit, trasporto HTTP condiviso) con
+account sintetici in memoria: anche i loro token restano in memoria, quindi
+nessuna chiamata apre una connessione al database. Con `--mock` le
+integrazioni vengono puntate al server simulato (services.mock_platforms).
+
+Il governo dei rate limit non rallenta le chiamate, così si misura il
+percorso e non il ritmo per account; `--rate-per-hour` lo riattiva con il
+ritmo indicato.
+
+    python -m services.mock_platforms --port 9100 --latency 0.2 &
+    python -m services.loadtest --mock http://127.0.0.1:9100 \\
+        --operation publish --requests 5000 --concurrency 200 --accounts 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from services.smoothing import PLATFORMS
+
+# Ritmo per account del governo quando il load test non lo limita
+UNTHROTTLED_RATE_PER_HOUR = 10 ** 9
+
+class InMemoryTokens:
+    """Sostituto di TokenManager per gli account sintetici: nessun rinnovo né database"""
+
+    def __init__(self, accounts: Dict[int, SimpleNamespace]):
+        self.accounts = accounts
+
+    async def access_token(self, account) -> str:
+        return account.access_token
+
+    async def refresh(self, account_id: int, stale_token: Optional[str] = None) -> str:
+        return self.accounts[account_id].access_token
+
+def _percentile(samples: List[float], p: float) -> Optional[float]:
+    if not samples:
+        return None
+    rank = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+    return round(samples[rank], 4)
+
+async def run_load(
+    manager,
+    operation: str,
+    requests: int,
+    concurrency: int,
+    accounts: int,
+    platforms: List[str],
+    cached: bool = False
+) -> Dict:
+    """Esegue `requests` chiamate con al massimo `concurrency` in corso
+
+    Account e token del `manager` vengono sostituiti da quelli sintetici.
+    """
+    pool = [
+        SimpleNamespace(
+            id=account_id,
+            platform=platforms[account_id % len(platforms)],
+            access_token=f"loadtest-{account_id}",
+            refresh_token=f"loadtest-refresh-{account_id}",
+            token_expires_at=None
+        )
+        for account_id in range(1, accounts + 1)
+    ]
+    manager.tokens = InMemoryTokens({account.id: account for account in pool})
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call(number: int):
+        account = pool[number % len(pool)]
+        integration = manager.integration(account.platform)
+        if operation == "publish":
+            request = lambda token: integration.post(
+                access_token=token,
+                content=f"load test post {number}",
+                idempotency_key=f"loadtest-{number}"
+            )
+        else:
+            request = integration.get_insights
+
+        async with slots:
+            started = time.perf_counter()
+            try:
+                if cached and operation == "insights":
+                    await manager.insights_cache.get(account.id, lambda: manager._with_token(account, request))
+                else:
+                    await manager._with_token(account, request)
+            except Exception as e:
+                errors[getattr(e, "status_code", None) or type(e).__name__] += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(number) for number in range(requests)))
+    duration = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "operation": operation,
+        "requests": requests,
+        "succeeded": len(latencies),
+        "failed": sum(errors.values()),
+        "errors": {str(key): count for key, count in errors.items()},
+        "wall_seconds": round(duration, 3),
+        "throughput_per_second": round(len(latencies) / duration, 2) if duration else None,
+        "latency": {
+            "p50_seconds": _percentile(latencies, 50),
+            "p95_seconds": _percentile(latencies, 95),
+            "p99_seconds": _percentile(latencies, 99),
+            "max_seconds": round(latencies[-1], 4) if latencies else None
+        },
+        "platforms": manager.health()
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test di pubblicazione e insights")
+    parser.add_argument("--mock", help="URL del server simulato, es. http://127.0.0.1:9100")
+    parser.add_argument("--operation", choices=["publish", "insights"], default="publish")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--accounts", type=int, default=50, help="Account sintetici (i rate limit sono per account)")
+    parser.add_argument("--platform", action="append", choices=PLATFORMS, help="Piattaforme da usare (default tutte)")
+    parser.add_argument("--cached", action="store_true", help="Insights attraverso la cache del PlatformManager")
+    parser.add_argument("--rate-per-hour", type=int, help="Ritmo per account del governo dei rate limit (default nessun limite)")
+    args = parser.parse_args(argv)
+
+    # Le integrazioni leggono la configurazione alla creazione: va impostata prima
+    if args.mock:
+        from services.mock_platforms import integration_env
+        os.environ.update(integration_env(args.mock))
+    from services.http import transport
+    from services.platforms import PlatformManager
+    from services.ratelimit import governor
+
+    # Bucket e limiti del governo vengono creati alla prima chiamata
+    governor.rates = dict.fromkeys(PLATFORMS, args.rate_per_hour or UNTHROTTLED_RATE_PER_HOUR)
+    if not args.rate_per_hour:
+        governor.concurrency = max(governor.concurrency, args.concurrency)
+
+    async def run() -> Dict:
+        try:
+            return await run_load(
+                PlatformManager(),
+                args.operation,
+                args.requests,
+                args.concurrency,
+                args.accounts,
+                args.platform or PLATFORMS,
+                cached=args.cached
+            )
+        finally:
+            await transport.aclose()
+
+    json.dump(asyncio.run(run()), sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from services.http import get_session
+from services.registry import WEB_MEDIA, MediaConstraints, get_registry
+
+MEDIA_UPLOAD_DIR = os.getenv("MEDIA_UPLOAD_DIR", "media_uploads")
+MEDIA_PREPARED_DIR = os.getenv("MEDIA_PREPARED_DIR", os.path.join(MEDIA_UPLOAD_DIR, "prepared"))
+MEDIA_CACHE_SIZE = int(os.getenv("MEDIA_CACHE_SIZE", "1024"))
+MEDIA_FETCH_TIMEOUT = float(os.getenv("MEDIA_FETCH_TIMEOUT", "30"))
+# URL pubblico da cui le piattaforme scaricano i media preparati (es. CDN o
+# /media/prepared di questa applicazione); vuoto se non esposti
+MEDIA_PUBLIC_URL = os.getenv("MEDIA_PUBLIC_URL", "")
+
+# Dimensione dei blocchi letti e scritti: i media non vengono mai tenuti interi in memoria
+MEDIA_STREAM_CHUNK_SIZE = int(os.getenv("MEDIA_STREAM_CHUNK_SIZE", str(1024 * 1024)))
+
+class MediaPreparer:
+    """Prepara i media di un post una sola volta per variante di piattaforma
+
+    Il risultato è condiviso tra tutte le pubblicazioni dello stesso media:
+    i post di un cross-post pubblicati in parallelo attendono la stessa
+    preparazione invece di ripeterla.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = MEDIA_PREPARED_DIR,
+        cache_size: int = MEDIA_CACHE_SIZE,
+        public_url: str = MEDIA_PUBLIC_URL
+    ):
+        self.output_dir = output_dir
+        self.cache_size = cache_size
+        self.public_base_url = public_url.rstrip("/")
+        self._prepared: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    async def prepare(self, media_urls: Optional[List[str]], platform: str) -> List[str]:
+        """Percorsi dei media pronti per la piattaforma, nello stesso ordine"""
+        if not media_urls:
+            return []
+        variant = media_constraints(platform).variant
+        return list(await asyncio.gather(*(self._prepare_one(url, variant) for url in media_urls)))
+
+    async def _prepare_one(self, url: str, variant: str) -> str:
+        key = (url, variant)
+        if key in self._prepared:
+            self._prepared.move_to_end(key)
+            return self._prepared[key]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(self.prepare_media, url, variant))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._settle(key, done))
+        # Un chiamante annullato non deve annullare la preparazione degli altri
+        return await asyncio.shield(future)
+
+    def _settle(self, key: Tuple[str, str], future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._prepared[key] = future.result()
+        while len(self._prepared) > self.cache_size:
+            self._prepared.popitem(last=False)
+
+    def public_url(self, path: str) -> Optional[str]:
+        """URL pubblico di un media preparato, None se MEDIA_PUBLIC_URL non è configurato"""
+        if not self.public_base_url:
+            return None
+        relative = os.path.relpath(path, os.path.abspath(self.output_dir))
+        if relative.startswith(os.pardir):
+            return None
+        return f"{self.public_base_url}/{relative.replace(os.sep, '/')}"
+
+    def prepare_media(self, url: str, variant: str) -> str:
+        """Scarica, valida e salva il media nella variante richiesta
+
+        Il media viene copiato a blocchi in un file temporaneo, calcolando
+        l'hash durante la copia: anche un video di centinaia di MB non
+        viene mai caricato interamente in memoria. Il percorso restituito è
+        assoluto, così media_path non lo riporta sotto MEDIA_UPLOAD_DIR.
+        """
+        source_path = url.split("?", 1)[0]
+        mime_type, _ = mimetypes.guess_type(source_path)
+        constraints = variant_constraints(variant)
+        if constraints.types and mime_type not in constraints.types:
+            raise ValueError(f"Unsupported media type for {variant}: {url}")
+        max_bytes = constraints.max_bytes(mime_type)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = os.path.join(self.output_dir, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as buffer:
+                for chunk in self._read(url):
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise ValueError(f"Media too large for {variant}: {url}")
+                    digest.update(chunk)
+                    buffer.write(chunk)
+            extension = os.path.splitext(source_path)[1].lower()
+            path = os.path.join(self.output_dir, f"{digest.hexdigest()[:32]}_{variant}{extension}")
+            if not os.path.exists(path):
+                os.replace(tmp_path, path)
+            return os.path.abspath(path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _read(self, url: str) -> Iterator[bytes]:
+        if url.startswith(("http://", "https://")):
+            with get_session().get(url, timeout=MEDIA_FETCH_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                yield from response.iter_content(MEDIA_STREAM_CHUNK_SIZE)
+            return
+        with open(media_path(url), "rb") as source:
+            while True:
+                chunk = source.read(MEDIA_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+def media_constraints(platform: str) -> MediaConstraints:
+    """Vincoli sui media dichiarati dallo spec della piattaforma"""
+    spec = get_registry().find(platform)
+    return spec.media if spec else WEB_MEDIA
+
+def variant_constraints(variant: str) -> MediaConstraints:
+    """Vincoli della variante: quelli della prima piattaforma che la dichiara"""
+    registry = get_registry()
+    for name in registry.available():
+        media = registry.spec(name).media
+        if media.variant == variant:
+            return media
+    return WEB_MEDIA
+
+def media_path(url: str) -> str:
+    """Percorso locale di un media dello store (relativo a MEDIA_UPLOAD_DIR)"""
+    return url if os.path.isabs(url) else os.path.join(MEDIA_UPLOAD_DIR, url)
+
+class MediaSource:
+    """Media dello store letto per intervalli di byte, senza caricarlo tutto
+
+    I file locali vengono letti con seek; gli URL remoti con richieste
+    `Range`, così un caricamento ripreso legge solo la parte mancante.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.mime_type = mimetypes.guess_type(url.split("?", 1)[0])[0] or "application/octet-stream"
+        self.remote = url.startswith(("http://", "https://"))
+        if self.remote:
+            response = get_session().head(url, timeout=MEDIA_FETCH_TIMEOUT, allow_redirects=True)
+            response.raise_for_status()
+            self.size = int(response.headers["Content-Length"])
+        else:
+            self.size = os.path.getsize(media_path(url))
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Byte da `offset` a `offset + length` (esclusi)"""
+        length = max(0, min(length, self.size - offset))
+        if length == 0:
+            return b""
+        if self.remote:
+            response = get_session().get(
+                self.url,
+                headers={"Range": f"bytes={offset}-{offset + length - 1}"},
+                timeout=MEDIA_FETCH_TIMEOUT
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise ValueError(f"Media server does not support ranges: {self.url}")
+            return response.content
+        with open(media_path(self.url), "rb") as source:
+            source.seek(offset)
+            return source.read(length)
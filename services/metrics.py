@@ -0,0 +1,47 @@
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+class LagStats:
+    """Statistiche sul ritardo di pubblicazione (scheduled_time -> pubblicazione)
+
+    Mantiene gli ultimi `window` campioni per i percentili e i contatori
+    cumulativi dall'avvio del processo.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max_seconds = 0.0
+        self.last_published_at: Optional[datetime] = None
+
+    def record(self, scheduled_time: datetime, published_at: datetime):
+        lag = max((published_at - scheduled_time).total_seconds(), 0.0)
+        with self._lock:
+            self._samples.append(lag)
+            self.count += 1
+            self.max_seconds = max(self.max_seconds, lag)
+            self.last_published_at = published_at
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[rank]
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+            "max_seconds": self.max_seconds,
+            "last_published_at": self.last_published_at
+        }
+
+# Ritardo di pubblicazione misurato dal dispatcher di questo processo
+dispatch_lag = LagStats()
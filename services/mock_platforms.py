@@ -0,0 +1,558 @@
+"""Server locale che imita le API di Twitter, Instagram, Facebook e LinkedIn
+
+Serve gli stessi endpoint usati dalle integrazioni, con latenza log-normale,
+tasso di errore e rate limit configurabili per piattaforma, e restituisce
+gli header di rate limit di ciascuna piattaforma (x-rate-limit-* per
+Twitter, x-ratelimit-* per LinkedIn, x-app-usage per Meta). Serve per load
+test e benchmark dei percorsi di pubblicazione e insights senza rete.
+
+    python -m services.mock_platforms --port 9100 \\
+        --latency twitter=0.2 --latency instagram=0.8 --error-rate 0.01 \\
+        --rate-limit twitter=900 --rate-window 900
+
+Ogni piattaforma risponde sotto il proprio prefisso; `--print-env` stampa le
+variabili d'ambiente con cui puntarvi le integrazioni, ad esempio
+
+    TWITTER_API_BASE_URL=http://127.0.0.1:9100/twitter
+    TWITTER_TOKEN_URL=http://127.0.0.1:9100/twitter/2/oauth2/token
+
+I post creati tramite il server compaiono nelle liste e nelle metriche lette
+dalla sincronizzazione incrementale.
+
+GET /_stats restituisce i contatori per piattaforma, POST /_reset li azzera.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse
+from services.simulation import LatencyModel
+from services.smoothing import PLATFORMS
+
+MOCK_TOKEN_TTL = 3600
+
+# Percorso relativo al prefisso della piattaforma per URL base e token
+PLATFORM_PATHS = {
+    "twitter": ("", "/2/oauth2/token"),
+    "instagram": ("/v19.0", None),
+    "facebook": ("/v19.0", None),
+    "linkedin": ("", "/oauth/v2/accessToken")
+}
+
+class MockPlatform:
+    """Stato di una piattaforma simulata: quote per token, chiavi di idempotenza, contatori"""
+
+    def __init__(
+        self,
+        name: str,
+        latency: LatencyModel,
+        rate_limit: int = 0,
+        rate_window: float = 900,
+        token_ttl: int = MOCK_TOKEN_TTL,
+        seed: int = 0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.name = name
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.token_ttl = token_ttl
+        self.rng = random.Random(f"{seed}:{name}")
+        self.clock = clock
+        self._ids = itertools.count(1)
+        self._windows: Dict[str, Tuple[float, int]] = {}
+        self._responses: Dict[Tuple[str, str], Dict] = {}
+        self._posts: Dict[str, List[Dict]] = {}
+        self.reset()
+
+    def reset(self):
+        self._windows.clear()
+        self._responses.clear()
+        self._posts.clear()
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "replayed": 0, "created": 0}
+
+    def new_id(self) -> str:
+        return f"{self.name}-{next(self._ids)}"
+
+    def remember(self, token: str, text: str, prefix: str = "") -> str:
+        """Registra un post pubblicato con il token, così compare nelle liste"""
+        post_id = f"{prefix}{self.new_id()}"
+        self._posts.setdefault(token, []).append({"id": post_id, "text": text, "created": self.clock()})
+        return post_id
+
+    def timeline(self, token: str) -> List[Dict]:
+        """Post del token dal più recente"""
+        return self._posts.get(token, [])[::-1]
+
+    def post_metrics(self, token: str, post_id: str) -> Dict[str, int]:
+        return {name: self.metric(token, f"{post_id}:{name}") % 1000 for name in ("likes", "comments", "shares")}
+
+    def metric(self, token: str, name: str) -> int:
+        """Valore stabile per token e metrica, così le letture ripetute coincidono"""
+        return zlib.crc32(f"{self.name}:{token}:{name}".encode()) % 100000
+
+    def issue_token(self) -> Dict:
+        return {
+            "access_token": f"mock-{self.new_id()}",
+            "refresh_token": f"mock-refresh-{self.new_id()}",
+            "token_type": "bearer",
+            "expires_in": self.token_ttl
+        }
+
+    async def respond(self, request: Request, build: Callable[[], Dict], creates: bool = False) -> JSONResponse:
+        """Applica quota, latenza ed errori simulati, poi restituisce `build()`
+
+        Per le chiamate che creano contenuti la stessa Idempotency-Key
+        restituisce la risposta già data invece di creare un duplicato.
+        """
+        self.stats["requests"] += 1
+        token = _access_token(request)
+        allowed, headers = self._quota(token)
+        if not allowed:
+            self.stats["throttled"] += 1
+            return JSONResponse({"error": "rate limit exceeded"}, status_code=429, headers=headers)
+
+        if self.latency.median > 0:
+            await asyncio.sleep(self.latency.sample(self.rng))
+        if self.rng.random() < self.latency.error_rate:
+            self.stats["errors"] += 1
+            return JSONResponse({"error": "simulated platform error"}, status_code=503, headers=headers)
+
+        self.stats["ok"] += 1
+        key = request.headers.get("idempotency-key")
+        if creates and key:
+            replay = self._responses.get((request.url.path, key))
+            if replay is not None:
+                self.stats["replayed"] += 1
+                return JSONResponse(replay, headers=headers)
+        body = build()
+        if creates:
+            self.stats["created"] += 1
+            if key:
+                self._responses[(request.url.path, key)] = body
+        return JSONResponse(body, headers=headers)
+
+    def _quota(self, token: str) -> Tuple[bool, Dict[str, str]]:
+        """Finestra fissa di `rate_window` secondi con `rate_limit` richieste per token"""
+        if not self.rate_limit:
+            return True, {}
+        now = self.clock()
+        started, used = self._windows.get(token, (now, 0))
+        if now - started >= self.rate_window:
+            started, used = now, 0
+        allowed = used < self.rate_limit
+        if allowed:
+            used += 1
+        self._windows[token] = (started, used)
+        reset_at = started + self.rate_window
+        return allowed, self._rate_headers(used, reset_at - now, reset_at, allowed)
+
+    def _rate_headers(self, used: int, reset_in: float, reset_at: float, allowed: bool) -> Dict[str, str]:
+        remaining = max(self.rate_limit - used, 0)
+        if self.name == "twitter":
+            return {
+                "x-rate-limit-limit": str(self.rate_limit),
+                "x-rate-limit-remaining": str(remaining),
+                "x-rate-limit-reset": str(int(reset_at))
+            }
+        if self.name in ("instagram", "facebook"):
+            usage = min(round(used * 100 / self.rate_limit), 100)
+            headers = {"x-app-usage": json.dumps({"call_count": usage, "total_time": usage // 2, "total_cputime": usage // 2})}
+            if not allowed:
+                headers["x-business-use-case-usage"] = json.dumps({"mock": [{
+                    "type": self.name,
+                    "call_count": 100,
+                    "estimated_time_to_regain_access": math.ceil(reset_in / 60)
+                }]})
+            return headers
+        headers = {
+            "x-ratelimit-limit": str(self.rate_limit),
+            "x-ratelimit-remaining": str(remaining),
+            "x-ratelimit-reset": str(math.ceil(reset_in))
+        }
+        if not allowed:
+            headers["retry-after"] = str(math.ceil(reset_in))
+        return headers
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+def _access_token(request: Request) -> str:
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return request.query_params.get("access_token") or request.query_params.get("fb_exchange_token") or ""
+
+async def _json(request: Request) -> Dict:
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+def _graph_insights(platform: MockPlatform, request: Request) -> Dict:
+    token = _access_token(request)
+    metrics = request.query_params.get("metric", "impressions").split(",")
+    period = request.query_params.get("period", "day")
+    return {"data": [
+        {"name": name, "period": period, "values": [{"value": platform.metric(token, name)}]}
+        for name in metrics
+    ]}
+
+def _page(items: List, offset, size, default_size: int = 100) -> Tuple[List, Optional[str]]:
+    """Fetta di una lista e offset della pagina successiva (None se finita)"""
+    offset, size = int(offset or 0), int(size or default_size)
+    end = offset + size
+    return items[offset:end], (str(end) if end < len(items) else None)
+
+def _graph_list(platform: MockPlatform, request: Request, text_field: str, time_field: str, extra) -> Dict:
+    token = _access_token(request)
+    posts = platform.timeline(token)
+    since = request.query_params.get("since")
+    if since:
+        posts = [post for post in posts if post["created"] >= float(since)]
+    page, after = _page(posts, request.query_params.get("after"), request.query_params.get("limit"))
+    data = {"data": [
+        {"id": post["id"], text_field: post["text"], time_field: _iso(post["created"]), **extra(token, post["id"])}
+        for post in page
+    ]}
+    if after:
+        data["paging"] = {"cursors": {"after": after}, "next": f"{request.url.path}?after={after}"}
+    return data
+
+def _graph_objects(platform: MockPlatform, request: Request, fields) -> Dict:
+    token = _access_token(request)
+    return {
+        post_id: {"id": post_id, "comments": {"data": []}, **fields(token, post_id)}
+        for post_id in request.query_params.get("ids", "").split(",") if post_id
+    }
+
+def twitter_router(platform: MockPlatform) -> APIRouter:
+    router = APIRouter(prefix="/twitter")
+
+    def tweet(token: str, post: Dict) -> Dict:
+        metrics = platform.post_metrics(token, post["id"])
+        return {
+            "id": post["id"],
+            "text": post["text"],
+            "created_at": _iso(post["created"]),
+            "public_metrics": {
+                "like_count": metrics["likes"],
+                "reply_count": metrics["comments"],
+                "retweet_count": metrics["shares"],
+                "quote_count": 0
+            }
+        }
+
+    @router.post("/2/tweets")
+    async def create_tweet(request: Request):
+        token = _access_token(request)
+        body = await _json(request)
+        return await platform.respond(
+            request, lambda: {"data": {"id": platform.remember(token, body.get("text", "")), "text": body.get("text", "")}},
+            creates=True
+        )
+
+    @router.get("/2/users/me")
+    async def users_me(request: Request):
+        token = _access_token(request)
+        return await platform.respond(request, lambda: {"data": {
+            "id": f"user-{zlib.crc32(token.encode())}",
+            "public_metrics": {
+                name: platform.metric(token, name)
+                for name in ("followers_count", "following_count", "tweet_count", "listed_count")
+            }
+        }})
+
+    @router.get("/2/users/{user_id}/tweets")
+    async def user_tweets(user_id: str, request: Request):
+        token = _access_token(request)
+
+        def build() -> Dict:
+            posts = platform.timeline(token)
+            since_id = request.query_params.get("since_id")
+            ids = [post["id"] for post in posts]
+            if since_id in ids:
+                posts = posts[:ids.index(since_id)]
+            page, next_token = _page(
+                posts, request.query_params.get("pagination_token"), request.query_params.get("max_results")
+            )
+            meta = {"result_count": len(page)}
+            if posts:
+                meta["newest_id"] = posts[0]["id"]
+            if next_token:
+                meta["next_token"] = next_token
+            return {"data": [tweet(token, post) for post in page], "meta": meta}
+
+        return await platform.respond(request, build)
+
+    @router.get("/2/tweets")
+    async def lookup(request: Request):
+        token = _access_token(request)
+        ids = request.query_params.get("ids", "").split(",")
+        return await platform.respond(request, lambda: {"data": [
+            tweet(token, post) for post in platform.timeline(token) if post["id"] in ids
+        ]})
+
+    @router.get("/2/tweets/search/recent")
+    async def search(request: Request):
+        return await platform.respond(request, lambda: {"meta": {"result_count": 0}})
+
+    @router.post("/2/oauth2/token")
+    async def token(request: Request):
+        return await platform.respond(request, platform.issue_token)
+
+    return router
+
+def instagram_router(platform: MockPlatform) -> APIRouter:
+    router = APIRouter(prefix="/instagram/v19.0")
+    captions: Dict[str, str] = {}
+
+    def metrics(token: str, post_id: str) -> Dict:
+        values = platform.post_metrics(token, post_id)
+        return {"like_count": values["likes"], "comments_count": values["comments"]}
+
+    @router.post("/me/media")
+    async def create_container(request: Request):
+        body = await _json(request)
+
+        def build() -> Dict:
+            container_id = platform.new_id()
+            captions[container_id] = body.get("caption", "")
+            return {"id": container_id}
+
+        return await platform.respond(request, build, creates=True)
+
+    @router.post("/me/media_publish")
+    async def publish_container(request: Request):
+        token = _access_token(request)
+        body = await _json(request)
+        return await platform.respond(
+            request,
+            lambda: {"id": platform.remember(token, captions.pop(body.get("creation_id"), ""))},
+            creates=True
+        )
+
+    @router.get("/me/media")
+    async def list_media(request: Request):
+        return await platform.respond(request, lambda: _graph_list(platform, request, "caption", "timestamp", metrics))
+
+    @router.get("/")
+    async def objects(request: Request):
+        return await platform.respond(request, lambda: _graph_objects(platform, request, metrics))
+
+    @router.get("/me/insights")
+    async def insights(request: Request):
+        return await platform.respond(request, lambda: _graph_insights(platform, request))
+
+    @router.get("/refresh_access_token")
+    async def refresh(request: Request):
+        return await platform.respond(request, platform.issue_token)
+
+    return router
+
+def facebook_router(platform: MockPlatform) -> APIRouter:
+    router = APIRouter(prefix="/facebook/v19.0")
+
+    def metrics(token: str, post_id: str) -> Dict:
+        values = platform.post_metrics(token, post_id)
+        return {
+            "reactions": {"data": [], "summary": {"total_count": values["likes"]}},
+            "comments": {"data": [], "summary": {"total_count": values["comments"]}},
+            "shares": {"count": values["shares"]}
+        }
+
+    @router.post("/me/feed")
+    async def create_post(request: Request):
+        token = _access_token(request)
+        body = await _json(request)
+        return await platform.respond(
+            request, lambda: {"id": platform.remember(token, body.get("message", ""))}, creates=True
+        )
+
+    @router.get("/me/posts")
+    async def list_posts(request: Request):
+        return await platform.respond(request, lambda: _graph_list(platform, request, "message", "created_time", metrics))
+
+    @router.get("/")
+    async def objects(request: Request):
+        return await platform.respond(request, lambda: _graph_objects(platform, request, metrics))
+
+    @router.get("/me/insights")
+    async def insights(request: Request):
+        return await platform.respond(request, lambda: _graph_insights(platform, request))
+
+    @router.get("/oauth/access_token")
+    async def exchange(request: Request):
+        return await platform.respond(request, platform.issue_token)
+
+    return router
+
+def linkedin_router(platform: MockPlatform) -> APIRouter:
+    router = APIRouter(prefix="/linkedin")
+
+    @router.get("/v2/userinfo")
+    async def userinfo(request: Request):
+        token = _access_token(request)
+        return await platform.respond(request, lambda: {"sub": str(zlib.crc32(token.encode()))})
+
+    @router.post("/v2/ugcPosts")
+    async def create_post(request: Request):
+        token = _access_token(request)
+        body = await _json(request)
+        text = (
+            body.get("specificContent", {})
+            .get("com.linkedin.ugc.ShareContent", {})
+            .get("shareCommentary", {})
+            .get("text", "")
+        )
+        return await platform.respond(
+            request, lambda: {"id": platform.remember(token, text, prefix="urn:li:share:")}, creates=True
+        )
+
+    @router.get("/v2/ugcPosts")
+    async def list_posts(request: Request):
+        token = _access_token(request)
+
+        def build() -> Dict:
+            page, _ = _page(
+                platform.timeline(token), request.query_params.get("start"), request.query_params.get("count"), 50
+            )
+            return {"elements": [
+                {
+                    "id": post["id"],
+                    "created": {"time": int(post["created"] * 1000)},
+                    "specificContent": {"com.linkedin.ugc.ShareContent": {"shareCommentary": {"text": post["text"]}}}
+                }
+                for post in page
+            ]}
+
+        return await platform.respond(request, build)
+
+    @router.get("/v2/socialActions")
+    async def social_actions(request: Request):
+        token = _access_token(request)
+        ids = unquote(request.query_params.get("ids", "")[len("List("):-1]).split(",")
+
+        def build() -> Dict:
+            results = {}
+            for urn in filter(None, ids):
+                values = platform.post_metrics(token, urn)
+                results[urn] = {
+                    "likesSummary": {"totalLikes": values["likes"]},
+                    "commentsSummary": {"aggregatedTotalComments": values["comments"]}
+                }
+            return {"results": results}
+
+        return await platform.respond(request, build)
+
+    @router.get("/v2/socialActions/{urn}/comments")
+    async def comments(urn: str, request: Request):
+        return await platform.respond(request, lambda: {"elements": []})
+
+    @router.get("/v2/networkSizes/{urn}")
+    async def network_size(urn: str, request: Request):
+        token = _access_token(request)
+        return await platform.respond(request, lambda: {"firstDegreeSize": platform.metric(token, "firstDegreeSize")})
+
+    @router.post("/oauth/v2/accessToken")
+    async def token(request: Request):
+        return await platform.respond(request, platform.issue_token)
+
+    return router
+
+PLATFORM_ROUTERS = {
+    "twitter": twitter_router,
+    "instagram": instagram_router,
+    "facebook": facebook_router,
+    "linkedin": linkedin_router
+}
+
+def create_app(platforms: Optional[Dict[str, MockPlatform]] = None, seed: int = 0) -> FastAPI:
+    """App FastAPI con tutte le piattaforme simulate"""
+    if platforms is None:
+        platforms = {name: MockPlatform(name, LatencyModel(), seed=seed) for name in PLATFORMS}
+    app = FastAPI(title="Mock social platforms")
+    app.state.platforms = platforms
+    for name, platform in platforms.items():
+        app.include_router(PLATFORM_ROUTERS[name](platform))
+
+    @app.get("/_stats")
+    async def stats():
+        return {name: platform.stats for name, platform in platforms.items()}
+
+    @app.post("/_reset")
+    async def reset():
+        for platform in platforms.values():
+            platform.reset()
+        return {"status": "reset"}
+
+    return app
+
+def integration_env(base_url: str) -> Dict[str, str]:
+    """Variabili d'ambiente che puntano le integrazioni al server simulato"""
+    base_url = base_url.rstrip("/")
+    env = {}
+    for name, (api_path, token_path) in PLATFORM_PATHS.items():
+        env[f"{name.upper()}_API_BASE_URL"] = f"{base_url}/{name}{api_path}"
+        if token_path:
+            env[f"{name.upper()}_TOKEN_URL"] = f"{base_url}/{name}{token_path}"
+    return env
+
+def _per_platform(values: List[str], default: float, cast=float) -> Dict[str, float]:
+    """Valori `piattaforma=valore` (o un valore unico per tutte)"""
+    result = {name: default for name in PLATFORMS}
+    for value in values:
+        if "=" in value:
+            name, number = value.split("=", 1)
+            result[name] = cast(number)
+        else:
+            result = {name: cast(value) for name in PLATFORMS}
+    return result
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Server locale che imita le API delle piattaforme")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", action="append", default=[], help="Latenza mediana in secondi, es. twitter=0.3")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Dispersione log-normale della latenza")
+    parser.add_argument("--error-rate", action="append", default=[], help="Tasso di risposte 503, es. 0.01 o facebook=0.05")
+    parser.add_argument("--rate-limit", action="append", default=[], help="Richieste per token e finestra (0 = nessun limite)")
+    parser.add_argument("--rate-window", type=float, default=900, help="Durata della finestra di rate limit in secondi")
+    parser.add_argument("--token-ttl", type=int, default=MOCK_TOKEN_TTL, help="expires_in dei token rinnovati")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--print-env", action="store_true", help="Stampa le variabili per le integrazioni ed esce")
+    args = parser.parse_args(argv)
+
+    if args.print_env:
+        for name, value in integration_env(f"http://{args.host}:{args.port}").items():
+            print(f"{name}={value}")
+        return
+
+    latencies = _per_platform(args.latency, 0.3)
+    error_rates = _per_platform(args.error_rate, 0.0)
+    rate_limits = _per_platform(args.rate_limit, 0, cast=int)
+    platforms = {
+        name: MockPlatform(
+            name,
+            LatencyModel(median=latencies[name], sigma=args.sigma, error_rate=error_rates[name]),
+            rate_limit=int(rate_limits[name]),
+            rate_window=args.rate_window,
+            token_ttl=args.token_ttl,
+            seed=args.seed
+        )
+        for name in PLATFORMS
+    }
+
+    import uvicorn
+    uvicorn.run(create_app(platforms), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
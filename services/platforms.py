@@ -1,30 +1,93 @@
+import asyncio
+import importlib
 import os
-from typing import Dict, Optional, List
+import threading
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, Optional, List
 from database import SessionLocal
 from models import SocialAccount
-from config import settings
+from services.cache import AsyncTTLCache
+from services.circuit import Bulkhead, CircuitBreaker
+from services.integrations.base import PlatformAPIError
+from services.ratelimit import current_account
+from services.registry import PlatformRegistry, get_registry
+from services.retry import is_retryable
+from services.tokens import TokenManager
+from services.uploads import ChunkedUploader
+
+# Richieste di insights contemporanee per una richiesta batch
+INSIGHTS_CONCURRENCY = int(os.getenv("INSIGHTS_CONCURRENCY", "20"))
+# Insights riusati senza chiamate entro il TTL, poi serviti mentre si aggiornano
+INSIGHTS_CACHE_TTL = float(os.getenv("INSIGHTS_CACHE_TTL_SECONDS", "300"))
+INSIGHTS_CACHE_STALE_TTL = float(os.getenv("INSIGHTS_CACHE_STALE_TTL_SECONDS", "3600"))
+INSIGHTS_CACHE_SIZE = int(os.getenv("INSIGHTS_CACHE_SIZE", "10000"))
+# Chiamate contemporanee per piattaforma (bulkhead) se lo spec non le indica
+# (il limite è `bulkhead_size`), attesa massima per uno slot e durata massima
+# di una chiamata, oltre la quale conta come errore
+DEFAULT_PLATFORM_BULKHEAD = 8
+# Insights e sincronizzazione hanno un bulkhead proprio (`read_bulkhead_size`):
+# un job di analytics non toglie slot alle pubblicazioni
+DEFAULT_READ_BULKHEAD = 4
+BULKHEAD_MAX_WAIT = float(os.getenv("BULKHEAD_MAX_WAIT_SECONDS", "2"))
+PLATFORM_CALL_TIMEOUT = float(os.getenv("PLATFORM_CALL_TIMEOUT_SECONDS", "60"))
+# Campi con cui le integrazioni restituiscono l'ID del post pubblicato
+PUBLISHED_ID_FIELDS = ("tweet_id", "media_id", "post_id", "update_id", "id")
 
 class PlatformManager:
-    def __init__(self):
-        self.platforms = {
-            "twitter": TwitterIntegration(),
-            "instagram": InstagramIntegration(),
-            "facebook": FacebookIntegration(),
-            "linkedin": LinkedInIntegration()
-        }
+    """Punto di accesso alle integrazioni delle piattaforme
+
+    Usare get_platform_manager(): l'istanza è condivisa dal processo, così le
+    integrazioni (e lo stato che conservano) sopravvivono tra le richieste.
+    Le piattaforme vengono dal registro (services.registry): solo quelle
+    abilitate nel processo, e ciascuna importata alla prima richiesta.
+    """
+
+    def __init__(self, integrations: Optional[Dict[str, str]] = None, registry: Optional[PlatformRegistry] = None):
+        self.registry = registry or get_registry()
+        self.integrations = dict(self.registry.integrations(), **(integrations or {}))
+        self._instances: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.insights_cache = AsyncTTLCache(
+            ttl=INSIGHTS_CACHE_TTL,
+            stale_ttl=INSIGHTS_CACHE_STALE_TTL,
+            max_entries=INSIGHTS_CACHE_SIZE
+        )
+        self.tokens = TokenManager(self)
+        self.uploads = ChunkedUploader(self)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.bulkheads: Dict[str, Bulkhead] = {}
+
+    def integration(self, platform: str):
+        """Integrazione della piattaforma, creata alla prima richiesta"""
+        instance = self._instances.get(platform)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(platform)
+            if instance is None:
+                path = self.integrations.get(platform)
+                if path is None:
+                    if self.registry.find(platform) is not None:
+                        raise ValueError(f"Platform not enabled in this worker: {platform}")
+                    raise ValueError(f"Unsupported platform: {platform}")
+                module_name, class_name = path.split(":")
+                instance = getattr(importlib.import_module(module_name), class_name)()
+                self._instances[platform] = instance
+        return instance
         
     def connect_account(self, platform: str, auth_data: Dict) -> SocialAccount:
         """Connetti un account social"""
-        if platform not in self.platforms:
-            raise ValueError(f"Unsupported platform: {platform}")
-            
-        integration = self.platforms[platform]
+        integration = self.integration(platform)
         account_data = integration.connect(auth_data)
         
         account = SocialAccount(
             platform=platform,
             access_token=account_data["access_token"],
             refresh_token=account_data.get("refresh_token"),
+            token_expires_at=(
+                datetime.now() + timedelta(seconds=int(account_data["expires_in"]))
+                if account_data.get("expires_in") else None
+            ),
             user_id=account_data["user_id"],
             username=account_data["username"]
         )
@@ -36,84 +99,215 @@ class PlatformManager:
             session.close()
         return account
         
-    def post_content(self, account_id: int, content: str, media_urls: List[str] = None) -> Dict:
-        """Pubblica contenuto su un account"""
-        account = SocialAccount.query.get(account_id)
-        if not account:
-            raise ValueError("Account not found")
+    async def post_content(
+        self,
+        account_id: int,
+        content: str,
+        media_urls: List[str] = None,
+        idempotency_key: str = None,
+        published_since: Optional[datetime] = None
+    ) -> Dict:
+        """Pubblica contenuto su un account
+
+        Le API delle piattaforme ignorano l'header Idempotency-Key: dopo un
+        timeout o un 5xx il post può essere stato creato comunque. Per i
+        nuovi tentativi (`published_since` indicato) si cerca prima tra i
+        post recenti dell'account uno con lo stesso contenuto creato da
+        allora e, se c'è, viene restituito al posto di pubblicarne un altro.
+        I media che la piattaforma vuole ricevere come file (es. i video)
+        vengono prima caricati a blocchi; un tentativo successivo riprende il
+        caricamento dall'ultimo blocco confermato.
+        """
+        account = await asyncio.to_thread(self._get_account, account_id)
             
-        integration = self.platforms[account.platform]
-        return integration.post(
-            access_token=account.access_token,
+        integration = self.integration(account.platform)
+        if published_since is not None:
+            existing = await self._find_published(account, integration, content, published_since)
+            if existing:
+                return existing
+        media_urls = media_urls or []
+        uploaded = [url for url in media_urls if integration.uploads_media(url)]
+        media_ids = [await self.uploads.upload(account, url) for url in uploaded]
+        return await self._with_token(account, lambda token: integration.post(
+            access_token=token,
             content=content,
-            media_urls=media_urls
-        )
+            media_urls=[url for url in media_urls if url not in uploaded],
+            idempotency_key=idempotency_key,
+            media_ids=media_ids or None
+        ))
         
-    def get_insights(self, account_id: int) -> Dict:
-        """Ottieni insights da un account"""
-        account = SocialAccount.query.get(account_id)
-        if not account:
-            raise ValueError("Account not found")
-            
-        integration = self.platforms[account.platform]
-        return integration.get_insights(account.access_token)
+    async def _find_published(self, account: SocialAccount, integration, content: str, since: datetime) -> Optional[Dict]:
+        """Post dell'account con questo contenuto creato dopo `since`, nella prima pagina della timeline"""
+        spec = self.registry.find(account.platform)
+        if spec is not None and not spec.supports("sync"):
+            return None
+        posts, _, _ = await self._with_token(account, lambda token: integration.sync_posts(token, {}, since))
+        for post in posts:
+            created_at = post.get("created_at")
+            if (post.get("content") or "").strip() == (content or "").strip() and (created_at is None or created_at >= since):
+                return {"status": "success", "id": post["id"], "recovered": True}
+        return None
 
-class TwitterIntegration:
-    def connect(self, auth_data: Dict) -> Dict:
-        """Implementazione connessione Twitter"""
-        # Implementazione dettagliata omessa per brevità
-        return {
-            "access_token": "twitter_access_token",
-            "user_id": "twitter_user_id",
-            "username": "twitter_username"
-        }
-        
-    def post(self, access_token: str, content: str, media_urls: List[str] = None) -> Dict:
-        """Implementazione pubblicazione Twitter"""
-        # Implementazione dettagliata omessa per brevità
-        return {"status": "success", "tweet_id": "123456789"}
-
-class InstagramIntegration:
-    def connect(self, auth_data: Dict) -> Dict:
-        """Implementazione connessione Instagram"""
-        # Implementazione dettagliata omessa per brevità
-        return {
-            "access_token": "instagram_access_token",
-            "user_id": "instagram_user_id",
-            "username": "instagram_username"
-        }
-        
-    def post(self, access_token: str, content: str, media_urls: List[str] = None) -> Dict:
-        """Implementazione pubblicazione Instagram"""
-        # Implementazione dettagliata omessa per brevità
-        return {"status": "success", "media_id": "987654321"}
-
-class FacebookIntegration:
-    def connect(self, auth_data: Dict) -> Dict:
-        """Implementazione connessione Facebook"""
-        # Implementazione dettagliata omessa per brevità
-        return {
-            "access_token": "facebook_access_token",
-            "user_id": "facebook_user_id",
-            "username": "facebook_username"
-        }
-        
-    def post(self, access_token: str, content: str, media_urls: List[str] = None) -> Dict:
-        """Implementazione pubblicazione Facebook"""
-        # Implementazione dettagliata omessa per brevità
-        return {"status": "success", "post_id": "1122334455"}
-
-class LinkedInIntegration:
-    def connect(self, auth_data: Dict) -> Dict:
-        """Implementazione connessione LinkedIn"""
-        # Implementazione dettagliata omessa per brevità
+    async def get_insights(self, account_id: int) -> Dict:
+        """Ottieni insights da un account
+
+        Le richieste passano dalla cache: dashboard e job di analytics che
+        chiedono lo stesso account condividono un'unica chiamata.
+        """
+        async def load():
+            account = await asyncio.to_thread(self._get_account, account_id)
+            return await self._with_token(account, self.integration(account.platform).get_insights, pool="read")
+
+        return await self.insights_cache.get(account_id, load)
+
+    async def iter_insights(
+        self,
+        account_ids: Iterable[int],
+        concurrency: int = INSIGHTS_CONCURRENCY
+    ) -> AsyncIterator[Dict]:
+        """Insights di più account in parallelo, restituiti man mano che arrivano
+
+        Al massimo `concurrency` richieste sono in corso contemporaneamente.
+        Un account in errore produce un evento `error` senza interrompere gli
+        altri; se il consumatore smette di leggere le richieste rimaste
+        vengono annullate.
+        """
+        account_ids = list(dict.fromkeys(account_ids))
+        accounts = await asyncio.to_thread(self._get_accounts, account_ids)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def fetch(account_id: int) -> Dict:
+            account = accounts.get(account_id)
+            if account is None:
+                return {"account_id": account_id, "error": "Account not found"}
+
+            async def load():
+                async with slots:
+                    return await self._with_token(account, self.integration(account.platform).get_insights, pool="read")
+
+            try:
+                insights = await self.insights_cache.get(account_id, load)
+            except Exception as e:
+                return {"account_id": account_id, "platform": account.platform, "error": str(e) or type(e).__name__}
+            return {"account_id": account_id, "platform": account.platform, "insights": insights}
+
+        tasks = [asyncio.ensure_future(fetch(account_id)) for account_id in account_ids]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def breaker(self, platform: str) -> CircuitBreaker:
+        breaker = self.breakers.get(platform)
+        if breaker is None:
+            breaker = self.breakers.setdefault(platform, CircuitBreaker(platform))
+        return breaker
+
+    def bulkhead(self, platform: str, pool: str = "publish") -> Bulkhead:
+        """Bulkhead della piattaforma per le pubblicazioni (`publish`) o le letture (`read`)"""
+        key = platform if pool == "publish" else f"{platform}:{pool}"
+        bulkhead = self.bulkheads.get(key)
+        if bulkhead is None:
+            spec = self.registry.find(platform)
+            if pool == "publish":
+                limit = int(spec.limit("bulkhead_size", DEFAULT_PLATFORM_BULKHEAD)) if spec else DEFAULT_PLATFORM_BULKHEAD
+            else:
+                limit = int(spec.limit("read_bulkhead_size", DEFAULT_READ_BULKHEAD)) if spec else DEFAULT_READ_BULKHEAD
+            bulkhead = self.bulkheads.setdefault(key, Bulkhead(key, limit, BULKHEAD_MAX_WAIT))
+        return bulkhead
+
+    def health(self) -> Dict[str, Dict]:
+        """Stato di circuit breaker e bulkhead delle piattaforme già usate"""
         return {
-            "access_token": "linkedin_access_token",
-            "user_id": "linkedin_user_id",
-            "username": "linkedin_username"
+            platform: {
+                **breaker.snapshot(),
+                **self.bulkhead(platform).snapshot(),
+                "read": self.bulkhead(platform, "read").snapshot()
+            }
+            for platform, breaker in self.breakers.items()
         }
-        
-    def post(self, access_token: str, content: str, media_urls: List[str] = None) -> Dict:
-        """Implementazione pubblicazione LinkedIn"""
-        # Implementazione dettagliata omessa per brevità
-        return {"status": "success", "update_id": "9988776655"}
\ No newline at end of file
+
+    async def call(self, account: SocialAccount, call, pool: str = "publish"):
+        """Esegue `call(token)` per l'account con le stesse protezioni di post e insights"""
+        return await self._with_token(account, call, pool)
+
+    async def _with_token(self, account: SocialAccount, call, pool: str = "publish"):
+        """Esegue `call(token)` isolando la piattaforma dell'account
+
+        Se il circuito della piattaforma è aperto o il bulkhead del `pool`
+        è pieno la chiamata fallisce subito, senza occupare worker. Timeout
+        ed errori temporanei contano come guasti della piattaforma; gli
+        errori del client (4xx) no.
+        """
+        breaker = self.breaker(account.platform)
+        breaker.before_call()
+        healthy = None
+        try:
+            async with self.bulkhead(account.platform, pool):
+                try:
+                    result = await asyncio.wait_for(self._call_with_token(account, call), PLATFORM_CALL_TIMEOUT)
+                except Exception as e:
+                    healthy = not is_retryable(e)
+                    raise
+                healthy = True
+                return result
+        finally:
+            breaker.record(healthy)
+
+    async def _call_with_token(self, account: SocialAccount, call):
+        """Esegue `call(token)`; su 401 rinnova il token una volta e riprova
+
+        Le chiamate fatte qui dentro sono attribuite all'account dal
+        governo dei rate limit.
+        """
+        context = current_account.set(account.id)
+        try:
+            token = await self.tokens.access_token(account)
+            try:
+                return await call(token)
+            except PlatformAPIError as e:
+                if e.status_code != 401:
+                    raise
+            token = await self.tokens.refresh(account.id, stale_token=token)
+            return await call(token)
+        finally:
+            current_account.reset(context)
+
+    def _get_accounts(self, account_ids: List[int]) -> Dict[int, SocialAccount]:
+        session = SessionLocal()
+        try:
+            accounts = session.query(SocialAccount).filter(SocialAccount.id.in_(account_ids)).all()
+        finally:
+            session.close()
+        return {account.id: account for account in accounts}
+
+    def _get_account(self, account_id: int) -> SocialAccount:
+        session = SessionLocal()
+        try:
+            account = session.get(SocialAccount, account_id)
+        finally:
+            session.close()
+        if not account:
+            raise ValueError("Account not found")
+        return account
+
+_manager: Optional[PlatformManager] = None
+_manager_lock = threading.Lock()
+
+def get_platform_manager() -> PlatformManager:
+    """PlatformManager condiviso dal processo"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = PlatformManager()
+    return _manager
+
+def published_post_id(result: Optional[Dict]) -> Optional[str]:
+    """ID del post sulla piattaforma dal risultato di una pubblicazione"""
+    for field in PUBLISHED_ID_FIELDS:
+        if result and result.get(field):
+            return str(result[field])
+    return None
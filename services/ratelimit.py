@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Mapping, Optional, Tuple
+from services.registry import get_registry
+
+# Richieste all'ora consentite per account, prima di ogni indicazione della
+# piattaforma: il limite `rate_limit_per_hour` dello spec, altrimenti questo
+DEFAULT_RATE_LIMIT = 200
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+# Concorrenza adattiva (AIMD) per piattaforma: valore iniziale e limiti
+RATE_LIMIT_CONCURRENCY = int(os.getenv("RATE_LIMIT_CONCURRENCY", "16"))
+RATE_LIMIT_MAX_CONCURRENCY = int(os.getenv("RATE_LIMIT_MAX_CONCURRENCY", "64"))
+# Pausa dopo un 429 senza Retry-After
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "30"))
+# Percentuale d'uso (header Meta) oltre la quale si riduce la concorrenza
+META_USAGE_SLOWDOWN = float(os.getenv("META_USAGE_SLOWDOWN_PERCENT", "90"))
+
+# Account per cui si sta chiamando la piattaforma, impostato da PlatformManager
+current_account: ContextVar[Optional[int]] = ContextVar("current_account", default=None)
+
+class TokenBucket:
+    """Bucket a gettoni con prenotazione: chi non trova gettoni riceve l'attesa"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        """Prende un gettone e restituisce i secondi da attendere prima di usarlo"""
+        now = self._refill()
+        self.tokens -= 1
+        wait = max(self.blocked_until - now, 0.0)
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+    def limit_remaining(self, remaining: int, reset_seconds: Optional[float]):
+        """Allinea il bucket alla quota che la piattaforma dice di avere ancora
+
+        Con l'istante di reset noto il ritmo diventa quello che consuma
+        esattamente la quota residua entro il reset.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+        if reset_seconds:
+            self.rate = max(remaining, 1) / reset_seconds
+            if remaining <= 0:
+                self.block(reset_seconds)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def _refill(self) -> float:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+class AIMDLimiter:
+    """Limite di concorrenza additive-increase / multiplicative-decrease
+
+    Ogni risposta buona alza il limite di 1/limite (circa +1 per "giro"),
+    ogni throttling lo dimezza.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = RATE_LIMIT_MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Svegliato proprio mentre veniva annullato: il turno passa al prossimo in attesa
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self, throttled: bool = False, success: bool = True):
+        self.in_flight -= 1
+        if throttled:
+            self.limit = max(self.minimum, self.limit / 2)
+        elif success:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+class RateLimitGovernor:
+    """Governo unico delle chiamate verso le piattaforme
+
+    Un bucket per (piattaforma, account) tiene il ritmo delle richieste e
+    viene corretto con gli header di rate limit delle risposte; un limite
+    AIMD per piattaforma riduce la concorrenza appena arriva un throttling.
+    Pubblicazioni, insights e sincronizzazioni passano tutti da qui.
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, int]] = None,
+        burst: int = RATE_LIMIT_BURST,
+        concurrency: int = RATE_LIMIT_CONCURRENCY,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.rates = dict(rates or {})
+        self.burst = burst
+        self.concurrency = concurrency
+        self.clock = clock
+        self._buckets: Dict[Tuple[str, Optional[int]], TokenBucket] = {}
+        self._limiters: Dict[str, AIMDLimiter] = {}
+
+    def bucket(self, platform: str, account_id: Optional[int]) -> TokenBucket:
+        key = (platform, account_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            per_hour = self.rates.get(platform) or _declared_rate(platform)
+            bucket = TokenBucket(per_hour / 3600, self.burst, self.clock)
+            self._buckets[key] = bucket
+        return bucket
+
+    def limiter(self, platform: str) -> AIMDLimiter:
+        limiter = self._limiters.get(platform)
+        if limiter is None:
+            limiter = AIMDLimiter(self.concurrency)
+            self._limiters[platform] = limiter
+        return limiter
+
+    async def acquire(self, platform: str, account_id: Optional[int] = None):
+        wait = self.bucket(platform, account_id).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self.limiter(platform).acquire()
+
+    def release(self, platform: str, account_id: Optional[int] = None, response=None):
+        """Chiude una chiamata; `response` (se presente) aggiorna bucket e limite"""
+        if response is None:
+            self.limiter(platform).release(success=False)
+            return
+
+        status = response.status_code
+        limits = parse_rate_limit_headers(response.headers)
+        bucket = self.bucket(platform, account_id)
+        if limits["remaining"] is not None:
+            bucket.limit_remaining(limits["remaining"], limits["reset"])
+        if limits["retry_after"]:
+            bucket.block(limits["retry_after"])
+
+        throttled = status == 429 or (limits["usage"] is not None and limits["usage"] >= META_USAGE_SLOWDOWN)
+        if status == 429 and not limits["retry_after"]:
+            bucket.block(limits["reset"] or RATE_LIMIT_BACKOFF_SECONDS)
+        self.limiter(platform).release(throttled=throttled, success=status < 500)
+
+def _declared_rate(platform: str) -> float:
+    spec = get_registry().find(platform)
+    return spec.limit("rate_limit_per_hour", DEFAULT_RATE_LIMIT) if spec else DEFAULT_RATE_LIMIT
+
+def parse_rate_limit_headers(headers: Mapping[str, str], now: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """Estrae dagli header le informazioni di rate limit delle piattaforme
+
+    - Twitter: x-rate-limit-remaining / x-rate-limit-reset (epoch)
+    - LinkedIn e altri: x-ratelimit-remaining / x-ratelimit-reset
+    - Meta: x-app-usage / x-business-use-case-usage (percentuali d'uso)
+    - tutti: Retry-After in secondi
+    """
+    now = time.time() if now is None else now
+    headers = {key.lower(): value for key, value in headers.items()}
+    result = {"remaining": None, "reset": None, "retry_after": None, "usage": None}
+
+    remaining = headers.get("x-rate-limit-remaining", headers.get("x-ratelimit-remaining"))
+    if remaining is not None and remaining.strip().isdigit():
+        result["remaining"] = int(remaining)
+
+    reset = headers.get("x-rate-limit-reset", headers.get("x-ratelimit-reset"))
+    if reset is not None:
+        try:
+            reset_value = float(reset)
+            # Alcune piattaforme danno un timestamp, altre i secondi mancanti
+            result["reset"] = max(reset_value - now, 0.0) if reset_value > 1e9 else reset_value
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            result["retry_after"] = float(retry_after)
+        except ValueError:
+            pass
+
+    usage_values = []
+    regain_minutes = []
+    for name in ("x-app-usage", "x-business-use-case-usage"):
+        raw = headers.get(name)
+        if not raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            continue
+        entries = [data] if name == "x-app-usage" else [item for items in data.values() for item in items]
+        for entry in entries:
+            usage_values.extend(
+                float(entry[field]) for field in ("call_count", "total_time", "total_cputime") if field in entry
+            )
+            if entry.get("estimated_time_to_regain_access"):
+                regain_minutes.append(float(entry["estimated_time_to_regain_access"]))
+    if usage_values:
+        result["usage"] = max(usage_values)
+    if regain_minutes and not result["retry_after"]:
+        result["retry_after"] = max(regain_minutes) * 60
+
+    return result
+
+# Governo condiviso da tutte le integrazioni del processo
+governor = RateLimitGovernor()
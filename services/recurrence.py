@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Iterator, Optional
+from dateutil.rrule import rrulestr
+
+def parse_rule(rule: str, dtstart: datetime):
+    """Interpreta una regola RFC 5545 (es. FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0)"""
+    try:
+        return rrulestr(rule, dtstart=dtstart)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule: {e}")
+
+def iter_occurrences(rule: str, dtstart: datetime, start: datetime, end: datetime) -> Iterator[datetime]:
+    """Occorrenze della regola comprese in [start, end], generate una alla volta
+
+    La regola non viene mai espansa per intero: una ricorrenza senza fine
+    costa solo le occorrenze effettivamente richieste.
+    """
+    for occurrence in parse_rule(rule, dtstart).xafter(start, inc=True):
+        if occurrence > end:
+            return
+        yield occurrence
+
+def next_occurrence(rule: str, dtstart: datetime, after: datetime, inc: bool = False) -> Optional[datetime]:
+    """Prima occorrenza successiva ad `after`, o None se la regola è esaurita"""
+    return parse_rule(rule, dtstart).after(after, inc=inc)
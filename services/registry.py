@@ -0,0 +1,218 @@
+import importlib
+import os
+import threading
+from importlib.metadata import entry_points
+from typing import Dict, Iterable, List, Optional
+
+# Gruppo di entry point con cui i pacchetti esterni aggiungono piattaforme:
+#
+#     [project.entry-points."social_automation.platforms"]
+#     tiktok = "social_tiktok.spec:SPEC"
+#
+# L'oggetto indicato è un PlatformSpec (o una funzione che lo restituisce).
+# Il modulo dello spec va tenuto leggero: l'integrazione vera e propria viene
+# importata solo al primo utilizzo.
+ENTRY_POINT_GROUP = "social_automation.platforms"
+# Piattaforme servite da questo processo (vuoto = tutte quelle disponibili)
+ENABLED_PLATFORMS = [p.strip() for p in os.getenv("ENABLED_PLATFORMS", "").split(",") if p.strip()]
+
+# Funzionalità che una piattaforma può dichiarare
+CAPABILITIES = ("publish", "insights", "sync", "media_upload", "token_refresh")
+
+class MediaConstraints:
+    """Vincoli sui media accettati da una piattaforma
+
+    Le piattaforme con la stessa `variant` condividono lo stesso media
+    preparato, quindi devono dichiarare gli stessi vincoli.
+    """
+
+    def __init__(
+        self,
+        variant: str = "web",
+        types: Iterable[str] = ("image/jpeg", "image/png", "image/gif", "image/webp", "video/mp4"),
+        max_image_bytes: int = 5 * 1024 * 1024,
+        max_video_bytes: int = 512 * 1024 * 1024,
+        max_items: int = 4
+    ):
+        self.variant = variant
+        self.types = tuple(types)
+        self.max_image_bytes = max_image_bytes
+        self.max_video_bytes = max_video_bytes
+        self.max_items = max_items
+
+    def max_bytes(self, mime_type: Optional[str]) -> int:
+        return self.max_video_bytes if (mime_type or "").startswith("video/") else self.max_image_bytes
+
+    def describe(self) -> Dict:
+        return {
+            "variant": self.variant,
+            "types": list(self.types),
+            "max_image_bytes": self.max_image_bytes,
+            "max_video_bytes": self.max_video_bytes,
+            "max_items": self.max_items
+        }
+
+class PlatformSpec:
+    """Dichiarazione di una piattaforma: integrazione, funzionalità, limiti e media
+
+    `integration` è il percorso "modulo:Classe", importato solo quando la
+    piattaforma viene usata. Ogni limite si può sovrascrivere con la
+    variabile `<PIATTAFORMA>_<LIMITE>` (es. TWITTER_RATE_LIMIT_PER_HOUR).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        integration: str,
+        capabilities: Iterable[str] = ("publish", "insights"),
+        limits: Optional[Dict[str, float]] = None,
+        media: Optional[MediaConstraints] = None,
+        max_text_length: Optional[int] = None
+    ):
+        self.name = name
+        self.integration = integration
+        self.capabilities = frozenset(capabilities)
+        self.limits = dict(limits or {})
+        self.media = media or MediaConstraints()
+        self.max_text_length = max_text_length
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    def limit(self, name: str, default: Optional[float] = None) -> Optional[float]:
+        """Limite dichiarato, o quello della variabile d'ambiente se impostata"""
+        declared = self.limits.get(name, default)
+        value = os.getenv(f"{self.name.upper()}_{name.upper()}")
+        if value is None:
+            return declared
+        return type(declared)(value) if declared is not None else float(value)
+
+    def load(self) -> type:
+        """Classe dell'integrazione (importa il modulo alla prima chiamata)"""
+        module_name, class_name = self.integration.split(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def describe(self) -> Dict:
+        return {
+            "name": self.name,
+            "capabilities": sorted(self.capabilities),
+            "limits": {name: self.limit(name) for name in self.limits},
+            "media": self.media.describe(),
+            "max_text_length": self.max_text_length
+        }
+
+WEB_MEDIA = MediaConstraints()
+
+BUILTIN_PLATFORMS = {
+    "twitter": PlatformSpec(
+        "twitter", "services.integrations.twitter:TwitterIntegration",
+        capabilities=("publish", "insights", "sync", "media_upload", "token_refresh"),
+        limits={"rate_limit_per_hour": 900, "bulkhead_size": 16, "publish_rate": 5},
+        media=WEB_MEDIA,
+        max_text_length=280
+    ),
+    "instagram": PlatformSpec(
+        "instagram", "services.integrations.instagram:InstagramIntegration",
+        capabilities=("publish", "insights", "sync", "token_refresh"),
+        limits={"rate_limit_per_hour": 200, "bulkhead_size": 8, "publish_rate": 2},
+        media=MediaConstraints(
+            variant="instagram",
+            types=("image/jpeg", "image/png", "video/mp4", "video/quicktime"),
+            max_image_bytes=8 * 1024 * 1024,
+            max_video_bytes=1024 * 1024 * 1024,
+            max_items=10
+        ),
+        max_text_length=2200
+    ),
+    "facebook": PlatformSpec(
+        "facebook", "services.integrations.facebook:FacebookIntegration",
+        capabilities=("publish", "insights", "sync", "media_upload", "token_refresh"),
+        limits={"rate_limit_per_hour": 200, "bulkhead_size": 16, "publish_rate": 5},
+        media=WEB_MEDIA,
+        max_text_length=63206
+    ),
+    "linkedin": PlatformSpec(
+        "linkedin", "services.integrations.linkedin:LinkedInIntegration",
+        capabilities=("publish", "insights", "sync", "media_upload", "token_refresh"),
+        limits={"rate_limit_per_hour": 500, "bulkhead_size": 8, "publish_rate": 2},
+        media=WEB_MEDIA,
+        max_text_length=3000
+    )
+}
+
+class PlatformRegistry:
+    """Piattaforme disponibili: quelle incluse più quelle dei plugin installati
+
+    Elencare le piattaforme non importa niente (bastano i nomi degli entry
+    point); lo spec di un plugin viene caricato alla prima richiesta e
+    l'integrazione solo quando il PlatformManager la crea. Un processo con
+    ENABLED_PLATFORMS impostato non importa né inizializza le altre.
+    """
+
+    def __init__(
+        self,
+        builtins: Optional[Dict[str, PlatformSpec]] = None,
+        group: str = ENTRY_POINT_GROUP,
+        enabled: Optional[Iterable[str]] = None
+    ):
+        self._specs: Dict[str, PlatformSpec] = dict(BUILTIN_PLATFORMS if builtins is None else builtins)
+        self.group = group
+        self.enabled = list(ENABLED_PLATFORMS if enabled is None else enabled)
+        self._entry_points = None
+        self._lock = threading.Lock()
+
+    def _plugins(self) -> Dict:
+        if self._entry_points is None:
+            self._entry_points = {entry_point.name: entry_point for entry_point in entry_points(group=self.group)}
+        return self._entry_points
+
+    def available(self) -> List[str]:
+        """Tutte le piattaforme installate, abilitate o no"""
+        return list(dict.fromkeys([*self._specs, *self._plugins()]))
+
+    def names(self) -> List[str]:
+        """Piattaforme servite da questo processo"""
+        available = self.available()
+        if not self.enabled:
+            return available
+        return [name for name in available if name in self.enabled]
+
+    def is_enabled(self, name: str) -> bool:
+        return name in self.names()
+
+    def spec(self, name: str) -> PlatformSpec:
+        """Spec della piattaforma (anche se non abilitata); ValueError se sconosciuta"""
+        plugin = self._plugins().get(name)
+        if plugin is None:
+            if name not in self._specs:
+                raise ValueError(f"Unsupported platform: {name}")
+            return self._specs[name]
+        with self._lock:
+            # Un plugin con lo stesso nome di una piattaforma inclusa la sostituisce
+            loaded = self._plugins().pop(name, None)
+            if loaded is not None:
+                spec = loaded.load()
+                self._specs[name] = spec if isinstance(spec, PlatformSpec) else spec()
+        return self._specs[name]
+
+    def find(self, name: str) -> Optional[PlatformSpec]:
+        try:
+            return self.spec(name)
+        except ValueError:
+            return None
+
+    def integrations(self) -> Dict[str, str]:
+        """Percorsi "modulo:Classe" delle integrazioni abilitate"""
+        return {name: self.spec(name).integration for name in self.names()}
+
+_registry: Optional[PlatformRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> PlatformRegistry:
+    """Registro condiviso dal processo"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PlatformRegistry()
+    return _registry
@@ -0,0 +1,56 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+MAX_PUBLISH_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("PUBLISH_RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS = float(os.getenv("PUBLISH_RETRY_MAX_SECONDS", "3600"))
+
+class PublishError(Exception):
+    """Errore di pubblicazione; `retryable` indica se ha senso riprovare"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class PublishDeferred(Exception):
+    """Pubblicazione rinviata senza tentativo: il post torna nel database fino a `until`
+
+    Non conta tra i tentativi (es. capacità della piattaforma esaurita).
+    """
+
+    def __init__(self, until: datetime, reason: str = "deferred"):
+        super().__init__(reason)
+        self.until = until
+
+def deferred_until(error: BaseException, now: datetime) -> Optional[datetime]:
+    """Istante a cui rinviare il post senza contare un tentativo, se la chiamata non è mai partita
+
+    Vale per PublishDeferred e per i rifiuti immediati che indicano
+    `retry_after` (circuito aperto, bulkhead pieno): durante un disservizio
+    i post attendono la riapertura invece di esaurire i tentativi.
+    """
+    until = getattr(error, "until", None)
+    if until is not None:
+        return until
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return now + timedelta(seconds=retry_after)
+    return None
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeout, errori di rete e 5xx si riprovano; dati non validi no"""
+    retryable = getattr(error, "retryable", None)
+    if retryable is not None:
+        return retryable
+    return not isinstance(error, (ValueError, TypeError, KeyError, PermissionError))
+
+def retry_delay(attempts: int, rng: random.Random = random) -> timedelta:
+    """Backoff esponenziale con jitter per il tentativo numero `attempts`
+
+    Il jitter evita che i post falliti insieme durante un disservizio
+    riprovino tutti nello stesso istante.
+    """
+    ceiling = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=rng.uniform(ceiling / 2, ceiling))
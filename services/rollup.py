@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Integer, bindparam, case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models import AccountAnalytics, AccountAnalyticsHourly, Engagement, ScheduledPost, SocialAccount, SyncCursor
+from services.platforms import get_platform_manager
+from services.leases import claim_job, default_worker_id
+
+# Rollup orario oltre a quello giornaliero, e per quanto tempo conservarlo
+ANALYTICS_HOURLY_ROLLUP = os.getenv("ANALYTICS_HOURLY_ROLLUP", "0") != "0"
+ANALYTICS_HOURLY_RETENTION = timedelta(days=int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "7")))
+# Frequenza della compattazione (lettura di follower/impressions/reach, tassi, pulizia)
+ANALYTICS_COMPACT_INTERVAL = float(os.getenv("ANALYTICS_COMPACT_INTERVAL_SECONDS", "3600"))
+
+# Engagement: incrementi sommati nel periodo
+COUNTERS = ("likes", "comments", "shares")
+# Valori dell'account: l'ultima lettura del periodo
+GAUGES = ("followers", "impressions", "reach")
+# Risorsa del SyncCursor che segna gli account già ricostruiti dallo storico
+BACKFILL_RESOURCE = "analytics"
+# Lease (job_leases) del worker che esegue la compattazione
+COMPACT_LEASE = "analytics_compaction"
+
+logger = logging.getLogger(__name__)
+
+def record_engagement(session, deltas: Iterable[Tuple[int, datetime, Dict[str, int]]], now: datetime):
+    """Somma incrementi di engagement (account, istante, valori) al rollup giornaliero e orario
+
+    Va chiamata nella transazione che aggiorna engagements, così il rollup
+    resta coerente con i totali dei post. Prende un lock condiviso sulle
+    righe degli account (vedi _lock_accounts), quindi attende la fine di
+    una ricostruzione in corso.
+    """
+    _lock_accounts(session, {account_id for account_id, _, _ in deltas}, exclusive=False)
+    daily: Dict[Tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    hourly: Dict[Tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for account_id, at, values in deltas:
+        if not any(values.get(counter) for counter in COUNTERS):
+            continue
+        for counter in COUNTERS:
+            daily[(account_id, at.date())][counter] += values.get(counter, 0)
+        if ANALYTICS_HOURLY_ROLLUP and at >= now - ANALYTICS_HOURLY_RETENTION:
+            for counter in COUNTERS:
+                hourly[(account_id, _hour(at))][counter] += values.get(counter, 0)
+    _merge(session, AccountAnalytics, "metric_date", daily, COUNTERS, now, accumulate=True)
+    _merge(session, AccountAnalyticsHourly, "metric_hour", hourly, COUNTERS, now, accumulate=True)
+
+def record_account_metrics(session, metrics: Dict[int, Dict[str, int]], at: datetime):
+    """Salva followers, impressions e reach letti in `at` nelle righe del giorno e dell'ora"""
+    metrics = {account_id: values for account_id, values in metrics.items() if values}
+    _merge(session, AccountAnalytics, "metric_date",
+           {(account_id, at.date()): values for account_id, values in metrics.items()}, GAUGES, at, accumulate=False)
+    if ANALYTICS_HOURLY_ROLLUP:
+        _merge(session, AccountAnalyticsHourly, "metric_hour",
+               {(account_id, _hour(at)): values for account_id, values in metrics.items()}, GAUGES, at, accumulate=False)
+
+def _lock_accounts(session, account_ids: Iterable[int], exclusive: bool):
+    """Lock sulle righe social_accounts che serializza ricostruzione e incrementi del rollup
+
+    Gli incrementi prendono un lock condiviso (FOR SHARE) e procedono in
+    parallelo tra loro; la ricostruzione lo prende esclusivo (FOR UPDATE).
+    SQLite ignora FOR UPDATE, ma ammette un solo scrittore alla volta: lì
+    basta che la ricostruzione scriva prima di leggere.
+    """
+    account_ids = sorted(account_ids)
+    if account_ids:
+        session.execute(
+            select(SocialAccount.id)
+            .where(SocialAccount.id.in_(account_ids))
+            .order_by(SocialAccount.id)
+            .with_for_update(read=not exclusive)
+        ).all()
+
+def _hour(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+def _merge(session, model, period_column: str, rows: Dict[Tuple, Dict], columns: Tuple[str, ...], now: datetime, accumulate: bool):
+    """Un INSERT per le righe nuove e un UPDATE (executemany) per le altre
+
+    I contatori vengono sommati, i valori dell'account sostituiti (un valore
+    mancante lascia quello già salvato).
+    """
+    if not rows:
+        return
+    table = model.__table__
+    existing = set(session.execute(
+        select(table.c.account_id, table.c[period_column])
+        .where(table.c.account_id.in_({account_id for account_id, _ in rows}))
+        .where(table.c[period_column].in_({period for _, period in rows}))
+    ).all())
+
+    def new_row(key: Tuple) -> Dict:
+        account_id, period = key
+        return {"account_id": account_id, period_column: period, "updated_at": now,
+                **{column: rows[key].get(column, 0 if accumulate else None) for column in columns}}
+
+    missing = [key for key in rows if key not in existing]
+    if missing:
+        try:
+            with session.begin_nested():
+                session.execute(insert(table), [new_row(key) for key in missing])
+            missing = []
+        except IntegrityError:
+            # Alcune righe sono state create nel frattempo da un'altra scrittura: quelle si aggiornano
+            conflicts = []
+            for key in missing:
+                try:
+                    with session.begin_nested():
+                        session.execute(insert(table), [new_row(key)])
+                except IntegrityError:
+                    conflicts.append(key)
+            missing = conflicts
+    updates = [key for key in rows if key in existing or key in missing]
+    if not updates:
+        return
+
+    def assign(column: str):
+        value = bindparam(f"v_{column}", type_=Integer)
+        if accumulate:
+            return func.coalesce(table.c[column], 0) + value
+        return func.coalesce(value, table.c[column])
+
+    session.connection().execute(
+        update(table)
+        .where(table.c.account_id == bindparam("target"))
+        .where(table.c[period_column] == bindparam("period"))
+        .values(updated_at=bindparam("now"), **{column: assign(column) for column in columns}),
+        [
+            {"target": account_id, "period": period, "now": now,
+             **{f"v_{column}": rows[(account_id, period)].get(column) for column in columns}}
+            for account_id, period in updates
+        ]
+    )
+
+class AnalyticsRollup:
+    """Compattazione periodica del rollup analytics
+
+    Engagement e webhook aggiornano il rollup a ogni scrittura; questo job:
+    - ricostruisce una volta dallo storico dei post il rollup degli account
+      che non ne hanno ancora uno
+    - salva followers, impressions e reach letti dagli insights degli account
+    - ricalcola engagement_rate delle righe giornaliere cambiate
+    - elimina le righe orarie più vecchie di ANALYTICS_HOURLY_RETENTION_DAYS
+
+    Il ciclo gira in ogni worker, ma a ogni intervallo compatta solo quello
+    che tiene il lease COMPACT_LEASE: gli insights vengono letti una volta.
+    """
+
+    def __init__(self, manager=None, worker_id: Optional[str] = None):
+        self.manager = manager or get_platform_manager()
+        self.worker_id = worker_id or default_worker_id()
+        self._compacted_at: Optional[datetime] = None
+
+    async def compact(self) -> Dict:
+        started = datetime.now()
+        backfilled = await asyncio.to_thread(_backfill, started)
+
+        registry = self.manager.registry
+        platforms = [
+            name for name in self.manager.integrations
+            if registry.find(name) is None or registry.find(name).supports("insights")
+        ]
+        account_ids = await asyncio.to_thread(_insights_accounts, platforms)
+        metrics = {}
+        async for event in self.manager.iter_insights(account_ids):
+            if "error" in event:
+                logger.debug("Insights failed for account %s: %s", event["account_id"], event["error"])
+                continue
+            metrics[event["account_id"]] = self.manager.integration(event["platform"]).account_metrics(event["insights"])
+        await asyncio.to_thread(_store_account_metrics, metrics, started)
+
+        rates = await asyncio.to_thread(_refresh_rates, self._compacted_at)
+        trimmed = await asyncio.to_thread(_trim_hourly, started - ANALYTICS_HOURLY_RETENTION)
+        self._compacted_at = started
+        return {"backfilled": backfilled, "accounts": len(metrics), "rates": rates, "hourly_trimmed": trimmed}
+
+    async def compact_if_claimed(self, interval: float = ANALYTICS_COMPACT_INTERVAL) -> Optional[Dict]:
+        """Compatta se questo worker tiene il lease per il prossimo `interval`; None altrimenti"""
+        if not await asyncio.to_thread(claim_job, COMPACT_LEASE, self.worker_id, datetime.now(), interval):
+            return None
+        return await self.compact()
+
+    async def run(self, interval: float = ANALYTICS_COMPACT_INTERVAL):
+        """Ciclo di compattazione eseguito da ogni worker dell'applicazione
+
+        Il lease dura un intervallo: chi lo tiene lo rinnova al giro
+        successivo, gli altri worker lo prendono solo se è scaduto.
+        """
+        while True:
+            try:
+                await self.compact_if_claimed(interval)
+            except Exception:
+                logger.exception("Analytics compaction failed")
+            await asyncio.sleep(interval)
+
+_analytics_rollup: Optional[AnalyticsRollup] = None
+_analytics_rollup_lock = threading.Lock()
+
+def get_analytics_rollup() -> AnalyticsRollup:
+    """AnalyticsRollup condiviso dal processo"""
+    global _analytics_rollup
+    if _analytics_rollup is None:
+        with _analytics_rollup_lock:
+            if _analytics_rollup is None:
+                _analytics_rollup = AnalyticsRollup()
+    return _analytics_rollup
+
+def _backfill(now: datetime) -> int:
+    """Rollup dallo storico per gli account che non l'hanno ancora avuto
+
+    L'engagement di ogni post viene attribuito al giorno di pubblicazione;
+    gli incrementi già registrati per l'account sono compresi nei totali dei
+    post e vengono azzerati.
+    """
+    session = SessionLocal()
+    try:
+        account_ids = session.scalars(
+            select(SocialAccount.id).where(~select(SyncCursor.id)
+                                           .where(SyncCursor.account_id == SocialAccount.id)
+                                           .where(SyncCursor.resource == BACKFILL_RESOURCE)
+                                           .exists())
+        ).all()
+    finally:
+        session.close()
+    return sum(_backfill_account(account_id, now) for account_id in account_ids)
+
+def _backfill_account(account_id: int, now: datetime) -> int:
+    """Azzera i contatori dell'account e li ricalcola dai totali dei post
+
+    La transazione tiene il lock esclusivo dell'account (_lock_accounts):
+    gli incrementi di webhook e sincronizzazione, in qualunque worker,
+    attendono la fine della ricostruzione oppure sono già nei totali letti,
+    quindi nessuno va perso o contato due volte.
+    """
+    session = SessionLocal()
+    try:
+        _lock_accounts(session, [account_id], exclusive=True)
+        for model in (AccountAnalytics, AccountAnalyticsHourly):
+            session.execute(
+                update(model).where(model.account_id == account_id).values(**dict.fromkeys(COUNTERS, 0))
+            )
+        posts = _post_totals(session, account_id)
+        record_engagement(session, [
+            (account_id, published or now, {"likes": likes or 0, "comments": comments or 0, "shares": shares or 0})
+            for published, likes, comments, shares in posts
+        ], now)
+        session.add(SyncCursor(account_id=account_id, resource=BACKFILL_RESOURCE, watermark=now, updated_at=now))
+        session.commit()
+        return 1
+    except IntegrityError:
+        # Ricostruito nel frattempo da un altro worker
+        session.rollback()
+        return 0
+    finally:
+        session.close()
+
+def _post_totals(session, account_id: int):
+    """(pubblicazione, likes, comments, shares) dei post dell'account"""
+    return session.execute(
+        select(ScheduledPost.scheduled_time, Engagement.likes, Engagement.comments, Engagement.shares)
+        .join(Engagement, Engagement.post_id == ScheduledPost.id)
+        .where(ScheduledPost.account_id == account_id)
+    ).all()
+
+def _insights_accounts(platforms: List[str]) -> List[int]:
+    session = SessionLocal()
+    try:
+        return session.scalars(select(SocialAccount.id).where(SocialAccount.platform.in_(platforms))).all()
+    finally:
+        session.close()
+
+def _store_account_metrics(metrics: Dict[int, Dict[str, int]], at: datetime):
+    session = SessionLocal()
+    try:
+        record_account_metrics(session, metrics, at)
+        session.commit()
+    finally:
+        session.close()
+
+def _refresh_rates(since: Optional[datetime]) -> int:
+    """engagement_rate (% dei follower) delle righe giornaliere cambiate da `since`"""
+    table = AccountAnalytics.__table__
+    engagement = sum(func.coalesce(table.c[counter], 0) for counter in COUNTERS)
+    statement = update(table).values(
+        engagement_rate=case((table.c.followers > 0, engagement * 100.0 / table.c.followers), else_=None)
+    )
+    if since is not None:
+        statement = statement.where(table.c.updated_at >= since)
+    session = SessionLocal()
+    try:
+        updated = session.execute(statement).rowcount
+        session.commit()
+        return updated
+    finally:
+        session.close()
+
+def _trim_hourly(before: datetime) -> int:
+    session = SessionLocal()
+    try:
+        deleted = session.execute(delete(AccountAnalyticsHourly).where(AccountAnalyticsHourly.metric_hour < before)).rowcount
+        session.commit()
+        return deleted
+    finally:
+        session.close()
@@ -1,12 +1,145 @@
+import asyncio
+import base64
+import heapq
+import logging
+import os
+import uuid
+from collections import defaultdict
+from itertools import islice
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from database import SessionLocal
-from models import ScheduledPost
+from models import CrossPost, DeadLetter, RecurringPost, ScheduledPost, SocialAccount
+from services.dispatch_queue import DispatchQueue
+from services.leases import default_worker_id
+from services.recurrence import iter_occurrences, next_occurrence
+from services.retry import MAX_PUBLISH_ATTEMPTS, deferred_until, is_retryable, retry_delay
+from services.platforms import published_post_id
+
+CLAIM_BATCH_SIZE = int(os.getenv("SCHEDULER_CLAIM_BATCH_SIZE", "100"))
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))
+# Ogni quanto si rinnova il lease dei post ancora in corso di pubblicazione
+LEASE_RENEW_SECONDS = float(os.getenv("SCHEDULER_LEASE_RENEW_SECONDS", str(LEASE_SECONDS / 3)))
+# Ampiezza delle fette di post caricate in memoria e anticipo del caricamento
+LOAD_SLICE = timedelta(seconds=int(os.getenv("SCHEDULER_LOAD_SLICE_SECONDS", "600")))
+LOAD_AHEAD = timedelta(seconds=int(os.getenv("SCHEDULER_LOAD_AHEAD_SECONDS", "60")))
+# Risveglio minimo per riprendere i lease scaduti e i post degli altri worker
+MAX_SLEEP_SECONDS = float(os.getenv("SCHEDULER_MAX_SLEEP_SECONDS", "30"))
+# Occorrenze ricorrenti perse (es. worker fermi) che vengono ancora pubblicate
+RECURRENCE_CATCHUP = timedelta(seconds=int(os.getenv("SCHEDULER_RECURRENCE_CATCHUP_SECONDS", "3600")))
+MAX_CALENDAR_OCCURRENCES = 5000
+# I nuovi tentativi hanno una corsia propria, con blocchi più piccoli
+RETRY_CLAIM_BATCH_SIZE = int(os.getenv("SCHEDULER_RETRY_CLAIM_BATCH_SIZE", "20"))
+RETRY_POLL_SECONDS = float(os.getenv("SCHEDULER_RETRY_POLL_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+# Coda condivisa da tutte le istanze di ContentScheduler del processo
+dispatch_queue = DispatchQueue()
+
+def _split_deferred(
+    failures: List[Tuple[ScheduledPost, BaseException]],
+    now: datetime
+) -> Tuple[List[Tuple[ScheduledPost, datetime]], List[Tuple[ScheduledPost, BaseException]]]:
+    """Separa i rifiuti senza chiamata (da rinviare) dai tentativi falliti"""
+    deferred, failed = [], []
+    for post, error in failures:
+        until = deferred_until(error, now)
+        if until is not None:
+            deferred.append((post, until))
+        else:
+            failed.append((post, error))
+    return deferred, failed
+
+def resolve_shared_content(posts: Iterable[ScheduledPost]) -> None:
+    """Copia nei post di un cross-post il contenuto e i media salvati una volta in `cross_posts`
+
+    I post vanno caricati con joinedload(ScheduledPost.cross_post); i valori
+    non vengono segnati come modificati, quindi non tornano nel database.
+    """
+    for post in posts:
+        shared = post.cross_post if post.cross_post_id is not None else None
+        if shared is not None and post.content is None:
+            set_committed_value(post, "content", shared.content)
+            set_committed_value(post, "media_urls", shared.media_urls or [])
+
+def encode_cursor(post: ScheduledPost) -> str:
+    """Cursore opaco per la paginazione keyset del calendario"""
+    raw = f"{post.scheduled_time.isoformat()}|{post.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        scheduled_time, post_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(scheduled_time), int(post_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
 
 class ContentScheduler:
-    def __init__(self):
-        self.queue = []
-        
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        clock: Callable[[], datetime] = datetime.now,
+        queue: Optional[DispatchQueue] = None
+    ):
+        # `clock` e `queue` sono sostituibili per la simulazione con orologio virtuale
+        self.queue = queue if queue is not None else dispatch_queue
+        self.worker_id = worker_id or default_worker_id()
+        self.clock = clock
+        self._pending = set()
+        # Post presi in carico e non ancora accettati dal dispatcher, per (piattaforma, retry)
+        self._staged: Dict[Tuple[str, bool], int] = defaultdict(int)
+        # Post passati al dispatcher e non ancora chiusi, per claim token
+        self._in_flight: Dict[str, Set[int]] = defaultdict(set)
+
+    def load_queue(self, until: Optional[datetime] = None) -> int:
+        """Ricostruisce la coda con i post programmati fino a `until`
+
+        I post successivi restano nel database e vengono caricati a fette
+        da load_next_slice.
+        """
+        until = until or self.clock() + LOAD_SLICE
+        self.expand_recurring(until)
+        session = SessionLocal()
+        try:
+            rows = session.execute(
+                select(ScheduledPost.scheduled_time, ScheduledPost.id)
+                .where(ScheduledPost.status == "scheduled")
+                .where(ScheduledPost.scheduled_time <= until)
+                .execution_options(yield_per=10000)
+            )
+            self.queue.rebuild(((row.scheduled_time, row.id) for row in rows), loaded_until=until)
+        finally:
+            session.close()
+        return len(self.queue)
+
+    def load_next_slice(self) -> int:
+        """Carica in coda la fetta di post successiva alla finestra attuale"""
+        if self.queue.loaded_until is None:
+            return self.load_queue()
+
+        start = self.queue.loaded_until
+        end = max(start, self.clock()) + LOAD_SLICE
+        self.expand_recurring(end)
+        session = SessionLocal()
+        try:
+            rows = session.execute(
+                select(ScheduledPost.scheduled_time, ScheduledPost.id)
+                .where(ScheduledPost.status == "scheduled")
+                .where(ScheduledPost.scheduled_time > start)
+                .where(ScheduledPost.scheduled_time <= end)
+                .execution_options(yield_per=10000)
+            )
+            entries = [(row.scheduled_time, row.id) for row in rows]
+        finally:
+            session.close()
+        self.queue.extend(entries, loaded_until=end)
+        return len(entries)
+
     def schedule_post(
         self,
         account_id: int,
@@ -17,35 +150,352 @@ class ContentScheduler:
         # Default to 1 hour from now if no time specified
         if not scheduled_time:
             scheduled_time = datetime.now() + timedelta(hours=1)
-            
+
         post = ScheduledPost(
             account_id=account_id,
             content=content,
             media_urls=media_urls or [],
-            scheduled_time=scheduled_time
+            scheduled_time=scheduled_time,
+            status="scheduled"
         )
-        
-        db.session.add(post)
-        db.session.commit()
-        
-        self.queue.append(post)
+
+        session = SessionLocal()
+        try:
+            session.add(post)
+            session.commit()
+            session.refresh(post)
+        finally:
+            session.close()
+
+        if self.queue.covers(post.scheduled_time):
+            self.queue.push(post.scheduled_time, post.id)
         return post
-        
+
+    def schedule_posts_bulk(self, posts: List[Dict]) -> List[int]:
+        """Inserisce un intero calendario di post in un'unica transazione
+
+        Le righe vengono scritte con un solo INSERT multi-riga (executemany)
+        e gli ID restituiti nello stesso ordine dei post ricevuti.
+        """
+        default_time = datetime.now() + timedelta(hours=1)
+        rows = [
+            {
+                "account_id": post["account_id"],
+                "content": post["content"],
+                "media_urls": post.get("media_urls") or [],
+                "scheduled_time": post.get("scheduled_time") or default_time,
+                "status": "scheduled"
+            }
+            for post in posts
+        ]
+        if not rows:
+            return []
+
+        missing = self.find_missing_accounts(row["account_id"] for row in rows)
+        if missing:
+            raise ValueError(f"Account not found: {sorted(missing)}")
+
+        session = SessionLocal()
+        try:
+            post_ids = self._insert_posts(session, rows)
+            session.commit()
+        finally:
+            session.close()
+
+        self._enqueue(rows, post_ids)
+        return post_ids
+
+    def schedule_cross_post(
+        self,
+        account_ids: List[int],
+        content: str,
+        media_urls: List[str] = None,
+        scheduled_time: datetime = None
+    ) -> Tuple[CrossPost, List[int]]:
+        """Programma lo stesso contenuto su più account con una sola scrittura
+
+        Contenuto e media vengono salvati una volta in `cross_posts`; per ogni
+        account viene creato un ScheduledPost collegato, senza copia del
+        contenuto, così stato e pubblicazione restano indipendenti per
+        account. Il contenuto viene risolto quando i post vengono caricati
+        (resolve_shared_content) e i media vengono preparati una sola volta
+        per variante di piattaforma al momento della pubblicazione.
+        """
+        account_ids = list(dict.fromkeys(account_ids))
+        missing = self.find_missing_accounts(account_ids)
+        if missing:
+            raise ValueError(f"Account not found: {sorted(missing)}")
+
+        scheduled_time = scheduled_time or datetime.now() + timedelta(hours=1)
+        media_urls = media_urls or []
+        session = SessionLocal()
+        try:
+            cross_post = CrossPost(
+                content=content,
+                media_urls=media_urls,
+                scheduled_time=scheduled_time,
+                created_at=datetime.now()
+            )
+            session.add(cross_post)
+            session.flush()
+            rows = [
+                {
+                    "account_id": account_id,
+                    "content": None,
+                    "media_urls": None,
+                    "scheduled_time": scheduled_time,
+                    "status": "scheduled",
+                    "cross_post_id": cross_post.id
+                }
+                for account_id in account_ids
+            ]
+            post_ids = self._insert_posts(session, rows)
+            session.commit()
+            session.refresh(cross_post)
+        finally:
+            session.close()
+
+        self._enqueue(rows, post_ids)
+        return cross_post, post_ids
+
+    def _insert_posts(self, session, rows: List[Dict]) -> List[int]:
+        return session.scalars(
+            insert(ScheduledPost).returning(ScheduledPost.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+
+    def _enqueue(self, rows: List[Dict], post_ids: List[int]):
+        for row, post_id in zip(rows, post_ids):
+            if self.queue.covers(row["scheduled_time"]):
+                self.queue.push(row["scheduled_time"], post_id)
+
+    def create_recurring_post(
+        self,
+        account_id: int,
+        content: str,
+        rrule: str,
+        dtstart: Optional[datetime] = None,
+        media_urls: Optional[List[str]] = None
+    ) -> RecurringPost:
+        """Salva una regola di ricorrenza: le occorrenze vengono create solo
+        quando entrano nella finestra caricata dallo scheduler"""
+        now = datetime.now()
+        dtstart = dtstart or now
+        first = next_occurrence(rrule, dtstart, max(dtstart, now), inc=True)
+        if first is None:
+            raise ValueError("Recurrence rule has no future occurrences")
+        if self.find_missing_accounts([account_id]):
+            raise ValueError("Account not found")
+
+        recurring = RecurringPost(
+            account_id=account_id,
+            content=content,
+            media_urls=media_urls or [],
+            rrule=rrule,
+            dtstart=dtstart,
+            next_occurrence=first,
+            status="active",
+            created_at=now
+        )
+        session = SessionLocal()
+        try:
+            session.add(recurring)
+            session.commit()
+            session.refresh(recurring)
+        finally:
+            session.close()
+
+        if self.queue.covers(first):
+            for scheduled_time, post_id in self.expand_recurring(self.queue.loaded_until):
+                self.queue.push(scheduled_time, post_id)
+        return recurring
+
+    def cancel_recurring_post(self, recurrence_id: int) -> bool:
+        """Interrompe una ricorrenza e annulla le occorrenze non ancora pubblicate"""
+        session = SessionLocal()
+        try:
+            result = session.execute(
+                update(RecurringPost)
+                .where(RecurringPost.id == recurrence_id)
+                .where(RecurringPost.status == "active")
+                .values(status="cancelled", next_occurrence=None)
+            )
+            session.execute(
+                update(ScheduledPost)
+                .where(ScheduledPost.recurrence_id == recurrence_id)
+                .where(ScheduledPost.status == "scheduled")
+                .values(status="cancelled")
+            )
+            session.commit()
+        finally:
+            session.close()
+        return result.rowcount > 0
+
+    def expand_recurring(self, until: datetime) -> List[Tuple[datetime, int]]:
+        """Trasforma in ScheduledPost le occorrenze delle ricorrenze fino a `until`
+
+        Ogni regola tiene il segnalibro `next_occurrence`: vengono lette solo
+        le regole con un'occorrenza nella finestra, e l'avanzamento del
+        segnalibro è condizionato al valore letto, così due worker non
+        materializzano la stessa occorrenza.
+        """
+        now = self.clock()
+        rows = []
+        session = SessionLocal()
+        try:
+            rules = session.scalars(
+                select(RecurringPost)
+                .where(RecurringPost.status == "active")
+                .where(RecurringPost.next_occurrence <= until)
+            ).all()
+            for rule in rules:
+                start = max(rule.next_occurrence, now - RECURRENCE_CATCHUP)
+                occurrences = list(iter_occurrences(rule.rrule, rule.dtstart, start, until))
+                following = next_occurrence(rule.rrule, rule.dtstart, until)
+                advanced = session.execute(
+                    update(RecurringPost)
+                    .where(RecurringPost.id == rule.id)
+                    .where(RecurringPost.next_occurrence == rule.next_occurrence)
+                    .values(
+                        next_occurrence=following,
+                        status="active" if following else "completed"
+                    )
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if not advanced:
+                    continue
+                rows.extend(
+                    {
+                        "account_id": rule.account_id,
+                        "content": rule.content,
+                        "media_urls": rule.media_urls or [],
+                        "scheduled_time": occurrence,
+                        "status": "scheduled",
+                        "recurrence_id": rule.id
+                    }
+                    for occurrence in occurrences
+                )
+
+            post_ids = []
+            if rows:
+                post_ids = session.scalars(
+                    insert(ScheduledPost).returning(ScheduledPost.id, sort_by_parameter_order=True),
+                    rows
+                ).all()
+            session.commit()
+        finally:
+            session.close()
+        return [(row["scheduled_time"], post_id) for row, post_id in zip(rows, post_ids)]
+
+    def get_calendar(self, account_id: int, start_time: datetime, end_time: datetime) -> List[Dict]:
+        """Calendario dell'account: post salvati più le occorrenze future delle
+        ricorrenze, espanse al volo solo per l'intervallo richiesto"""
+        entries = [
+            {
+                "id": post.id,
+                "recurrence_id": post.recurrence_id,
+                "account_id": post.account_id,
+                "content": post.content,
+                "media_urls": post.media_urls or [],
+                "scheduled_time": post.scheduled_time,
+                "status": post.status
+            }
+            for post in self.get_scheduled_posts(account_id, start_time, end_time)
+        ]
+
+        session = SessionLocal()
+        try:
+            rules = session.scalars(
+                select(RecurringPost)
+                .where(RecurringPost.account_id == account_id)
+                .where(RecurringPost.status == "active")
+                .where(RecurringPost.next_occurrence <= end_time)
+            ).all()
+        finally:
+            session.close()
+
+        # Le occorrenze precedenti a next_occurrence sono già tra i post salvati;
+        # unendole in ordine di tempo il limite scarta le più lontane, di qualunque regola
+        occurrences = heapq.merge(
+            *(self._virtual_entries(rule, max(start_time, rule.next_occurrence), end_time) for rule in rules),
+            key=lambda entry: entry["scheduled_time"]
+        )
+        entries.extend(islice(occurrences, MAX_CALENDAR_OCCURRENCES))
+
+        return sorted(entries, key=lambda entry: entry["scheduled_time"])
+
+    def _virtual_entries(self, rule: RecurringPost, start: datetime, end: datetime) -> Iterator[Dict]:
+        for occurrence in iter_occurrences(rule.rrule, rule.dtstart, start, end):
+            yield {
+                "id": None,
+                "recurrence_id": rule.id,
+                "account_id": rule.account_id,
+                "content": rule.content,
+                "media_urls": rule.media_urls or [],
+                "scheduled_time": occurrence,
+                "status": "recurring"
+            }
+
+    def find_missing_accounts(self, account_ids: Iterable[int]) -> Set[int]:
+        """Restituisce gli ID account inesistenti, con una sola query"""
+        wanted = set(account_ids)
+        if not wanted:
+            return set()
+        session = SessionLocal()
+        try:
+            found = set(session.scalars(
+                select(SocialAccount.id).where(SocialAccount.id.in_(wanted))
+            ))
+        finally:
+            session.close()
+        return wanted - found
+
     def get_scheduled_posts(
         self,
         account_id: int,
         start_time: Optional[datetime] = None,
-        end_time: Optional[datetime] = None
+        end_time: Optional[datetime] = None,
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
     ) -> List[ScheduledPost]:
-        query = ScheduledPost.query.filter_by(account_id=account_id)
-        
+        """Post dell'account in ordine di scheduled_time, con paginazione keyset
+
+        Il cursore è la coppia (scheduled_time, id) dell'ultimo post della
+        pagina precedente: la query riparte dall'indice invece di scorrere
+        con OFFSET, quindi ogni pagina costa lo stesso.
+        """
+        query = (
+            select(ScheduledPost)
+            .options(joinedload(ScheduledPost.cross_post))
+            .where(ScheduledPost.account_id == account_id)
+        )
+
         if start_time:
-            query = query.filter(ScheduledPost.scheduled_time >= start_time)
+            query = query.where(ScheduledPost.scheduled_time >= start_time)
         if end_time:
-            query = query.filter(ScheduledPost.scheduled_time <= end_time)
-            
-        return query.order_by(ScheduledPost.scheduled_time).all()
-        
+            query = query.where(ScheduledPost.scheduled_time <= end_time)
+        if status:
+            query = query.where(ScheduledPost.status == status)
+        if cursor:
+            after_time, after_id = decode_cursor(cursor)
+            query = query.where(or_(
+                ScheduledPost.scheduled_time > after_time,
+                and_(ScheduledPost.scheduled_time == after_time, ScheduledPost.id > after_id)
+            ))
+
+        query = query.order_by(ScheduledPost.scheduled_time, ScheduledPost.id)
+        if limit:
+            query = query.limit(limit)
+
+        session = SessionLocal()
+        try:
+            posts = session.scalars(query).all()
+        finally:
+            session.close()
+        resolve_shared_content(posts)
+        return posts
+
     def cancel_post(self, post_id: int) -> bool:
         post = ScheduledPost.query.get(post_id)
         if post:
@@ -53,18 +503,431 @@ class ContentScheduler:
             db.session.commit()
             return True
         return False
-        
-    def process_queue(self):
-        now = datetime.now()
-        posts_to_publish = [
-            post for post in self.queue
-            if post.scheduled_time <= now
-        ]
-        
-        for post in posts_to_publish:
-            self.publish_post(post)
-            self.queue.remove(post)
-            
-    def publish_post(self, post: ScheduledPost):
-        # Implementation for publishing to social platforms
-        pass
\ No newline at end of file
+
+    def claim_due_posts(
+        self,
+        now: Optional[datetime] = None,
+        limit: int = CLAIM_BATCH_SIZE,
+        lease_seconds: int = LEASE_SECONDS,
+        skip_platforms: Iterable[str] = (),
+        post_ids: Optional[List[int]] = None
+    ) -> List[ScheduledPost]:
+        """Prende in carico un blocco di post scaduti (scheduled -> claimed)
+
+        Vengono ripresi anche i post con lease scaduto, lasciati a metà da un
+        worker terminato in modo anomalo. I post delle `skip_platforms`
+        restano nel database, quelli rinviati fino a `next_attempt_at`.
+        Con `post_ids` il claim è limitato a quei post e cerca per chiave
+        primaria invece di scorrere l'indice su scheduled_time.
+        """
+        now = now or self.clock()
+        claimable = or_(
+            and_(
+                ScheduledPost.status == "scheduled",
+                ScheduledPost.scheduled_time <= now,
+                or_(ScheduledPost.next_attempt_at.is_(None), ScheduledPost.next_attempt_at <= now)
+            ),
+            and_(ScheduledPost.status == "claimed", ScheduledPost.lease_expires_at < now)
+        )
+        if post_ids is not None:
+            claimable = and_(ScheduledPost.id.in_(post_ids), claimable)
+        return self._claim(claimable, ScheduledPost.scheduled_time, now, limit, lease_seconds, skip_platforms)
+
+    def claim_retry_posts(
+        self,
+        now: Optional[datetime] = None,
+        limit: int = RETRY_CLAIM_BATCH_SIZE,
+        lease_seconds: int = LEASE_SECONDS,
+        skip_platforms: Iterable[str] = ()
+    ) -> List[ScheduledPost]:
+        """Prende in carico i post il cui backoff è scaduto (retrying -> claimed)
+
+        I post da riprovare non passano dalla coda in memoria né dal claim
+        principale, così non rallentano i post in orario.
+        """
+        now = now or self.clock()
+        claimable = and_(ScheduledPost.status == "retrying", ScheduledPost.next_attempt_at <= now)
+        return self._claim(claimable, ScheduledPost.next_attempt_at, now, limit, lease_seconds, skip_platforms)
+
+    def _claim(
+        self,
+        claimable,
+        order_by,
+        now: datetime,
+        limit: int,
+        lease_seconds: int,
+        skip_platforms: Iterable[str] = ()
+    ) -> List[ScheduledPost]:
+        skip_platforms = list(skip_platforms)
+        if skip_platforms:
+            claimable = and_(claimable, ScheduledPost.account_id.not_in(
+                select(SocialAccount.id).where(SocialAccount.platform.in_(skip_platforms))
+            ))
+        claim_token = f"{self.worker_id}:{uuid.uuid4().hex[:12]}"
+        candidates = (
+            select(ScheduledPost.id)
+            .where(claimable)
+            .order_by(order_by)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        session = SessionLocal()
+        try:
+            # La condizione è ripetuta sull'UPDATE: una riga presa nel frattempo
+            # da un altro worker non soddisfa più il filtro e viene saltata
+            result = session.execute(
+                update(ScheduledPost)
+                .where(ScheduledPost.id.in_(candidates))
+                .where(claimable)
+                .values(
+                    status="claimed",
+                    claimed_by=claim_token,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            if not result.rowcount:
+                return []
+
+            posts = session.scalars(
+                select(ScheduledPost)
+                .options(joinedload(ScheduledPost.account), joinedload(ScheduledPost.cross_post))
+                .where(ScheduledPost.claimed_by == claim_token)
+                .where(ScheduledPost.status == "claimed")
+                .order_by(ScheduledPost.scheduled_time)
+            ).all()
+        finally:
+            session.close()
+        resolve_shared_content(posts)
+        return posts
+
+    def renew_leases(
+        self,
+        leases: Dict[str, Iterable[int]],
+        now: Optional[datetime] = None,
+        lease_seconds: int = LEASE_SECONDS
+    ) -> int:
+        """Estende il lease dei post ancora presi in carico (claim token -> ID)
+
+        Un post può restare a lungo in coda, in attesa dello smoothing, del
+        backoff o di un caricamento: senza rinnovo un altro worker lo
+        riprenderebbe allo scadere del lease e lo pubblicherebbe di nuovo.
+        """
+        now = now or self.clock()
+        renewed = 0
+        session = SessionLocal()
+        try:
+            for claim_token, post_ids in leases.items():
+                result = session.execute(
+                    update(ScheduledPost)
+                    .where(ScheduledPost.id.in_(list(post_ids)))
+                    .where(ScheduledPost.status == "claimed")
+                    .where(ScheduledPost.claimed_by == claim_token)
+                    .values(lease_expires_at=now + timedelta(seconds=lease_seconds))
+                    .execution_options(synchronize_session=False)
+                )
+                renewed += result.rowcount
+            session.commit()
+        finally:
+            session.close()
+        return renewed
+
+    def complete_posts(
+        self,
+        posts: List[ScheduledPost],
+        status: str = "published",
+        platform_post_ids: Optional[Dict[int, str]] = None
+    ) -> int:
+        """Chiude in un'unica transazione i post presi in carico (claimed -> status)
+
+        Un post il cui lease è stato nel frattempo ripreso da un altro worker
+        non viene toccato. `platform_post_ids` (id -> ID sulla piattaforma)
+        serve alla sincronizzazione per riconoscere i post già pubblicati.
+        """
+        by_token = defaultdict(list)
+        for post in posts:
+            by_token[post.claimed_by].append(post.id)
+        if not by_token:
+            return 0
+
+        updated = 0
+        session = SessionLocal()
+        try:
+            for claim_token, post_ids in by_token.items():
+                result = session.execute(
+                    update(ScheduledPost)
+                    .where(ScheduledPost.id.in_(post_ids))
+                    .where(ScheduledPost.status == "claimed")
+                    .where(ScheduledPost.claimed_by == claim_token)
+                    .values(status=status, lease_expires_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount
+            if platform_post_ids:
+                session.execute(update(ScheduledPost), [
+                    {"id": post_id, "platform_post_id": platform_post_id}
+                    for post_id, platform_post_id in platform_post_ids.items()
+                ])
+            session.commit()
+        finally:
+            session.close()
+        return updated
+
+    def fail_posts(
+        self,
+        failures: List[Tuple[ScheduledPost, BaseException]],
+        now: Optional[datetime] = None
+    ) -> Tuple[int, int]:
+        """Registra le pubblicazioni fallite (claimed -> retrying/failed)
+
+        Gli errori temporanei vengono riprogrammati con backoff esponenziale;
+        gli errori definitivi e i post che hanno esaurito i tentativi finiscono
+        nella tabella dead_letters. Restituisce (riprogrammati, scartati).
+        """
+        now = now or self.clock()
+        retried = dead = 0
+        session = SessionLocal()
+        try:
+            for post, error in failures:
+                attempts = (post.attempts or 0) + 1
+                message = (str(error) or type(error).__name__)[:1000]
+                if is_retryable(error) and attempts < MAX_PUBLISH_ATTEMPTS:
+                    values = {"status": "retrying", "next_attempt_at": now + retry_delay(attempts)}
+                else:
+                    values = {"status": "failed", "next_attempt_at": None}
+
+                result = session.execute(
+                    update(ScheduledPost)
+                    .where(ScheduledPost.id == post.id)
+                    .where(ScheduledPost.status == "claimed")
+                    .where(ScheduledPost.claimed_by == post.claimed_by)
+                    .values(attempts=attempts, last_error=message, lease_expires_at=None, **values)
+                    .execution_options(synchronize_session=False)
+                )
+                if not result.rowcount:
+                    continue
+                if values["status"] == "retrying":
+                    retried += 1
+                else:
+                    session.add(DeadLetter(
+                        post_id=post.id,
+                        account_id=post.account_id,
+                        attempts=attempts,
+                        error=message,
+                        failed_at=now
+                    ))
+                    dead += 1
+            session.commit()
+        finally:
+            session.close()
+        return retried, dead
+
+    def defer_posts(self, deferrals: List[Tuple[ScheduledPost, datetime]]) -> int:
+        """Riprogramma i post rinviati senza contare un tentativo (claimed -> scheduled/retrying)
+
+        I post in orario tornano `scheduled` e non vengono ripresi prima
+        dell'istante indicato; quelli già falliti tornano tra i retry.
+        """
+        deferred = 0
+        session = SessionLocal()
+        try:
+            for post, until in deferrals:
+                result = session.execute(
+                    update(ScheduledPost)
+                    .where(ScheduledPost.id == post.id)
+                    .where(ScheduledPost.status == "claimed")
+                    .where(ScheduledPost.claimed_by == post.claimed_by)
+                    .values(
+                        status="retrying" if post.attempts else "scheduled",
+                        next_attempt_at=until,
+                        lease_expires_at=None
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                deferred += result.rowcount
+            session.commit()
+        finally:
+            session.close()
+        return deferred
+
+    async def dispatch_due(self, dispatcher) -> int:
+        """Prende in carico i post scaduti e li passa al dispatcher asincrono
+
+        Non attende né la fine delle pubblicazioni né le code piene del
+        dispatcher: ogni piattaforma riceve i suoi post da un task proprio e
+        il blocco viene chiuso in background appena tutti hanno un esito.
+        """
+        # Prima i post estratti dalla coda in memoria, presi per ID
+        due_ids = self.queue.pop_due(self.clock())
+        submitted = 0
+        for start in range(0, len(due_ids), CLAIM_BATCH_SIZE):
+            posts = await asyncio.to_thread(
+                self.claim_due_posts,
+                skip_platforms=self._saturated(False),
+                post_ids=due_ids[start:start + CLAIM_BATCH_SIZE]
+            )
+            self._submit(dispatcher, posts)
+            submitted += len(posts)
+
+        # Poi la scansione per quello che la coda non conosce: post creati da
+        # altri worker dopo l'ultimo caricamento, lease scaduti, post rinviati
+        # o rimasti fuori perché la loro piattaforma era satura
+        while True:
+            posts = await asyncio.to_thread(self.claim_due_posts, skip_platforms=self._saturated(False))
+            self._submit(dispatcher, posts)
+            submitted += len(posts)
+
+            if len(posts) < CLAIM_BATCH_SIZE:
+                return submitted
+
+    async def dispatch_retries(self, dispatcher) -> int:
+        """Come dispatch_due, ma per i post in attesa di un nuovo tentativo"""
+        submitted = 0
+        while True:
+            posts = await asyncio.to_thread(self.claim_retry_posts, skip_platforms=self._saturated(True))
+            self._submit(dispatcher, posts, retry=True)
+            submitted += len(posts)
+
+            if len(posts) < RETRY_CLAIM_BATCH_SIZE:
+                return submitted
+
+    def _saturated(self, retry: bool) -> List[str]:
+        """Piattaforme con già un blocco intero in attesa del dispatcher: non si prendono altri loro post"""
+        limit = RETRY_CLAIM_BATCH_SIZE if retry else CLAIM_BATCH_SIZE
+        return [platform for (platform, is_retry), staged in self._staged.items() if is_retry == retry and staged >= limit]
+
+    def _submit(self, dispatcher, posts: List[ScheduledPost], retry: bool = False):
+        by_platform = defaultdict(list)
+        for post in posts:
+            by_platform[post.account.platform].append(post)
+
+        # Un task per piattaforma: la coda piena di una piattaforma lenta
+        # ferma solo i suoi post, non il claim né le altre piattaforme
+        for platform, platform_posts in by_platform.items():
+            self._staged[(platform, retry)] += len(platform_posts)
+            for post in platform_posts:
+                self._in_flight[post.claimed_by].add(post.id)
+            task = asyncio.create_task(self._feed(dispatcher, platform, platform_posts, retry))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _feed(self, dispatcher, platform: str, posts: List[ScheduledPost], retry: bool):
+        """Passa i post al dispatcher rispettandone la backpressure, poi ne chiude il blocco"""
+        key = (platform, retry)
+        futures = []
+        try:
+            for post in posts:
+                futures.append(await dispatcher.submit(post, platform, retry=retry))
+                self._staged[key] -= 1
+        except Exception:
+            # I post non accettati restano presi in carico fino alla scadenza del lease
+            logger.exception("Submitting %s posts failed", platform)
+        finally:
+            self._staged[key] -= len(posts) - len(futures)
+            # I post non accettati non si rinnovano: allo scadere del lease li riprende un worker
+            self._release(posts[len(futures):])
+            was_saturated = self._staged[key] + len(posts) >= CLAIM_BATCH_SIZE
+            if not self._staged[key]:
+                del self._staged[key]
+            if was_saturated and not retry:
+                # I post di questa piattaforma saltati dal claim si possono prendere subito
+                self.queue.wake()
+        await self._complete_batch(posts[:len(futures)], futures)
+
+    def _release(self, posts: List[ScheduledPost]):
+        for post in posts:
+            post_ids = self._in_flight.get(post.claimed_by)
+            if post_ids is not None:
+                post_ids.discard(post.id)
+                if not post_ids:
+                    del self._in_flight[post.claimed_by]
+
+    async def _complete_batch(self, posts: List[ScheduledPost], futures: List[asyncio.Future]):
+        try:
+            await self._close_batch(posts, futures)
+        finally:
+            self._release(posts)
+
+    async def _close_batch(self, posts: List[ScheduledPost], futures: List[asyncio.Future]):
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        published = [post for post, result in zip(posts, results) if not isinstance(result, BaseException)]
+        failed = [(post, result) for post, result in zip(posts, results) if isinstance(result, BaseException)]
+        platform_post_ids = {
+            post.id: published_post_id(result)
+            for post, result in zip(posts, results)
+            if not isinstance(result, BaseException) and published_post_id(result)
+        }
+        deferred, failed = _split_deferred(failed, self.clock())
+        await asyncio.to_thread(self.complete_posts, published, "published", platform_post_ids)
+        if deferred:
+            await asyncio.to_thread(self.defer_posts, deferred)
+            for post, until in deferred:
+                if not post.attempts:
+                    self.queue.push(until, post.id)
+        if failed:
+            retried, dead = await asyncio.to_thread(self.fail_posts, failed)
+            logger.warning("Publish failed: %d scheduled for retry, %d dead-lettered", retried, dead)
+
+    def seconds_until_next_event(self, now: Optional[datetime] = None) -> float:
+        """Attesa fino al prossimo post in scadenza o al prossimo caricamento"""
+        now = now or self.clock()
+        candidates = [MAX_SLEEP_SECONDS]
+        next_due = self.queue.peek_time()
+        if next_due is not None:
+            candidates.append((next_due - now).total_seconds())
+        if self.queue.loaded_until is not None:
+            candidates.append((self.queue.loaded_until - LOAD_AHEAD - now).total_seconds())
+        return max(min(candidates), 0.0)
+
+    async def run(self, dispatcher):
+        """Ciclo di pubblicazione eseguito da ogni worker dell'applicazione
+
+        Invece di interrogare la coda a intervalli fissi il ciclo dorme fino
+        al prossimo post in scadenza e viene risvegliato subito se arriva un
+        post con scadenza più vicina.
+        """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        self.queue.add_listener(lambda: loop.call_soon_threadsafe(wakeup.set))
+
+        while True:
+            wakeup.clear()
+            try:
+                loaded_until = self.queue.loaded_until
+                if loaded_until is None or self.clock() >= loaded_until - LOAD_AHEAD:
+                    await asyncio.to_thread(self.load_next_slice)
+                await self.dispatch_due(dispatcher)
+            except Exception:
+                logger.exception("Scheduler tick failed")
+
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.seconds_until_next_event())
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_retries(self, dispatcher):
+        """Ciclo dei nuovi tentativi, separato da quello dei post in orario
+
+        Durante un disservizio di una piattaforma i tentativi si accumulano qui
+        e usano solo gli slot di retry del dispatcher.
+        """
+        while True:
+            try:
+                await self.dispatch_retries(dispatcher)
+            except Exception:
+                logger.exception("Retry tick failed")
+            await asyncio.sleep(RETRY_POLL_SECONDS)
+
+    async def run_leases(self, interval: float = LEASE_RENEW_SECONDS):
+        """Ciclo che rinnova il lease dei post passati al dispatcher e non ancora chiusi"""
+        while True:
+            await asyncio.sleep(interval)
+            leases = {claim_token: list(post_ids) for claim_token, post_ids in self._in_flight.items()}
+            if not leases:
+                continue
+            try:
+                await asyncio.to_thread(self.renew_leases, leases)
+            except Exception:
+                logger.exception("Lease renewal failed")
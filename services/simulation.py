@@ -0,0 +1,320 @@
+"""Simulazione dello scheduler con orologio virtuale
+
+Riproduce un calendario (sintetico o registrato in CSV/NDJSON) contro
+integrazioni finte con latenza configurabile. I post vengono scritti in un
+database SQLite in memoria e pubblicati dagli stessi cicli della produzione
+(ContentScheduler.run e run_retries: claim, lease, chiusura dei blocchi,
+backoff), con lo stesso dispatcher e lo stesso smoothing. Il tempo avanza
+solo quando tutto il lavoro pronto è stato eseguito e nessuna query è in
+corso, quindi un giorno di calendario si simula in pochi secondi.
+
+    python -m services.simulation --posts 100000 --accounts 2000 --hours 24 \\
+        --latency twitter=0.3 --latency instagram=1.5 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import selectors
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.pool import StaticPool
+import database
+from models import ScheduledPost, SocialAccount
+from services.dispatch_queue import DispatchQueue
+from services.dispatcher import PLATFORM_CONCURRENCY, PUBLISH_WORKERS, PublishDispatcher
+from services.metrics import LagStats
+from services.scheduler import ContentScheduler
+from services.smoothing import PLATFORMS, BurstSmoother
+
+SIMULATION_EPOCH = datetime(2025, 1, 1)
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Selector che, invece di bloccarsi in attesa, fa avanzare il tempo virtuale"""
+
+    def __init__(self, loop: "VirtualClockLoop"):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout=None):
+        if self._loop.executor_jobs and timeout != 0:
+            # Le query nei thread non consumano tempo virtuale: si attende la loro fine
+            return super().select(None)
+        events = super().select(0)
+        if not events and timeout:
+            self._loop.advance(timeout)
+        return events
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop asyncio il cui orologio è virtuale (secondi dall'avvio)"""
+
+    def __init__(self):
+        super().__init__(selector=_VirtualSelector(self))
+        self._virtual_time = 0.0
+        self.executor_jobs = 0
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, future):
+        self.executor_jobs -= 1
+
+    def advance(self, seconds: float):
+        self._virtual_time += seconds
+
+    def now(self) -> datetime:
+        return SIMULATION_EPOCH + timedelta(seconds=self._virtual_time)
+
+class LatencyModel:
+    """Latenza log-normale attorno a una mediana, con tasso di errore"""
+
+    def __init__(self, median: float = 0.3, sigma: float = 0.5, error_rate: float = 0.0):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+class StubPlatformManager:
+    """Sostituto di PlatformManager che simula solo i tempi delle piattaforme"""
+
+    def __init__(self, account_platforms: Dict[int, str], latencies: Dict[str, LatencyModel], seed: int = 0):
+        self.account_platforms = account_platforms
+        self.latencies = latencies
+        self.rng = random.Random(seed)
+
+    async def post_content(
+        self,
+        account_id: int,
+        content: str,
+        media_urls: List[str] = None,
+        idempotency_key: str = None,
+        published_since: Optional[datetime] = None
+    ) -> Dict:
+        model = self.latencies[self.account_platforms[account_id]]
+        await asyncio.sleep(model.sample(self.rng))
+        if self.rng.random() < model.error_rate:
+            raise RuntimeError("Simulated platform error")
+        return {"status": "success"}
+
+def synthetic_calendar(
+    posts: int,
+    accounts: int,
+    hours: float,
+    round_time_share: float = 0.6,
+    seed: int = 0
+) -> Iterator[Dict]:
+    """Calendario sintetico: una parte dei post cade su orari tondi (xx:00, xx:30)"""
+    rng = random.Random(seed)
+    span = hours * 3600
+    for post_id in range(1, posts + 1):
+        offset = rng.uniform(0, span)
+        if rng.random() < round_time_share:
+            offset -= offset % 1800
+        yield {
+            "id": post_id,
+            "account_id": rng.randint(1, accounts),
+            "scheduled_time": SIMULATION_EPOCH + timedelta(seconds=offset)
+        }
+
+def recorded_calendar(path: str) -> Iterator[Dict]:
+    """Calendario registrato, nello stesso formato di POST /content/import"""
+    from services.calendar_import import iter_csv_rows, iter_ndjson_rows
+
+    with open(path, "rb") as stream:
+        rows = iter_csv_rows(stream) if path.endswith(".csv") else iter_ndjson_rows(stream)
+        entries = [
+            (datetime.fromisoformat(str(data["scheduled_time"])), int(data["account_id"]))
+            for _, data, error in rows
+            if error is None and data.get("scheduled_time")
+        ]
+    if not entries:
+        return
+    # Il calendario viene traslato in modo che il primo post cada all'avvio
+    shift = SIMULATION_EPOCH - min(scheduled_time for scheduled_time, _ in entries)
+    for post_id, (scheduled_time, account_id) in enumerate(entries, start=1):
+        yield {"id": post_id, "account_id": account_id, "scheduled_time": scheduled_time + shift}
+
+class SchedulerSimulation:
+    """Calendario pubblicato da ContentScheduler su un database SQLite in memoria"""
+
+    def __init__(
+        self,
+        calendar: Iterator[Dict],
+        latencies: Dict[str, LatencyModel],
+        workers: int = PUBLISH_WORKERS,
+        platform_limits: Optional[Dict[str, int]] = None,
+        spread_window: float = 0.0,
+        sample_interval: float = 60.0,
+        seed: int = 0
+    ):
+        self.posts = [
+            {"content": "", "media_urls": [], "status": "scheduled", **entry}
+            for entry in calendar
+        ]
+        self.account_platforms = {
+            account_id: PLATFORMS[account_id % len(PLATFORMS)]
+            for account_id in {post["account_id"] for post in self.posts}
+        }
+        self.latencies = latencies
+        self.workers = workers
+        self.platform_limits = dict(PLATFORM_CONCURRENCY, **(platform_limits or {}))
+        self.spread_window = spread_window
+        self.sample_interval = sample_interval
+        self.seed = seed
+
+    def run(self) -> Dict:
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        database.Base.metadata.create_all(bind=engine)
+        database.SessionLocal.configure(bind=engine)
+        loop = VirtualClockLoop()
+        # Un solo thread per le query: la connessione in memoria è condivisa
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1, thread_name_prefix="simulation-db"))
+        started = time.perf_counter()
+        try:
+            self._seed()
+            report = loop.run_until_complete(self._simulate(loop))
+        finally:
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+            database.SessionLocal.configure(bind=database.engine)
+            engine.dispose()
+        report["wall_seconds"] = round(time.perf_counter() - started, 3)
+        return report
+
+    def _seed(self):
+        session = database.SessionLocal()
+        try:
+            session.execute(insert(SocialAccount), [
+                {"id": account_id, "platform": platform, "access_token": "simulation"}
+                for account_id, platform in self.account_platforms.items()
+            ])
+            if self.posts:
+                session.execute(insert(ScheduledPost), self.posts)
+            session.commit()
+        finally:
+            session.close()
+
+    async def _simulate(self, loop: VirtualClockLoop) -> Dict:
+        lag = LagStats(window=max(len(self.posts), 1))
+        smoother = None
+        if self.spread_window > 0:
+            smoother = BurstSmoother(windows={platform: self.spread_window for platform in PLATFORMS})
+        dispatcher = PublishDispatcher(
+            manager=StubPlatformManager(self.account_platforms, self.latencies, self.seed),
+            workers=self.workers,
+            platform_limits=self.platform_limits,
+            metrics=lag,
+            clock=loop.now,
+            smoother=smoother
+        )
+        scheduler = ContentScheduler(worker_id="simulation", clock=loop.now, queue=DispatchQueue())
+        await dispatcher.start()
+        tasks = [
+            asyncio.create_task(scheduler.run(dispatcher)),
+            asyncio.create_task(scheduler.run_retries(dispatcher)),
+            asyncio.create_task(scheduler.run_leases())
+        ]
+
+        depth_samples = []
+        try:
+            while True:
+                counts = await asyncio.to_thread(_status_counts)
+                depth_samples.append({
+                    "t": round(loop.time(), 1),
+                    "queued": counts.get("scheduled", 0),
+                    "in_flight": counts.get("claimed", 0),
+                    "retrying": counts.get("retrying", 0),
+                    "published": counts.get("published", 0),
+                    "platform_backlog": dispatcher.queue_depth()
+                })
+                if not any(counts.get(status) for status in ("scheduled", "claimed", "retrying")):
+                    break
+                await asyncio.sleep(self.sample_interval)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*scheduler._pending, return_exceptions=True)
+            await dispatcher.stop()
+
+        duration = loop.time()
+        published = counts.get("published", 0)
+        return {
+            "posts": len(self.posts),
+            "published": published,
+            "failed": counts.get("failed", 0),
+            "virtual_seconds": round(duration, 1),
+            "throughput_per_second": round(published / duration, 2) if duration else None,
+            "dispatch_lag": {key: value for key, value in lag.snapshot().items() if key != "last_published_at"},
+            "queue_depth": depth_samples
+        }
+
+def _status_counts() -> Dict[str, int]:
+    session = database.SessionLocal()
+    try:
+        return dict(session.execute(
+            select(ScheduledPost.status, func.count()).group_by(ScheduledPost.status)
+        ).all())
+    finally:
+        session.close()
+
+def _parse_latency(values: List[str], error_rate: float) -> Dict[str, LatencyModel]:
+    latencies = {platform: LatencyModel(error_rate=error_rate) for platform in PLATFORMS}
+    for value in values:
+        platform, median = value.split("=", 1)
+        latencies[platform] = LatencyModel(median=float(median), error_rate=error_rate)
+    return latencies
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Simulazione accelerata dello scheduler")
+    parser.add_argument("--calendar", help="Calendario registrato (.csv o .ndjson)")
+    parser.add_argument("--posts", type=int, default=10000, help="Post del calendario sintetico")
+    parser.add_argument("--accounts", type=int, default=500, help="Account del calendario sintetico")
+    parser.add_argument("--hours", type=float, default=24, help="Durata del calendario sintetico")
+    parser.add_argument("--round-share", type=float, default=0.6, help="Quota di post su orari tondi")
+    parser.add_argument("--latency", action="append", default=[], help="Latenza mediana, es. twitter=0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tasso di errore delle piattaforme")
+    parser.add_argument("--workers", type=int, default=PUBLISH_WORKERS, help="Pubblicazioni concorrenti")
+    parser.add_argument("--spread", type=float, default=0.0, help="Finestra di smoothing in secondi")
+    parser.add_argument("--sample-interval", type=float, default=60.0, help="Campionamento della coda in secondi")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    # I fallimenti simulati finiscono nel report, non nel log di ogni blocco
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.calendar:
+        calendar = recorded_calendar(args.calendar)
+    else:
+        calendar = synthetic_calendar(args.posts, args.accounts, args.hours, args.round_share, args.seed)
+
+    simulation = SchedulerSimulation(
+        calendar,
+        latencies=_parse_latency(args.latency, args.error_rate),
+        workers=args.workers,
+        spread_window=args.spread,
+        sample_interval=args.sample_interval,
+        seed=args.seed
+    )
+    json.dump(simulation.run(), sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
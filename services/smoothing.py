@@ -0,0 +1,88 @@
+import os
+import zlib
+from collections import defaultdict
+from typing import Dict, Optional
+from services.registry import BUILTIN_PLATFORMS, get_registry
+
+PLATFORMS = tuple(BUILTIN_PLATFORMS)
+
+# Finestra di distribuzione dei post programmati allo stesso istante (0 = disattivata).
+SPREAD_WINDOW_SECONDS = float(os.getenv("SPREAD_WINDOW_SECONDS", "0"))
+# Attesa massima in memoria, finestra compresa: deve restare ben sotto il lease
+# dello scheduler (SCHEDULER_LEASE_SECONDS). Oltre, il post torna nel database.
+SMOOTHING_MAX_DELAY_SECONDS = float(os.getenv("SMOOTHING_MAX_DELAY_SECONDS", "120"))
+PLATFORM_SPREAD_WINDOWS = {
+    platform: float(os.getenv(f"{platform.upper()}_SPREAD_WINDOW_SECONDS", SPREAD_WINDOW_SECONDS))
+    for platform in PLATFORMS
+}
+
+class BurstSmoother:
+    """Distribuisce nel tempo i post programmati sullo stesso orario
+
+    Ogni coppia (account, piattaforma) riceve uno scostamento stabile dentro
+    la finestra configurata; il post viene poi assegnato al primo secondo in
+    cui la piattaforma ha ancora capacità, così il carico di pubblicazione
+    resta piatto anche sugli orari tondi (9:00, 12:00...).
+
+    L'attesa non supera mai `max_delay`: i post che non trovano capacità
+    entro quel limite non prenotano nulla e vanno riprogrammati.
+    La capacità è contata per processo: con più worker ognuno pubblica fino
+    a `publish_rate`, quindi il limite va diviso per il numero di worker
+    (es. TWITTER_PUBLISH_RATE).
+    """
+
+    def __init__(
+        self,
+        windows: Optional[Dict[str, float]] = None,
+        rates: Optional[Dict[str, int]] = None,
+        max_delay: float = SMOOTHING_MAX_DELAY_SECONDS
+    ):
+        self.max_delay = max_delay
+        windows = dict(PLATFORM_SPREAD_WINDOWS, **(windows or {}))
+        self.windows = {platform: min(window, max_delay) for platform, window in windows.items()}
+        # Pubblicazioni al secondo sostenibili: il limite `publish_rate` degli spec
+        registry = get_registry()
+        publish_rates = {name: registry.spec(name).limit("publish_rate", 0) for name in registry.names()}
+        self.rates = dict(publish_rates, **(rates or {}))
+        self._buckets: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    @property
+    def enabled(self) -> bool:
+        return any(window > 0 for window in self.windows.values())
+
+    def offset(self, account_id: int, platform: str) -> float:
+        """Scostamento deterministico, uguale su tutti i worker"""
+        window = self.windows.get(platform, SPREAD_WINDOW_SECONDS)
+        if window <= 0:
+            return 0.0
+        digest = zlib.crc32(f"{account_id}:{platform}".encode())
+        return window * digest / 2 ** 32
+
+    def delay(self, account_id: int, platform: str, seconds_until_due: float, now: float) -> Optional[float]:
+        """Secondi da attendere prima di pubblicare, a partire dall'istante `now`
+
+        None se la piattaforma non ha capacità entro `max_delay`.
+        """
+        target = now + max(seconds_until_due, 0.0) + self.offset(account_id, platform)
+        at = self._reserve(platform, target, now, deadline=now + self.max_delay)
+        return None if at is None else at - now
+
+    def _reserve(self, platform: str, at: float, now: float, deadline: float) -> Optional[float]:
+        rate = self.rates.get(platform)
+        if not rate:
+            return at if at <= deadline else None
+
+        buckets = self._buckets[platform]
+        if len(buckets) > 1024:
+            for second in [second for second in buckets if second < int(now)]:
+                del buckets[second]
+
+        second = int(at)
+        while buckets.get(second, 0) >= rate:
+            second += 1
+        used = buckets.get(second, 0)
+        reserved = max(at, second + used / rate)
+        if reserved > deadline:
+            return None
+        buckets[second] = used + 1
+        return reserved
@@ -0,0 +1,425 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import or_, select, update
+from database import SessionLocal
+from models import Engagement, PostComment, ScheduledPost, SocialAccount, SyncCursor
+from services.platforms import get_platform_manager
+from services.rollup import record_engagement
+from services.webhook_events import pushed_resources
+
+SYNC_RESOURCES = ("posts", "metrics", "comments")
+# Pagine di post lette al massimo per sincronizzazione: il resto alla successiva
+SYNC_MAX_PAGES = int(os.getenv("SYNC_MAX_PAGES", "10"))
+# Le metriche dei post più vecchi di così non vengono più rilette
+SYNC_METRICS_WINDOW = timedelta(days=int(os.getenv("SYNC_METRICS_WINDOW_DAYS", "7")))
+# Frequenza del ciclo in background e account sincronizzati in parallelo
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL_SECONDS", "900"))
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
+class SyncManager:
+    """Sincronizzazione incrementale di post, metriche e commenti degli account
+
+    Per ogni account e risorsa un SyncCursor conserva dove si era arrivati
+    (since_id, token di pagina, istante dell'ultimo elemento importato), così
+    ogni sincronizzazione chiede alle piattaforme solo ciò che è cambiato:
+    - posts: solo i post successivi al cursore
+    - metrics: i post recenti, a blocchi per chiamata; si scrive solo ciò che cambia
+    - comments: solo per i post il cui numero di commenti è aumentato
+    Le chiamate passano dal PlatformManager (token, rate limit, circuit breaker).
+    """
+
+    def __init__(self, manager=None):
+        self.manager = manager or get_platform_manager()
+        self._running: Dict[int, asyncio.Task] = {}
+
+    async def sync_account(self, account_id: int, resources: Iterable[str] = SYNC_RESOURCES) -> Dict:
+        """Sincronizza l'account; le richieste contemporanee condividono la stessa esecuzione"""
+        task = self._running.get(account_id)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._sync(account_id, tuple(resources)))
+            self._running[account_id] = task
+            task.add_done_callback(lambda done: self._settle(account_id, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, account_id: int, task: asyncio.Task):
+        if self._running.get(account_id) is task:
+            del self._running[account_id]
+        if not task.cancelled():
+            task.exception()
+
+    async def _sync(self, account_id: int, resources: Tuple[str, ...]) -> Dict:
+        account = await asyncio.to_thread(_load_account, account_id)
+        if account is None:
+            raise ValueError("Account not found")
+        integration = self.manager.integration(account.platform)
+        started = datetime.now()
+        cursors = await asyncio.to_thread(_load_cursors, account_id)
+        report = {"account_id": account_id, "platform": account.platform}
+        # Post con nuovi commenti -> ultima lettura precedente delle metriche
+        commented: Dict[int, Optional[datetime]] = {}
+
+        if "posts" in resources:
+            report["posts_imported"], new_comments = await self._sync_posts(account, integration, cursors.get("posts"))
+            _merge_commented(commented, new_comments)
+
+        if "metrics" in resources:
+            report["metrics_updated"], new_comments = await self._sync_metrics(account, integration, started)
+            _merge_commented(commented, new_comments)
+
+        if "comments" in resources:
+            report["comments_imported"] = 0
+            if commented:
+                report["comments_imported"] = await self._sync_comments(account, integration, commented, started)
+
+        await asyncio.to_thread(_mark_synced, account_id, started)
+        return report
+
+    async def _sync_posts(
+        self,
+        account: SocialAccount,
+        integration,
+        cursor: Optional[SyncCursor]
+    ) -> Tuple[int, Dict[int, Optional[datetime]]]:
+        state = dict(cursor.cursor or {}) if cursor else {}
+        watermark = cursor.watermark if cursor else None
+        imported = pages = 0
+        commented: Dict[int, Optional[datetime]] = {}
+        done = False
+        # Il cursore viene salvato a ogni pagina: un'interruzione riprende da lì
+        while not done and pages < SYNC_MAX_PAGES:
+            posts, state, done = await self.manager.call(
+                account,
+                lambda token, state=state, watermark=watermark: integration.sync_posts(token, state, watermark),
+                pool="read"
+            )
+            pages += 1
+            times = [post["created_at"] for post in posts if post["created_at"] is not None]
+            if times:
+                watermark = max(times + ([watermark] if watermark else []))
+            new_posts, new_comments = await asyncio.to_thread(_store_posts, account.id, posts, state, watermark)
+            imported += new_posts
+            _merge_commented(commented, new_comments)
+        return imported, commented
+
+    async def _sync_metrics(
+        self,
+        account: SocialAccount,
+        integration,
+        now: datetime
+    ) -> Tuple[int, Dict[int, Optional[datetime]]]:
+        posts = await asyncio.to_thread(_recent_posts, account.id, now - SYNC_METRICS_WINDOW)
+        if not posts:
+            return 0, {}
+        metrics = await self.manager.call(account, lambda token: integration.fetch_metrics(token, list(posts)), pool="read")
+        return await asyncio.to_thread(
+            _store_metrics, account.id,
+            {posts[platform_id]: values for platform_id, values in metrics.items() if platform_id in posts},
+            now
+        )
+
+    async def _sync_comments(
+        self,
+        account: SocialAccount,
+        integration,
+        commented: Dict[int, Optional[datetime]],
+        now: datetime
+    ) -> int:
+        """Commenti dei soli post cambiati, dalla lettura precedente più vecchia tra loro"""
+        platform_ids = await asyncio.to_thread(_platform_post_ids, set(commented))
+        seen = list(commented.values())
+        since = None if None in seen else min(seen)
+        comments = await self.manager.call(
+            account, lambda token: integration.fetch_comments(token, list(platform_ids), since), pool="read"
+        )
+        return await asyncio.to_thread(_store_comments, account.id, platform_ids, comments, now)
+
+    async def sync_stale(self, older_than: timedelta = timedelta(seconds=SYNC_INTERVAL)) -> int:
+        """Sincronizza gli account non sincronizzati da `older_than`; restituisce quanti
+
+        Le risorse che la piattaforma invia via webhook non vengono rilette.
+        Ogni account viene prima preso in carico portando avanti `last_sync`
+        con un UPDATE condizionato: se un altro worker l'ha già preso viene
+        saltato. Una sincronizzazione fallita si riprova al giro successivo.
+        """
+        registry = self.manager.registry
+        # Le piattaforme che non dichiarano la sincronizzazione non vengono interrogate
+        platforms = [
+            name for name in self.manager.integrations
+            if registry.find(name) is None or registry.find(name).supports("sync")
+        ]
+        before = datetime.now() - older_than
+        accounts = await asyncio.to_thread(_stale_accounts, before, platforms)
+        slots = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+        async def sync(account_id: int, platform: str) -> bool:
+            pushed = pushed_resources(platform)
+            async with slots:
+                if not await asyncio.to_thread(_claim_stale_account, account_id, before, datetime.now()):
+                    return False
+                try:
+                    await self.sync_account(account_id, [r for r in SYNC_RESOURCES if r not in pushed])
+                    return True
+                except Exception:
+                    logger.exception("Sync failed for account %s", account_id)
+                    return False
+
+        results = await asyncio.gather(*(sync(account_id, platform) for account_id, platform in accounts))
+        return sum(results)
+
+    async def run(self, interval: float = SYNC_INTERVAL):
+        """Ciclo di sincronizzazione eseguito da ogni worker dell'applicazione
+
+        I worker si dividono gli account: ognuno sincronizza solo quelli che
+        riesce a prendere in carico.
+        """
+        while True:
+            try:
+                await self.sync_stale()
+            except Exception:
+                logger.exception("Sync tick failed")
+            await asyncio.sleep(interval)
+
+_sync_manager: Optional[SyncManager] = None
+_sync_manager_lock = threading.Lock()
+
+def get_sync_manager() -> SyncManager:
+    """SyncManager condiviso dal processo"""
+    global _sync_manager
+    if _sync_manager is None:
+        with _sync_manager_lock:
+            if _sync_manager is None:
+                _sync_manager = SyncManager()
+    return _sync_manager
+
+def _merge_commented(target: Dict[int, Optional[datetime]], new: Dict[int, Optional[datetime]]):
+    for post_id, seen in new.items():
+        if post_id not in target:
+            target[post_id] = seen
+        elif target[post_id] is not None:
+            target[post_id] = None if seen is None else min(target[post_id], seen)
+
+def _load_account(account_id: int) -> Optional[SocialAccount]:
+    session = SessionLocal()
+    try:
+        return session.get(SocialAccount, account_id)
+    finally:
+        session.close()
+
+def _load_cursors(account_id: int) -> Dict[str, SyncCursor]:
+    session = SessionLocal()
+    try:
+        cursors = session.scalars(select(SyncCursor).where(SyncCursor.account_id == account_id)).all()
+        return {cursor.resource: cursor for cursor in cursors}
+    finally:
+        session.close()
+
+def _save_cursor(session, account_id: int, resource: str, now: datetime, cursor: Optional[Dict] = None, watermark=None):
+    row = session.scalars(
+        select(SyncCursor).where(SyncCursor.account_id == account_id).where(SyncCursor.resource == resource)
+    ).first()
+    if row is None:
+        row = SyncCursor(account_id=account_id, resource=resource)
+        session.add(row)
+    if cursor is not None:
+        row.cursor = cursor
+    if watermark is not None:
+        row.watermark = watermark
+    row.updated_at = now
+
+def _apply_metrics(
+    session,
+    account_id: int,
+    metrics: Dict[int, Dict],
+    now: datetime
+) -> Tuple[int, Dict[int, Optional[datetime]]]:
+    """Aggiorna le righe engagements solo dove i valori sono cambiati
+
+    Le differenze vanno nel rollup analytics: quelle dei post già letti a
+    oggi, i totali dei post letti per la prima volta al giorno di
+    pubblicazione. Restituisce le righe scritte e i post con commenti
+    aumentati, ciascuno con l'istante della lettura precedente (None se mai
+    letto).
+    """
+    if not metrics:
+        return 0, {}
+    existing = {
+        engagement.post_id: engagement
+        for engagement in session.scalars(select(Engagement).where(Engagement.post_id.in_(list(metrics)))).all()
+    }
+    published = dict(session.execute(
+        select(ScheduledPost.id, ScheduledPost.scheduled_time)
+        .where(ScheduledPost.id.in_([post_id for post_id in metrics if post_id not in existing]))
+    ).all()) if len(existing) < len(metrics) else {}
+    changed = 0
+    commented = {}
+    deltas = []
+    for post_id, values in metrics.items():
+        likes, comments, shares = values.get("likes", 0), values.get("comments", 0), values.get("shares", 0)
+        engagement = existing.get(post_id)
+        if engagement is None:
+            engagement = Engagement(post_id=post_id)
+            session.add(engagement)
+        elif (engagement.likes, engagement.comments, engagement.shares) == (likes, comments, shares):
+            continue
+        if comments > (engagement.comments or 0):
+            commented[post_id] = engagement.last_updated
+        deltas.append((account_id, published.get(post_id) or now, {
+            "likes": likes - (engagement.likes or 0),
+            "comments": comments - (engagement.comments or 0),
+            "shares": shares - (engagement.shares or 0)
+        }))
+        engagement.likes, engagement.comments, engagement.shares = likes, comments, shares
+        engagement.last_updated = now
+        changed += 1
+    record_engagement(session, deltas, now)
+    return changed, commented
+
+def _store_posts(
+    account_id: int,
+    posts: List[Dict],
+    cursor: Dict,
+    watermark: Optional[datetime]
+) -> Tuple[int, Dict[int, Optional[datetime]]]:
+    """Importa i post non ancora presenti e salva il cursore nella stessa transazione"""
+    now = datetime.now()
+    session = SessionLocal()
+    try:
+        known = dict(session.execute(
+            select(ScheduledPost.platform_post_id, ScheduledPost.id)
+            .where(ScheduledPost.account_id == account_id)
+            .where(ScheduledPost.platform_post_id.in_([post["id"] for post in posts]))
+        ).all()) if posts else {}
+
+        created = []
+        for post in posts:
+            if post["id"] in known:
+                continue
+            row = ScheduledPost(
+                account_id=account_id,
+                content=post.get("content") or "",
+                media_urls=[],
+                scheduled_time=post["created_at"],
+                status="published",
+                platform_post_id=post["id"]
+            )
+            session.add(row)
+            created.append((post, row))
+        session.flush()
+        known.update({post["id"]: row.id for post, row in created})
+
+        _, commented = _apply_metrics(
+            session,
+            account_id,
+            {known[post["id"]]: post["metrics"] for post in posts if post.get("metrics")},
+            now
+        )
+        _save_cursor(session, account_id, "posts", now, cursor=cursor, watermark=watermark)
+        session.commit()
+        return len(created), commented
+    finally:
+        session.close()
+
+def _recent_posts(account_id: int, since: datetime) -> Dict[str, int]:
+    """Post pubblicati dopo `since`: ID sulla piattaforma -> id"""
+    session = SessionLocal()
+    try:
+        return dict(session.execute(
+            select(ScheduledPost.platform_post_id, ScheduledPost.id)
+            .where(ScheduledPost.account_id == account_id)
+            .where(ScheduledPost.status == "published")
+            .where(ScheduledPost.scheduled_time >= since)
+            .where(ScheduledPost.platform_post_id.is_not(None))
+        ).all())
+    finally:
+        session.close()
+
+def _store_metrics(account_id: int, metrics: Dict[int, Dict], now: datetime) -> Tuple[int, Dict[int, Optional[datetime]]]:
+    session = SessionLocal()
+    try:
+        changed, commented = _apply_metrics(session, account_id, metrics, now)
+        _save_cursor(session, account_id, "metrics", now, watermark=now)
+        session.commit()
+        return changed, commented
+    finally:
+        session.close()
+
+def _platform_post_ids(post_ids: Set[int]) -> Dict[str, int]:
+    session = SessionLocal()
+    try:
+        return dict(session.execute(
+            select(ScheduledPost.platform_post_id, ScheduledPost.id).where(ScheduledPost.id.in_(list(post_ids)))
+        ).all())
+    finally:
+        session.close()
+
+def _store_comments(account_id: int, posts: Dict[str, int], comments: List[Dict], now: datetime) -> int:
+    """Inserisce i commenti non ancora presenti e avanza il cursore dei commenti"""
+    session = SessionLocal()
+    try:
+        known = set(session.execute(
+            select(PostComment.post_id, PostComment.platform_comment_id)
+            .where(PostComment.post_id.in_(list(posts.values())))
+        ).all())
+        stored = 0
+        for comment in comments:
+            post_id = posts.get(comment["post_id"])
+            if post_id is None or (post_id, comment["id"]) in known:
+                continue
+            known.add((post_id, comment["id"]))
+            session.add(PostComment(
+                post_id=post_id,
+                platform_comment_id=comment["id"],
+                author=comment.get("author"),
+                text=comment.get("text"),
+                created_at=comment.get("created_at")
+            ))
+            stored += 1
+        _save_cursor(session, account_id, "comments", now, watermark=now)
+        session.commit()
+        return stored
+    finally:
+        session.close()
+
+def _mark_synced(account_id: int, synced_at: datetime):
+    session = SessionLocal()
+    try:
+        account = session.get(SocialAccount, account_id)
+        if account is not None:
+            account.last_sync = synced_at
+            session.commit()
+    finally:
+        session.close()
+
+def _claim_stale_account(account_id: int, before: datetime, now: datetime) -> bool:
+    """Prende in carico un account ancora da sincronizzare; False se l'ha già preso un altro worker"""
+    session = SessionLocal()
+    try:
+        claimed = session.execute(
+            update(SocialAccount)
+            .where(SocialAccount.id == account_id)
+            .where(or_(SocialAccount.last_sync.is_(None), SocialAccount.last_sync < before))
+            .values(last_sync=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+        return bool(claimed)
+    finally:
+        session.close()
+
+def _stale_accounts(before: datetime, platforms: List[str]) -> List[Tuple[int, str]]:
+    session = SessionLocal()
+    try:
+        return session.execute(
+            select(SocialAccount.id, SocialAccount.platform)
+            .where(SocialAccount.platform.in_(platforms))
+            .where(or_(SocialAccount.last_sync.is_(None), SocialAccount.last_sync < before))
+            .order_by(SocialAccount.last_sync)
+        ).all()
+    finally:
+        session.close()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import select, update
+from database import SessionLocal
+from models import SocialAccount
+from services.leases import claim_job, default_worker_id
+
+# I token che scadono entro questo margine vengono rinnovati prima dell'uso
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300")))
+# Frequenza del rinnovo proattivo e quanto in anticipo rinnova
+TOKEN_REFRESH_INTERVAL = float(os.getenv("TOKEN_REFRESH_INTERVAL_SECONDS", "60"))
+TOKEN_REFRESH_AHEAD = timedelta(seconds=int(os.getenv("TOKEN_REFRESH_AHEAD_SECONDS", "900")))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "8"))
+# Lease (job_leases) del worker che esegue il rinnovo proattivo
+TOKEN_REFRESH_LEASE = "token_refresh"
+
+logger = logging.getLogger(__name__)
+
+class TokenManager:
+    """Rinnovo dei token OAuth degli account, uno alla volta per account
+
+    Chi trova un token in scadenza (o riceve un 401) chiede un rinnovo: se
+    per quell'account ce n'è già uno in corso attende quello invece di
+    avviarne un altro. Un ciclo in background rinnova in anticipo i token
+    prossimi alla scadenza, così il percorso di pubblicazione di norma non
+    aspetta mai un rinnovo. L'attesa condivisa vale nel processo; il ciclo
+    in background gira in un solo worker alla volta (lease TOKEN_REFRESH_LEASE),
+    così i worker non rinnovano insieme gli stessi token.
+    """
+
+    def __init__(self, manager, worker_id: Optional[str] = None):
+        self.manager = manager
+        self.worker_id = worker_id or default_worker_id()
+        self._refreshing: Dict[int, asyncio.Task] = {}
+
+    async def access_token(self, account: SocialAccount) -> str:
+        """Token valido per l'account, rinnovato prima se sta per scadere"""
+        expires_at = account.token_expires_at
+        if expires_at is not None and expires_at - TOKEN_REFRESH_MARGIN <= datetime.now():
+            return await self.refresh(account.id, stale_token=account.access_token)
+        return account.access_token
+
+    async def refresh(self, account_id: int, stale_token: Optional[str] = None) -> str:
+        """Rinnova il token dell'account; le chiamate contemporanee ne condividono uno"""
+        task = self._refreshing.get(account_id)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._refresh(account_id, stale_token))
+            self._refreshing[account_id] = task
+            task.add_done_callback(lambda done: self._settle(account_id, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, account_id: int, task: asyncio.Task):
+        if self._refreshing.get(account_id) is task:
+            del self._refreshing[account_id]
+        if not task.cancelled():
+            task.exception()
+
+    async def _refresh(self, account_id: int, stale_token: Optional[str]) -> str:
+        account = await asyncio.to_thread(_load_account, account_id)
+        if account is None:
+            raise ValueError("Account not found")
+        # Un altro processo può aver già rinnovato il token
+        if stale_token is not None and account.access_token != stale_token and not _expiring(account):
+            return account.access_token
+
+        integration = self.manager.integration(account.platform)
+        tokens = await integration.refresh_token(account.access_token, account.refresh_token)
+        expires_in = tokens.get("expires_in")
+        expires_at = datetime.now() + timedelta(seconds=int(expires_in)) if expires_in else None
+
+        stored = await asyncio.to_thread(
+            _store_tokens, account, tokens["access_token"], tokens["refresh_token"], expires_at
+        )
+        if not stored:
+            # Rinnovo concorrente da un altro processo: vale il token salvato
+            account = await asyncio.to_thread(_load_account, account_id)
+            return account.access_token
+        self.manager.insights_cache.invalidate(account_id)
+        return tokens["access_token"]
+
+    async def refresh_expiring(self, ahead: timedelta = TOKEN_REFRESH_AHEAD) -> int:
+        """Rinnova i token che scadono entro `ahead`; restituisce quanti"""
+        account_ids = await asyncio.to_thread(_expiring_account_ids, datetime.now() + ahead)
+        slots = asyncio.Semaphore(TOKEN_REFRESH_CONCURRENCY)
+
+        async def refresh(account_id: int) -> bool:
+            async with slots:
+                try:
+                    await self.refresh(account_id)
+                    return True
+                except Exception:
+                    logger.exception("Token refresh failed for account %s", account_id)
+                    return False
+
+        results = await asyncio.gather(*(refresh(account_id) for account_id in account_ids))
+        return sum(results)
+
+    async def sweep(self, interval: float = TOKEN_REFRESH_INTERVAL) -> Optional[int]:
+        """Rinnovo proattivo se questo worker tiene il lease per il prossimo `interval`
+
+        Restituisce i token rinnovati, None se il giro spetta a un altro worker.
+        """
+        if not await asyncio.to_thread(claim_job, TOKEN_REFRESH_LEASE, self.worker_id, datetime.now(), interval):
+            return None
+        return await self.refresh_expiring()
+
+    async def run(self, interval: float = TOKEN_REFRESH_INTERVAL):
+        """Ciclo di rinnovo proattivo eseguito da ogni worker dell'applicazione
+
+        Il lease dura un intervallo: chi lo tiene lo rinnova al giro
+        successivo, gli altri worker lo prendono solo se è scaduto.
+        """
+        while True:
+            try:
+                await self.sweep(interval)
+            except Exception:
+                logger.exception("Token refresh tick failed")
+            await asyncio.sleep(interval)
+
+def _expiring(account: SocialAccount) -> bool:
+    return account.token_expires_at is not None and account.token_expires_at - TOKEN_REFRESH_MARGIN <= datetime.now()
+
+def _load_account(account_id: int) -> Optional[SocialAccount]:
+    session = SessionLocal()
+    try:
+        return session.get(SocialAccount, account_id)
+    finally:
+        session.close()
+
+def _store_tokens(account: SocialAccount, access_token: str, refresh_token: str, expires_at: Optional[datetime]) -> bool:
+    """Salva i nuovi token solo se nessuno li ha cambiati nel frattempo"""
+    session = SessionLocal()
+    try:
+        result = session.execute(
+            update(SocialAccount)
+            .where(SocialAccount.id == account.id)
+            .where(SocialAccount.access_token == account.access_token)
+            .values(access_token=access_token, refresh_token=refresh_token, token_expires_at=expires_at)
+        )
+        session.commit()
+        return result.rowcount == 1
+    finally:
+        session.close()
+
+def _expiring_account_ids(before: datetime):
+    session = SessionLocal()
+    try:
+        return session.scalars(
+            select(SocialAccount.id)
+            .where(SocialAccount.token_expires_at.is_not(None))
+            .where(SocialAccount.token_expires_at <= before)
+        ).all()
+    finally:
+        session.close()
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models import MediaUpload, SocialAccount
+from services.media_prep import MediaSource
+from services.retry import is_retryable
+
+# Dimensione dei blocchi inviati alle piattaforme che la lasciano scegliere al client
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+# Margine prima della scadenza oltre il quale un media caricato non viene più riusato
+UPLOAD_EXPIRY_MARGIN = timedelta(seconds=int(os.getenv("UPLOAD_EXPIRY_MARGIN_SECONDS", "600")))
+
+logger = logging.getLogger(__name__)
+
+class ChunkedUploader:
+    """Caricamento a blocchi, ripristinabile, dei media verso le piattaforme
+
+    Il media viene letto dallo store un blocco alla volta (mai interamente in
+    memoria) e ogni blocco è una chiamata separata attraverso il
+    PlatformManager, con il proprio timeout e la propria gestione del token.
+    Dopo ogni blocco confermato la sessione della piattaforma e i byte
+    confermati vengono salvati in media_uploads: un caricamento interrotto
+    riparte dall'ultimo blocco confermato invece che da zero, anche dopo un
+    riavvio. Se la piattaforma rifiuta la sessione (errore 4xx) il
+    caricamento successivo ne apre una nuova.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._running: Dict[Tuple[int, str], asyncio.Task] = {}
+
+    async def upload(self, account: SocialAccount, url: str) -> str:
+        """ID del media sulla piattaforma; caricamenti contemporanei dello stesso media si uniscono"""
+        key = (account.id, url)
+        task = self._running.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._upload(account, url))
+            self._running[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Tuple[int, str], task: asyncio.Task):
+        if self._running.get(key) is task:
+            del self._running[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _upload(self, account: SocialAccount, url: str) -> str:
+        integration = self.manager.integration(account.platform)
+        source = await asyncio.to_thread(MediaSource, url)
+        progress = await asyncio.to_thread(_load_upload, account.id, url)
+
+        if progress is not None and progress.status == "completed" and _reusable(progress, source.size):
+            return progress.platform_media_id
+        if progress is None or progress.status == "completed" or progress.total_bytes != source.size:
+            state = await self.manager.call(
+                account, lambda token: integration.upload_init(token, source.size, source.mime_type)
+            )
+            progress = await asyncio.to_thread(_start_upload, account.id, url, source.size, state)
+        elif progress.bytes_acknowledged:
+            logger.info("Resuming upload of %s at byte %s/%s", url, progress.bytes_acknowledged, source.size)
+
+        state = progress.upload_state
+        try:
+            while state["offset"] < source.size:
+                start, end = integration.upload_range(state, source.size)
+                data = await asyncio.to_thread(source.read, start, end - start)
+                state = await self.manager.call(
+                    account, lambda token: integration.upload_append(token, state, start, data)
+                )
+                await asyncio.to_thread(_save_progress, progress.id, state)
+            media = await self.manager.call(account, lambda token: integration.upload_finalize(token, state))
+        except Exception as e:
+            if getattr(e, "status_code", None) is not None and not is_retryable(e):
+                # Sessione rifiutata o scaduta dalla piattaforma: il prossimo tentativo ricomincia
+                await asyncio.to_thread(_discard_upload, progress.id)
+            raise
+
+        expires_in = media.get("expires_in")
+        expires_at = datetime.now() + timedelta(seconds=int(expires_in)) if expires_in else None
+        await asyncio.to_thread(_complete_upload, progress.id, media["media_id"], expires_at)
+        return media["media_id"]
+
+def _reusable(progress: MediaUpload, size: int) -> bool:
+    if progress.total_bytes != size:
+        return False
+    return progress.expires_at is None or progress.expires_at - UPLOAD_EXPIRY_MARGIN > datetime.now()
+
+def _load_upload(account_id: int, url: str) -> Optional[MediaUpload]:
+    session = SessionLocal()
+    try:
+        return session.scalars(
+            select(MediaUpload).where(MediaUpload.account_id == account_id).where(MediaUpload.media_url == url)
+        ).first()
+    finally:
+        session.close()
+
+def _start_upload(account_id: int, url: str, size: int, state: Dict) -> MediaUpload:
+    """Salva una nuova sessione di caricamento, sostituendo quella precedente del media"""
+    now = datetime.now()
+    session = SessionLocal()
+    try:
+        upload = session.scalars(
+            select(MediaUpload).where(MediaUpload.account_id == account_id).where(MediaUpload.media_url == url)
+        ).first()
+        if upload is None:
+            upload = MediaUpload(account_id=account_id, media_url=url, created_at=now)
+            session.add(upload)
+        upload.total_bytes = size
+        upload.bytes_acknowledged = state["offset"]
+        upload.upload_state = state
+        upload.status = "in_progress"
+        upload.platform_media_id = None
+        upload.expires_at = None
+        upload.updated_at = now
+        try:
+            session.commit()
+        except IntegrityError:
+            # Un altro processo ha aperto la sessione nello stesso istante
+            session.rollback()
+            raise RuntimeError(f"Upload of {url} already in progress")
+        session.refresh(upload)
+        return upload
+    finally:
+        session.close()
+
+def _save_progress(upload_id: int, state: Dict):
+    session = SessionLocal()
+    try:
+        upload = session.get(MediaUpload, upload_id)
+        upload.upload_state = state
+        upload.bytes_acknowledged = state["offset"]
+        upload.updated_at = datetime.now()
+        session.commit()
+    finally:
+        session.close()
+
+def _complete_upload(upload_id: int, media_id: str, expires_at: Optional[datetime]):
+    session = SessionLocal()
+    try:
+        upload = session.get(MediaUpload, upload_id)
+        upload.status = "completed"
+        upload.platform_media_id = media_id
+        upload.expires_at = expires_at
+        upload.updated_at = datetime.now()
+        session.commit()
+    finally:
+        session.close()
+
+def _discard_upload(upload_id: int):
+    session = SessionLocal()
+    try:
+        upload = session.get(MediaUpload, upload_id)
+        if upload is not None:
+            session.delete(upload)
+            session.commit()
+    finally:
+        session.close()
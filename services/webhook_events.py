@@ -0,0 +1,202 @@
+import base64
+import hashlib
+import hmac
+import os
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Union
+from dateutil import parser as date_parser
+
+# Token scelto in fase di registrazione del webhook su Meta (hub.verify_token)
+WEBHOOK_VERIFY_TOKEN = os.getenv("WEBHOOK_VERIFY_TOKEN")
+
+# Tipo di evento -> colonna di engagements
+ENGAGEMENT_FIELDS = {"like": "likes", "comment": "comments", "share": "shares"}
+
+# Risorse della sincronizzazione che ogni piattaforma invia via webhook
+# (Instagram notifica solo i commenti, non i like)
+PUSHED_RESOURCES = {
+    "instagram": ("comments",),
+    "facebook": ("metrics", "comments"),
+    "twitter": ("metrics", "comments"),
+    "linkedin": ("metrics", "comments")
+}
+# Piattaforme con il webhook registrato: per queste il polling salta le risorse inviate
+WEBHOOK_PUSH_PLATFORMS = [p.strip() for p in os.getenv("WEBHOOK_PUSH_PLATFORMS", "").split(",") if p.strip()]
+
+def pushed_resources(platform: str) -> tuple:
+    """Risorse che arrivano via webhook e non vanno più lette in polling"""
+    return PUSHED_RESOURCES.get(platform, ()) if platform in WEBHOOK_PUSH_PLATFORMS else ()
+
+def webhook_secret(platform: str) -> Optional[str]:
+    """Segreto con cui la piattaforma firma gli eventi (di norma il client secret dell'app)"""
+    prefix = platform.upper()
+    return os.getenv(f"{prefix}_WEBHOOK_SECRET") or os.getenv(f"{prefix}_CLIENT_SECRET")
+
+def _digest(secret: str, message: bytes) -> bytes:
+    return hmac.new(secret.encode(), message, hashlib.sha256).digest()
+
+def verify_signature(platform: str, body: bytes, headers: Mapping[str, str], secret: Optional[str] = None) -> bool:
+    """Verifica la firma HMAC-SHA256 del corpo della richiesta
+
+    - Meta: X-Hub-Signature-256 = "sha256=" + hex
+    - Twitter: X-Twitter-Webhooks-Signature = "sha256=" + base64
+    - LinkedIn: X-LI-Signature = hex
+    """
+    secret = secret or webhook_secret(platform)
+    if not secret:
+        return False
+    headers = {key.lower(): value for key, value in headers.items()}
+    digest = _digest(secret, body)
+    if platform in ("instagram", "facebook"):
+        expected, received = "sha256=" + digest.hex(), headers.get("x-hub-signature-256", "")
+    elif platform == "twitter":
+        expected, received = "sha256=" + base64.b64encode(digest).decode(), headers.get("x-twitter-webhooks-signature", "")
+    elif platform == "linkedin":
+        expected, received = digest.hex(), headers.get("x-li-signature", "")
+    else:
+        return False
+    return hmac.compare_digest(expected, received)
+
+def challenge_response(
+    platform: str,
+    params: Mapping[str, str],
+    secret: Optional[str] = None,
+    verify_token: Optional[str] = None
+) -> Optional[Union[str, Dict]]:
+    """Risposta alla verifica dell'endpoint, None se la richiesta non è valida
+
+    - Meta: restituisce hub.challenge se hub.verify_token coincide
+    - Twitter (CRC): response_token = "sha256=" + base64(HMAC(crc_token))
+    - LinkedIn: challengeResponse = hex(HMAC(challengeCode))
+    """
+    secret = secret or webhook_secret(platform)
+    verify_token = verify_token or WEBHOOK_VERIFY_TOKEN
+    if platform in ("instagram", "facebook"):
+        if verify_token and params.get("hub.mode") == "subscribe" and params.get("hub.verify_token") == verify_token:
+            return params.get("hub.challenge", "")
+        return None
+    if not secret:
+        return None
+    if platform == "twitter" and params.get("crc_token"):
+        digest = _digest(secret, params["crc_token"].encode())
+        return {"response_token": "sha256=" + base64.b64encode(digest).decode()}
+    if platform == "linkedin" and params.get("challengeCode"):
+        code = params["challengeCode"]
+        return {"challengeCode": code, "challengeResponse": _digest(secret, code.encode()).hex()}
+    return None
+
+def _time(value) -> Optional[datetime]:
+    """Istante di un evento (epoch in secondi o stringa) in ora locale"""
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    parsed = date_parser.parse(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def _event(platform: str, kind: str, post_id, delta: int = 1, comment: Optional[Dict] = None) -> Dict:
+    return {"platform": platform, "kind": kind, "post_id": str(post_id), "delta": delta, "comment": comment}
+
+def delivery_id(platform: str, body: bytes) -> str:
+    """Identificativo della consegna: quando riprova l'invio la piattaforma ripete lo stesso corpo"""
+    return f"{platform}:{hashlib.sha256(body).hexdigest()}"
+
+def parse_events(platform: str, payload: Dict) -> List[Dict]:
+    """Eventi di engagement normalizzati da una notifica push della piattaforma
+
+    Ogni evento ha platform, kind (like, comment, share), post_id (ID sulla
+    piattaforma), delta e, per i commenti, comment (id, text, author,
+    created_at). Gli eventi non riconosciuti vengono ignorati.
+    """
+    parse = _PARSERS.get(platform)
+    return parse(payload) if parse else []
+
+def _instagram_events(payload: Dict) -> List[Dict]:
+    events = []
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            media_id = value.get("media", {}).get("id")
+            if change.get("field") in ("comments", "live_comments") and media_id and value.get("id"):
+                events.append(_event("instagram", "comment", media_id, comment={
+                    "id": value["id"],
+                    "text": value.get("text"),
+                    "author": value.get("from", {}).get("username"),
+                    "created_at": _time(entry.get("time"))
+                }))
+    return events
+
+def _facebook_events(payload: Dict) -> List[Dict]:
+    events = []
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            post_id = value.get("post_id")
+            if change.get("field") != "feed" or not post_id:
+                continue
+            delta = -1 if value.get("verb") == "remove" else 1
+            item = value.get("item")
+            if item == "comment" and value.get("comment_id"):
+                comment = None
+                if delta > 0:
+                    comment = {
+                        "id": value["comment_id"],
+                        "text": value.get("message"),
+                        "author": value.get("from", {}).get("name"),
+                        "created_at": _time(value.get("created_time"))
+                    }
+                events.append(_event("facebook", "comment", post_id, delta, comment))
+            elif item in ("reaction", "like"):
+                events.append(_event("facebook", "like", post_id, delta))
+            elif item == "share":
+                events.append(_event("facebook", "share", post_id, delta))
+    return events
+
+def _twitter_events(payload: Dict) -> List[Dict]:
+    events = []
+    for tweet in payload.get("tweet_create_events", []):
+        if tweet.get("in_reply_to_status_id_str"):
+            events.append(_event("twitter", "comment", tweet["in_reply_to_status_id_str"], comment={
+                "id": tweet.get("id_str"),
+                "text": tweet.get("text"),
+                "author": tweet.get("user", {}).get("screen_name"),
+                "created_at": _time(tweet.get("created_at"))
+            }))
+        shared = tweet.get("retweeted_status", {}).get("id_str") or tweet.get("quoted_status_id_str")
+        if shared:
+            events.append(_event("twitter", "share", shared))
+    for favorite in payload.get("favorite_events", []):
+        liked = favorite.get("favorited_status", {}).get("id_str")
+        if liked:
+            events.append(_event("twitter", "like", liked))
+    return events
+
+def _linkedin_events(payload: Dict) -> List[Dict]:
+    events = []
+    for notification in payload.get("notifications", []):
+        post_id = notification.get("sourcePost")
+        action = notification.get("action")
+        if not post_id:
+            continue
+        if action == "COMMENT":
+            events.append(_event("linkedin", "comment", post_id, comment={
+                "id": notification.get("commentEntity") or notification.get("notificationId"),
+                "text": notification.get("commentText"),
+                "author": notification.get("actor"),
+                "created_at": _time(notification["lastModifiedAt"] / 1000) if notification.get("lastModifiedAt") else None
+            }))
+        elif action in ("LIKE", "REACTION"):
+            events.append(_event("linkedin", "like", post_id))
+        elif action in ("SHARE", "RESHARE"):
+            events.append(_event("linkedin", "share", post_id))
+    return events
+
+_PARSERS = {
+    "instagram": _instagram_events,
+    "facebook": _facebook_events,
+    "twitter": _twitter_events,
+    "linkedin": _linkedin_events
+}
+SUPPORTED_WEBHOOK_PLATFORMS = tuple(_PARSERS)
@@ -0,0 +1,339 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from database import SessionLocal
+from models import (Engagement, Notification, PostComment, ScheduledPost, SocialAccount, UserPreferences,
+                    WebhookDeadLetter, WebhookDelivery)
+from services.rollup import record_engagement
+from services.webhook_events import ENGAGEMENT_FIELDS
+
+# Eventi per scrittura, frequenza di scrittura e tetto del buffer oltre il
+# quale chi riceve gli eventi attende la scrittura (contropressione)
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_FLUSH_INTERVAL_SECONDS", "2"))
+WEBHOOK_BUFFER_MAX = int(os.getenv("WEBHOOK_BUFFER_MAX", "20000"))
+# Scritture fallite dopo le quali una consegna viene isolata ed eventualmente scartata
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+# Per quanto tempo si ricordano le consegne già scritte (deduplica dei reinvii)
+WEBHOOK_DELIVERY_RETENTION = timedelta(hours=int(os.getenv("WEBHOOK_DELIVERY_RETENTION_HOURS", "24")))
+
+EVENT_LABELS = {"comment": "💬 commenti", "like": "❤️ like", "share": "🔁 condivisioni"}
+
+logger = logging.getLogger(__name__)
+
+class WebhookBuffer:
+    """Buffer in memoria degli eventi push, scritti a blocchi
+
+    L'endpoint aggiunge gli eventi e risponde subito; un blocco viene
+    scritto quando raggiunge `batch_size` eventi o ogni `flush_interval`
+    secondi. Gli eventi di uno stesso post vengono sommati prima della
+    scrittura, così un post virale produce un UPDATE per blocco invece di
+    uno per like, e le notifiche vengono raggruppate per utente.
+
+    Una consegna ripetuta dalla piattaforma (stesso `delivery_id`) viene
+    scartata, sia se è ancora nel buffer sia se è già stata scritta. Le
+    consegne che falliscono `max_attempts` scritture vengono scritte da
+    sole, e se falliscono ancora finiscono in webhook_dead_letters.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        flush_interval: float = WEBHOOK_FLUSH_INTERVAL,
+        max_events: int = WEBHOOK_BUFFER_MAX,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.max_attempts = max_attempts
+        self._events: List[Dict] = []
+        self._deliveries: Set[str] = set()
+        self._flushes: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    async def add(self, events: List[Dict], delivery_id: Optional[str] = None) -> bool:
+        """Aggiunge gli eventi di una consegna; False se la consegna è già nel buffer
+
+        Oltre `max_events` eventi in attesa il chiamante attende la scrittura
+        (contropressione). Un errore di scrittura non viene propagato: gli
+        eventi sono nel buffer e verranno riscritti.
+        """
+        if delivery_id is not None:
+            if delivery_id in self._deliveries:
+                return False
+            if events:
+                self._deliveries.add(delivery_id)
+            for event in events:
+                event["delivery_id"] = delivery_id
+        self._events.extend(events)
+        if len(self._events) >= self.max_events:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Webhook flush failed")
+        elif len(self._events) >= self.batch_size:
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flush_done)
+        return True
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Webhook flush failed", exc_info=task.exception())
+
+    async def flush(self) -> int:
+        """Scrive gli eventi in attesa; se la scrittura fallisce restano nel buffer"""
+        events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            written = await asyncio.to_thread(write_events, events)
+        except Exception as e:
+            # Transazione annullata: gli eventi verranno riscritti al prossimo giro.
+            # Una cancellazione non li rimette in coda perché il thread completa comunque la scrittura.
+            for event in events:
+                event["attempts"] = event.get("attempts", 0) + 1
+            self._events[:0] = [event for event in events if event["attempts"] < self.max_attempts]
+            exhausted = [event for event in events if event["attempts"] >= self.max_attempts]
+            if exhausted:
+                await self._isolate(exhausted, e)
+            raise
+        self._forget(events)
+        logger.debug("Webhook flush: %s", written)
+        return len(events)
+
+    async def _isolate(self, events: List[Dict], error: Exception):
+        """Scrive una consegna alla volta gli eventi che continuano a fallire
+
+        Le consegne che falliscono anche da sole vengono spostate in
+        webhook_dead_letters; se neanche quella scrittura riesce (database
+        non raggiungibile) restano nel buffer.
+        """
+        deliveries: Dict[object, List[Dict]] = defaultdict(list)
+        for event in events:
+            deliveries[event.get("delivery_id") or id(event)].append(event)
+        for delivery in deliveries.values():
+            try:
+                await asyncio.to_thread(write_events, delivery)
+            except Exception as e:
+                try:
+                    await asyncio.to_thread(dead_letter_events, delivery, e)
+                    logger.error("Webhook delivery dead-lettered after %d attempts: %s", delivery[0]["attempts"], e)
+                except Exception:
+                    self._events.extend(delivery)
+                    continue
+            self._forget(delivery)
+
+    def _forget(self, events: List[Dict]):
+        for event in events:
+            self._deliveries.discard(event.get("delivery_id"))
+
+    async def run(self):
+        """Scrittura periodica eseguita da ogni worker dell'applicazione"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Webhook flush failed")
+
+# Le scritture dei blocchi non si sovrappongono (deduplica dei commenti)
+_write_lock = threading.Lock()
+
+def write_events(events: List[Dict]) -> Dict[str, int]:
+    """Applica un blocco di eventi in un'unica transazione
+
+    Gli eventi dei post sconosciuti (non pubblicati o non sincronizzati)
+    vengono scartati; un commento già presente (consegna ripetuta) non viene
+    contato due volte.
+    """
+    now = datetime.now()
+    with _write_lock:
+        session = SessionLocal()
+        try:
+            received = len(events)
+            events = _new_deliveries(session, events, now)
+            posts = _known_posts(session, {(event["platform"], event["post_id"]) for event in events})
+            comments = _new_comments(session, posts, events)
+            unknown = 0
+
+            totals: Dict[int, Dict[str, int]] = defaultdict(lambda: {"likes": 0, "comments": 0, "shares": 0})
+            for event in events:
+                post = posts.get((event["platform"], event["post_id"]))
+                if post is None:
+                    unknown += 1
+                    continue
+                if event["kind"] == "comment" and event["comment"] is not None:
+                    continue
+                totals[post[0]][ENGAGEMENT_FIELDS[event["kind"]]] += event["delta"]
+            for post_id, _ in comments:
+                totals[post_id]["comments"] += 1
+
+            applied = _apply_totals(session, totals, now)
+            accounts = {post_id: account_id for post_id, _, account_id in posts.values()}
+            record_engagement(session, [(accounts[post_id], now, values) for post_id, values in applied.items()], now)
+            session.add_all(
+                PostComment(post_id=post_id, platform_comment_id=comment["id"], author=comment.get("author"),
+                            text=comment.get("text"), created_at=comment.get("created_at"))
+                for post_id, comment in comments
+            )
+            notified = _notify(session, posts, events, comments, now)
+            session.commit()
+        finally:
+            session.close()
+    return {"events": len(events), "posts": len(totals), "comments": len(comments),
+            "notifications": notified, "unknown": unknown, "duplicates": received - len(events)}
+
+def dead_letter_events(events: List[Dict], error: Exception):
+    """Salva in webhook_dead_letters gli eventi di una consegna che non si riesce a scrivere"""
+    session = SessionLocal()
+    try:
+        session.add(WebhookDeadLetter(
+            platform=events[0].get("platform"),
+            delivery_id=events[0].get("delivery_id"),
+            events=json.loads(json.dumps(events, default=str)),
+            attempts=max(event.get("attempts", 0) for event in events),
+            error=(str(error) or type(error).__name__)[:1000],
+            failed_at=datetime.now()
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+def _new_deliveries(session, events: List[Dict], now: datetime) -> List[Dict]:
+    """Scarta gli eventi delle consegne già scritte e registra le nuove
+
+    Il registro è nella stessa transazione degli eventi: due worker che
+    scrivono la stessa consegna si fermano sul vincolo di unicità.
+    """
+    delivery_ids = {event["delivery_id"] for event in events if event.get("delivery_id")}
+    if not delivery_ids:
+        return events
+    seen = set(session.scalars(
+        select(WebhookDelivery.delivery_id).where(WebhookDelivery.delivery_id.in_(delivery_ids))
+    ).all())
+    if delivery_ids - seen:
+        session.execute(insert(WebhookDelivery), [
+            {"delivery_id": delivery_id, "received_at": now} for delivery_id in delivery_ids - seen
+        ])
+    session.execute(delete(WebhookDelivery).where(WebhookDelivery.received_at < now - WEBHOOK_DELIVERY_RETENTION))
+    return [event for event in events if event.get("delivery_id") not in seen]
+
+def _known_posts(session, keys: Set[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[int, int, int]]:
+    """(piattaforma, ID sul social) -> (id del post, utente proprietario, account)"""
+    if not keys:
+        return {}
+    rows = session.execute(
+        select(SocialAccount.platform, ScheduledPost.platform_post_id, ScheduledPost.id, SocialAccount.user_id,
+               SocialAccount.id)
+        .join(SocialAccount, ScheduledPost.account_id == SocialAccount.id)
+        .where(ScheduledPost.platform_post_id.in_({post_id for _, post_id in keys}))
+    ).all()
+    return {
+        (platform, platform_post_id): (post_id, user_id, account_id)
+        for platform, platform_post_id, post_id, user_id, account_id in rows
+    }
+
+def _new_comments(session, posts, events: List[Dict]) -> List[Tuple[int, Dict]]:
+    """Commenti non ancora salvati (una consegna ripetuta non li duplica)"""
+    candidates = []
+    for event in events:
+        post = posts.get((event["platform"], event["post_id"]))
+        if event["kind"] == "comment" and event["comment"] is not None and post is not None:
+            candidates.append((post[0], event["comment"]))
+    if not candidates:
+        return []
+    seen = set(session.execute(
+        select(PostComment.post_id, PostComment.platform_comment_id)
+        .where(PostComment.post_id.in_({post_id for post_id, _ in candidates}))
+    ).all())
+    comments = []
+    for post_id, comment in candidates:
+        if (post_id, comment["id"]) not in seen:
+            seen.add((post_id, comment["id"]))
+            comments.append((post_id, comment))
+    return comments
+
+def _apply_totals(session, totals: Dict[int, Dict[str, int]], now: datetime) -> Dict[int, Dict[str, int]]:
+    """Un UPDATE (executemany) per i post con engagement e un INSERT per gli altri
+
+    Restituisce gli incrementi applicati a ogni post.
+    """
+    totals = {post_id: values for post_id, values in totals.items() if any(values.values())}
+    if not totals:
+        return {}
+    existing = set(session.scalars(select(Engagement.post_id).where(Engagement.post_id.in_(list(totals)))).all())
+    updates = [
+        {"target": post_id, "d_likes": values["likes"], "d_comments": values["comments"], "d_shares": values["shares"], "now": now}
+        for post_id, values in totals.items() if post_id in existing
+    ]
+    if updates:
+        session.connection().execute(
+            update(Engagement.__table__)
+            .where(Engagement.__table__.c.post_id == bindparam("target"))
+            .values(
+                likes=func.coalesce(Engagement.__table__.c.likes, 0) + bindparam("d_likes"),
+                comments=func.coalesce(Engagement.__table__.c.comments, 0) + bindparam("d_comments"),
+                shares=func.coalesce(Engagement.__table__.c.shares, 0) + bindparam("d_shares"),
+                last_updated=bindparam("now")
+            ),
+            updates
+        )
+    inserts = [
+        {"post_id": post_id, "likes": max(values["likes"], 0), "comments": max(values["comments"], 0),
+         "shares": max(values["shares"], 0), "last_updated": now}
+        for post_id, values in totals.items() if post_id not in existing
+    ]
+    if inserts:
+        session.execute(insert(Engagement), inserts)
+    applied = {post_id: values for post_id, values in totals.items() if post_id in existing}
+    applied.update({row["post_id"]: {field: row[field] for field in ("likes", "comments", "shares")} for row in inserts})
+    return applied
+
+def _notify(session, posts, events: List[Dict], comments: List[Tuple[int, Dict]], now: datetime) -> int:
+    """Una notifica per utente e blocco, con il riepilogo degli eventi nuovi"""
+    counts: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for event in events:
+        post = posts.get((event["platform"], event["post_id"]))
+        if post is not None and post[1] is not None and event["delta"] > 0 and event["kind"] != "comment":
+            counts[post[1]][event["kind"]] += event["delta"]
+    owners = {post_id: user_id for post_id, user_id, _ in posts.values()}
+    for post_id, _ in comments:
+        if owners.get(post_id) is not None:
+            counts[owners[post_id]]["comment"] += 1
+    if not counts:
+        return 0
+
+    muted = set(session.scalars(
+        select(UserPreferences.user_id)
+        .where(UserPreferences.user_id.in_(list(counts)))
+        .where(UserPreferences.engagement_alerts.is_(False))
+    ).all())
+    rows = [
+        {
+            "user_id": user_id,
+            "message": "Nuova attività sui tuoi post: " + ", ".join(
+                f"{count} {EVENT_LABELS[kind]}" for kind, count in kinds.items()
+            ),
+            "notification_type": "engagement",
+            "read": False,
+            "timestamp": now
+        }
+        for user_id, kinds in counts.items() if user_id not in muted
+    ]
+    if rows:
+        session.execute(insert(Notification), rows)
+    return len(rows)
+
+# Buffer condiviso dal processo
+webhook_buffer = WebhookBuffer()
@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import create_engine
+import database
+
+PLATFORMS = ("twitter", "instagram", "facebook", "linkedin")
+
+@pytest.fixture
+def db(tmp_path):
+    """SessionLocal su un database SQLite vuoto con un account per piattaforma (id 1-4)"""
+    import models
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+    session = database.SessionLocal()
+    session.add_all(
+        models.SocialAccount(id=account_id, platform=platform, access_token="token")
+        for account_id, platform in enumerate(PLATFORMS, 1)
+    )
+    session.commit()
+    session.close()
+    yield database.SessionLocal
+    database.SessionLocal.configure(bind=database.engine)
+    engine.dispose()
@@ -0,0 +1,65 @@
+import asyncio
+from services.cache import AsyncTTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_concurrent_requests_share_one_call():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"reach": len(calls)}
+
+    async def scenario():
+        cache = AsyncTTLCache(ttl=60)
+        results = await asyncio.gather(*(cache.get(1, loader) for _ in range(20)))
+        return results + [await cache.get(1, loader)]
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result == {"reach": 1} for result in results)
+
+def test_stale_value_is_served_while_refreshing():
+    clock = FakeClock()
+    values = iter([1, 2])
+
+    async def loader():
+        await asyncio.sleep(0)
+        return next(values)
+
+    async def scenario():
+        cache = AsyncTTLCache(ttl=60, stale_ttl=600, clock=clock)
+        first = await cache.get("k", loader)
+        clock.now = 120
+        stale = await cache.get("k", loader)
+        await asyncio.sleep(0.01)
+        refreshed = await cache.get("k", loader)
+        return first, stale, refreshed
+
+    assert asyncio.run(scenario()) == (1, 1, 2)
+
+def test_errors_are_not_cached():
+    attempts = []
+
+    async def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("upstream down")
+        return "ok"
+
+    async def scenario():
+        cache = AsyncTTLCache(ttl=60)
+        try:
+            await cache.get("k", loader)
+        except ConnectionError:
+            pass
+        return await cache.get("k", loader)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,50 @@
+import io
+from datetime import datetime
+from services.calendar_import import import_calendar, iter_csv_rows, iter_ndjson_rows
+from services.dispatch_queue import DispatchQueue
+from services.scheduler import ContentScheduler
+
+def _validate(data):
+    if not data.get("content"):
+        raise ValueError("content: campo obbligatorio")
+    return {
+        "account_id": int(data["account_id"]),
+        "content": data["content"],
+        "media_urls": data.get("media_urls") or [],
+        "scheduled_time": datetime.fromisoformat(data["scheduled_time"])
+    }
+
+def test_csv_and_ndjson_rows_are_parsed_with_their_line_numbers():
+    csv_file = io.BytesIO(
+        "﻿account_id,content,scheduled_time,media_urls\n"
+        "1,ciao,2025-07-01T12:00:00,https://a.example/1.jpg | https://a.example/2.jpg\n"
+        "2,,2025-07-01T13:00:00,\n".encode("utf-8")
+    )
+    rows = list(iter_csv_rows(csv_file))
+    assert [(number, error) for number, _, error in rows] == [(2, None), (3, None)]
+    assert rows[0][1]["media_urls"] == ["https://a.example/1.jpg", "https://a.example/2.jpg"]
+    assert rows[1][1] == {"account_id": "2", "content": None, "scheduled_time": "2025-07-01T13:00:00", "media_urls": None}
+    assert not csv_file.closed
+
+    ndjson_file = io.BytesIO(b'{"account_id": 1, "content": "a"}\n\nnot json\n[1, 2]\n')
+    rows = list(iter_ndjson_rows(ndjson_file))
+    assert [(number, data) for number, data, _ in rows] == [(1, {"account_id": 1, "content": "a"}), (3, None), (4, None)]
+    assert rows[1][2].startswith("JSON non valido") and rows[2][2] is not None
+
+def test_valid_rows_are_committed_in_batches_and_errors_reported_per_row(db):
+    lines = [
+        '{"account_id": 1, "content": "a", "scheduled_time": "2025-07-01T12:00:00"}',
+        '{"account_id": 2, "content": "", "scheduled_time": "2025-07-01T12:00:00"}',
+        '{"account_id": 2, "content": "b", "scheduled_time": "2025-07-01T12:05:00"}',
+        '{"account_id": 99, "content": "c", "scheduled_time": "2025-07-01T12:10:00"}',
+        '{"account_id": 3, "content": "d", "scheduled_time": "2025-07-01T12:15:00"}',
+    ]
+    rows = iter_ndjson_rows(io.BytesIO("\n".join(lines).encode()))
+    scheduler = ContentScheduler("worker-a", queue=DispatchQueue())
+    events = list(import_calendar(rows, _validate, scheduler, batch_size=2))
+
+    assert events[0] == {"row": 2, "error": "content: campo obbligatorio"}
+    assert {key: events[1][key] for key in ("rows", "committed")} == {"rows": [1, 3], "committed": 2}
+    assert events[2] == {"row": 4, "error": "Account not found: 99"}
+    assert {key: events[3][key] for key in ("rows", "committed")} == {"rows": [5, 5], "committed": 1}
+    assert events[-1] == {"summary": {"rows": 5, "imported": 3, "failed": 2}}
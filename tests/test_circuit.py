@@ -0,0 +1,68 @@
+import asyncio
+from services.circuit import CLOSED, HALF_OPEN, OPEN, Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_circuit_opens_fails_fast_and_recovers_through_a_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker("twitter", failure_threshold=3, reset_seconds=30, clock=clock)
+
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record(False)
+    assert breaker.state == OPEN
+
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("open circuit must fail fast")
+
+    clock.now = 31
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("only one probe at a time")
+
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+def test_failed_probe_reopens_the_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker("instagram", failure_threshold=1, reset_seconds=10, clock=clock)
+    breaker.before_call()
+    breaker.record(False)
+
+    clock.now = 11
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == OPEN and breaker.opened_at == 11
+
+def test_bulkhead_rejects_calls_beyond_its_pool():
+    bulkhead = Bulkhead("linkedin", limit=2, max_wait=0.05)
+    outcomes = []
+
+    async def call():
+        try:
+            async with bulkhead:
+                await asyncio.sleep(0.2)
+            outcomes.append("ok")
+        except BulkheadFullError:
+            outcomes.append("rejected")
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(4)))
+
+    asyncio.run(scenario())
+    assert sorted(outcomes) == ["ok", "ok", "rejected", "rejected"]
+    assert bulkhead.in_flight == 0
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from services.dispatch_queue import DispatchQueue
+
+def test_pop_due_returns_posts_in_time_order():
+    queue = DispatchQueue()
+    now = datetime(2025, 7, 1, 12, 0)
+    queue.push(now + timedelta(minutes=5), 3)
+    queue.push(now - timedelta(minutes=1), 2)
+    queue.push(now - timedelta(minutes=10), 1)
+
+    assert queue.pop_due(now) == [1, 2]
+    assert len(queue) == 1
+    assert queue.peek_time() == now + timedelta(minutes=5)
+
+def test_rebuild_replaces_queue_and_drops_duplicates():
+    queue = DispatchQueue()
+    now = datetime(2025, 7, 1, 12, 0)
+    queue.push(now, 99)
+    queue.rebuild([(now, 1), (now, 1), (now - timedelta(seconds=1), 2)])
+
+    assert queue.pop_due(now) == [2, 1]
+    assert queue.peek_time() is None
+
+def test_extend_moves_loaded_window_forward():
+    queue = DispatchQueue()
+    now = datetime(2025, 7, 1, 12, 0)
+    wakeups = []
+    queue.add_listener(lambda: wakeups.append(True))
+
+    assert not queue.covers(now)
+    queue.rebuild([(now, 1)], loaded_until=now + timedelta(minutes=10))
+    queue.extend([(now + timedelta(minutes=15), 2)], loaded_until=now + timedelta(minutes=20))
+
+    assert queue.covers(now + timedelta(minutes=20))
+    assert not queue.covers(now + timedelta(minutes=21))
+    assert queue.pop_due(now + timedelta(minutes=15)) == [1, 2]
+    assert len(wakeups) == 2
@@ -0,0 +1,51 @@
+import asyncio
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from services.dispatcher import PublishDispatcher
+from services.metrics import LagStats
+
+class SlowPlatforms:
+    """Manager finto: ogni piattaforma ha la sua latenza e si contano le chiamate in corso"""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.platforms = {}
+        self.running = Counter()
+        self.peak = Counter()
+        self.finished = []
+
+    async def post_content(self, account_id, content, media_urls=None, idempotency_key=None):
+        platform = self.platforms[account_id]
+        self.running[platform] += 1
+        self.peak[platform] = max(self.peak[platform], self.running[platform])
+        try:
+            await asyncio.sleep(self.latencies[platform])
+        finally:
+            self.running[platform] -= 1
+        self.finished.append(platform)
+        return {"status": "success"}
+
+def test_each_platform_is_capped_and_a_slow_one_does_not_hold_back_the_others():
+    manager = SlowPlatforms({"twitter": 0.01, "instagram": 0.5})
+
+    async def publish():
+        dispatcher = PublishDispatcher(
+            manager=manager, workers=4, platform_limits={"twitter": 3, "instagram": 1}, metrics=LagStats()
+        )
+        await dispatcher.start()
+        futures = []
+        for post_id in range(12):
+            platform = "instagram" if post_id < 2 else "twitter"
+            manager.platforms[post_id] = platform
+            post = SimpleNamespace(id=post_id, account_id=post_id, content="", media_urls=[], scheduled_time=datetime.now())
+            futures.append(await dispatcher.submit(post, platform))
+        await asyncio.gather(*futures)
+        await dispatcher.stop()
+
+    asyncio.run(publish())
+
+    assert manager.peak == {"twitter": 3, "instagram": 1}
+    # I post twitter, accodati dopo quelli instagram, finiscono prima del secondo instagram
+    assert manager.finished[-1] == "instagram"
+    assert manager.finished.index("instagram") >= 10
@@ -0,0 +1,36 @@
+import asyncio
+import httpx
+from services.http import HttpTransport
+
+def test_clients_are_shared_per_host():
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"ok": True})
+
+    transport = HttpTransport(transport=httpx.MockTransport(handler))
+
+    async def calls():
+        first = transport.client("https://api.twitter.com/2/tweets")
+        second = transport.client("https://api.twitter.com/2/users/me")
+        other = transport.client("https://graph.facebook.com/v19.0/me/feed")
+        response = await first.get("https://api.twitter.com/2/users/me")
+        await transport.aclose()
+        return first, second, other, response
+
+    first, second, other, response = asyncio.run(calls())
+
+    assert first is second
+    assert first is not other
+    assert first.is_closed and other.is_closed
+    assert response.json() == {"ok": True}
+    assert seen == ["https://api.twitter.com/2/users/me"]
+
+def test_each_event_loop_gets_its_own_clients():
+    transport = HttpTransport(transport=httpx.MockTransport(lambda request: httpx.Response(204)))
+
+    async def client():
+        return transport.client("https://api.linkedin.com")
+
+    assert asyncio.run(client()) is not asyncio.run(client())
@@ -0,0 +1,114 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from services import media_prep, registry
+from services.dispatcher import PublishDispatcher
+from services.media_prep import MediaPreparer, MediaSource
+
+class CountingPreparer(MediaPreparer):
+    def __init__(self, output_dir):
+        super().__init__(output_dir=output_dir)
+        self.calls = []
+
+    def prepare_media(self, url, variant):
+        self.calls.append((url, variant))
+        return super().prepare_media(url, variant)
+
+def test_media_is_prepared_once_per_variant(tmp_path):
+    image = tmp_path / "promo.jpg"
+    image.write_bytes(b"\xff\xd8\xff" + b"0" * 1024)
+    preparer = CountingPreparer(str(tmp_path / "prepared"))
+
+    async def fan_out():
+        platforms = ["twitter", "facebook", "linkedin", "instagram"] * 5
+        return await asyncio.gather(*(preparer.prepare([str(image)], platform) for platform in platforms))
+
+    results = asyncio.run(fan_out())
+
+    assert sorted(preparer.calls) == [(str(image), "instagram"), (str(image), "web")]
+    assert len({paths[0] for paths in results}) == 2
+    assert all(os.path.exists(paths[0]) for paths in results)
+
+def test_failed_preparation_is_not_cached(tmp_path):
+    preparer = CountingPreparer(str(tmp_path / "prepared"))
+    missing = str(tmp_path / "missing.jpg")
+
+    for _ in range(2):
+        try:
+            asyncio.run(preparer.prepare([missing], "twitter"))
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("expected FileNotFoundError")
+    assert len(preparer.calls) == 2
+
+def test_video_is_streamed_and_read_by_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_prep, "MEDIA_STREAM_CHUNK_SIZE", 1000)
+    video = tmp_path / "clip.mp4"
+    payload = bytes(range(256)) * 40
+    video.write_bytes(payload)
+    preparer = MediaPreparer(str(tmp_path / "prepared"))
+
+    path = preparer.prepare_media(str(video), "web")
+    source = MediaSource(path)
+
+    assert source.size == len(payload) and source.mime_type == "video/mp4"
+    assert source.read(4000, 1000) == payload[4000:5000]
+    assert source.read(len(payload) - 10, 1000) == payload[-10:]
+
+    monkeypatch.setattr(registry.WEB_MEDIA, "max_video_bytes", 5000)
+    try:
+        preparer.prepare_media(str(video), "web")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+    assert os.listdir(tmp_path / "prepared") == [os.path.basename(path)]
+
+def test_prepared_media_is_readable_with_default_relative_dirs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(media_prep.MEDIA_UPLOAD_DIR)
+    payload = b"\x00\x00\x00\x18ftypmp42" + b"1" * 2048
+    with open(os.path.join(media_prep.MEDIA_UPLOAD_DIR, "clip.mp4"), "wb") as video:
+        video.write(payload)
+    preparer = MediaPreparer()
+    assert not os.path.isabs(preparer.output_dir)
+
+    path = asyncio.run(preparer.prepare(["clip.mp4"], "twitter"))[0]
+    source = MediaSource(path)
+
+    assert os.path.isabs(path) and path.startswith(str(tmp_path / media_prep.MEDIA_PREPARED_DIR))
+    assert source.size == len(payload)
+    assert source.read(0, 12) == payload[:12]
+
+class _VideoUploads:
+    def uploads_media(self, url):
+        return url.endswith(".mp4")
+
+class _Manager:
+    def __init__(self):
+        self.published = []
+
+    def integration(self, platform):
+        return _VideoUploads()
+
+    async def post_content(self, account_id, content, media_urls, idempotency_key=None):
+        self.published.append(media_urls)
+        return {"id": "1"}
+
+def test_only_uploaded_media_is_published_as_local_path(tmp_path):
+    image, video = tmp_path / "promo.jpg", tmp_path / "clip.mp4"
+    image.write_bytes(b"\xff\xd8\xff" + b"0" * 1024)
+    video.write_bytes(b"\x00\x00\x00\x18ftypmp42" + b"1" * 2048)
+    post = SimpleNamespace(account_id=1, content="Hi", media_urls=[str(image), str(video)])
+
+    async def publish(public_url):
+        manager = _Manager()
+        preparer = MediaPreparer(str(tmp_path / "prepared"), public_url=public_url)
+        await PublishDispatcher(manager=manager, preparer=preparer)._publish(post, "facebook")
+        return manager.published[0]
+
+    exposed = asyncio.run(publish("https://cdn.example.com/prepared/"))
+    assert exposed[0].startswith("https://cdn.example.com/prepared/") and exposed[0].endswith("_web.jpg")
+    assert os.path.isabs(exposed[1]) and os.path.exists(exposed[1])
+    assert asyncio.run(publish(""))[0] == str(image)
@@ -0,0 +1,42 @@
+import asyncio
+import httpx
+from services.mock_platforms import MockPlatform, create_app
+from services.ratelimit import parse_rate_limit_headers
+from services.simulation import LatencyModel
+
+def _call(app, *requests):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://mock") as client:
+            return [await client.request(method, path, **kwargs) for method, path, kwargs in requests]
+
+    return asyncio.run(send())
+
+def test_idempotency_key_replays_created_post():
+    app = create_app({"twitter": MockPlatform("twitter", LatencyModel(median=0))})
+    headers = {"Authorization": "Bearer token", "Idempotency-Key": "post-1"}
+    first, retry, other = _call(
+        app,
+        ("POST", "/twitter/2/tweets", {"headers": headers, "json": {"text": "ciao"}}),
+        ("POST", "/twitter/2/tweets", {"headers": headers, "json": {"text": "ciao"}}),
+        ("POST", "/twitter/2/tweets", {"headers": {"Authorization": "Bearer token"}, "json": {"text": "ciao"}})
+    )
+
+    assert first.json() == retry.json()
+    assert other.json()["data"]["id"] != first.json()["data"]["id"]
+    assert app.state.platforms["twitter"].stats["replayed"] == 1
+
+def test_rate_limit_headers_match_platform_format():
+    now = 1_700_000_000.0
+    app = create_app({
+        "twitter": MockPlatform("twitter", LatencyModel(median=0), rate_limit=2, rate_window=900, clock=lambda: now),
+        "facebook": MockPlatform("facebook", LatencyModel(median=0), rate_limit=2, rate_window=900, clock=lambda: now)
+    })
+    auth = {"headers": {"Authorization": "Bearer token"}}
+    responses = _call(app, *[("GET", "/twitter/2/users/me", auth)] * 3, *[("GET", "/facebook/v19.0/me/insights", auth)] * 3)
+
+    assert [response.status_code for response in responses] == [200, 200, 429, 200, 200, 429]
+    twitter = parse_rate_limit_headers(responses[1].headers, now=now)
+    assert twitter["remaining"] == 0 and twitter["reset"] == 900
+    facebook = parse_rate_limit_headers(responses[5].headers, now=now)
+    assert facebook["usage"] == 100 and facebook["retry_after"] == 15 * 60
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from services import mock_platforms
+from services.http import transport
+from services.integrations import twitter
+from services import registry
+from services.platforms import PlatformManager, get_platform_manager, published_post_id
+from services.registry import PlatformRegistry
+from services.simulation import LatencyModel
+
+@pytest.fixture
+def mock_server(db, monkeypatch):
+    app = mock_platforms.create_app({
+        name: mock_platforms.MockPlatform(name, LatencyModel(median=0)) for name in mock_platforms.PLATFORMS
+    })
+    for name, value in mock_platforms.integration_env("http://mock").items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(transport, "transport", httpx.ASGITransport(app=app))
+    return app
+
+def test_integrations_are_created_on_first_use_and_shared(monkeypatch):
+    monkeypatch.setattr(registry, "entry_points", lambda group: [])
+    manager = PlatformManager(registry=PlatformRegistry(enabled=["twitter", "linkedin"]))
+    assert manager._instances == {}
+
+    twitter = manager.integration("twitter")
+    assert manager.integration("twitter") is twitter
+    assert list(manager._instances) == ["twitter"]
+    with pytest.raises(ValueError, match="not enabled"):
+        manager.integration("instagram")
+    with pytest.raises(ValueError, match="Unsupported"):
+        manager.integration("tiktok")
+    assert get_platform_manager() is get_platform_manager()
+
+def test_reads_have_their_own_bulkhead():
+    manager = PlatformManager()
+
+    async def fill_publish_slots():
+        publish = manager.bulkhead("twitter")
+        for _ in range(publish.limit):
+            await publish.__aenter__()
+        async with manager.bulkhead("twitter", "read") as read:
+            return read.in_flight, publish.in_flight
+
+    assert asyncio.run(fill_publish_slots()) == (1, 16)
+    assert manager.bulkhead("twitter", "read").limit == 4
+
+def test_retry_returns_the_post_created_by_an_ambiguous_attempt(mock_server):
+    started = datetime.now() - timedelta(seconds=1)
+
+    async def publish():
+        manager = PlatformManager()
+        first = await manager.post_content(1, "Nuovo articolo sul blog")
+        retry = await manager.post_content(1, "Nuovo articolo sul blog", published_since=started)
+        other = await manager.post_content(1, "Un altro post", published_since=started)
+        await transport.aclose()
+        return first, retry, other
+
+    first, retry, other = asyncio.run(publish())
+
+    assert published_post_id(retry) == published_post_id(first) and retry["recovered"]
+    assert published_post_id(other) != published_post_id(first)
+    assert mock_server.state.platforms["twitter"].stats["created"] == 2
+
+def test_batch_insights_are_bounded_and_report_partial_failures(db):
+    manager = PlatformManager()
+    running, peak = [0], [0]
+
+    async def fake_with_token(account, call, pool="publish"):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        try:
+            # Gli account con id più alto rispondono prima
+            await asyncio.sleep(0.01 * (5 - account.id))
+        finally:
+            running[0] -= 1
+        if account.platform == "facebook":
+            raise RuntimeError("insights unavailable")
+        return {"followers": account.id}
+
+    manager._with_token = fake_with_token
+
+    async def collect():
+        return [event async for event in manager.iter_insights([1, 2, 3, 4, 99, 1], concurrency=2)]
+
+    events = asyncio.run(collect())
+    assert peak[0] == 2
+    assert [event["account_id"] for event in events][0] == 99
+    by_account = {event["account_id"]: event for event in events}
+    assert sorted(by_account) == [1, 2, 3, 4, 99]
+    assert by_account[99]["error"] == "Account not found"
+    assert by_account[3] == {"account_id": 3, "platform": "facebook", "error": "insights unavailable"}
+    assert by_account[4]["insights"] == {"followers": 4}
+
+def test_twitter_user_ids_are_cached_per_token_with_a_bound(monkeypatch):
+    monkeypatch.setattr(twitter, "USER_ID_CACHE_SIZE", 2)
+    integration = twitter.TwitterIntegration()
+    calls = []
+
+    async def request(method, path, access_token, **kwargs):
+        calls.append(access_token)
+        await asyncio.sleep(0)
+        return {"data": {"id": f"user-{access_token}"}}
+
+    monkeypatch.setattr(integration, "_request", request)
+
+    async def lookups():
+        same = await asyncio.gather(*(integration._user_id("a") for _ in range(5)))
+        for token in ("b", "c", "d"):
+            await integration._user_id(token)
+        return same
+
+    assert asyncio.run(lookups()) == ["user-a"] * 5
+    assert calls == ["a", "b", "c", "d"]
+    assert len(integration._user_ids._entries) == 2
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from services.ratelimit import AIMDLimiter, RateLimitGovernor, TokenBucket, parse_rate_limit_headers
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_bucket_paces_requests_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3:] == [0.5, 1.0]
+
+    clock.now = 10
+    assert bucket.reserve() == 0.0
+
+def test_headers_of_each_platform_are_parsed():
+    twitter = parse_rate_limit_headers({"x-rate-limit-remaining": "12", "x-rate-limit-reset": "1700000600"}, now=1700000000)
+    assert twitter["remaining"] == 12 and twitter["reset"] == 600
+
+    meta = parse_rate_limit_headers({
+        "X-Business-Use-Case-Usage": json.dumps({"123": [{"call_count": 95, "total_time": 20, "estimated_time_to_regain_access": 2}]})
+    })
+    assert meta["usage"] == 95 and meta["retry_after"] == 120
+
+    assert parse_rate_limit_headers({"Retry-After": "7"})["retry_after"] == 7
+
+def test_throttling_halves_concurrency_and_success_grows_it():
+    limiter = AIMDLimiter(initial=8)
+
+    async def cycle(throttled):
+        await limiter.acquire()
+        limiter.release(throttled=throttled)
+
+    asyncio.run(cycle(True))
+    assert limiter.limit == 4
+    for _ in range(4):
+        asyncio.run(cycle(False))
+    assert 4.9 < limiter.limit < 5.1
+
+def test_cancelled_waiter_hands_its_turn_to_the_next():
+    limiter = AIMDLimiter(initial=1)
+
+    async def scenario():
+        await limiter.acquire()
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        # Il primo viene svegliato e annullato prima di poter riprendere il controllo
+        limiter.release(success=False)
+        first.cancel()
+        await asyncio.wait_for(second, timeout=1)
+        return first.cancelled(), limiter.in_flight
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+def test_429_blocks_the_account_bucket():
+    clock = FakeClock()
+    governor = RateLimitGovernor(rates={"twitter": 3600}, clock=clock)
+
+    async def call(status, headers):
+        await governor.acquire("twitter", 1)
+        governor.release("twitter", 1, SimpleNamespace(status_code=status, headers=headers))
+
+    asyncio.run(call(429, {"retry-after": "30"}))
+    assert governor.bucket("twitter", 1).reserve() >= 29
+    assert governor.bucket("twitter", 2).reserve() == 0.0
+    assert governor.limiter("twitter").limit < governor.concurrency
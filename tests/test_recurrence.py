@@ -0,0 +1,29 @@
+from datetime import datetime
+import pytest
+from services.recurrence import iter_occurrences, next_occurrence
+
+WEEKLY_MONDAY = "FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0;BYSECOND=0"
+
+def test_occurrences_are_limited_to_the_requested_window():
+    occurrences = list(iter_occurrences(
+        WEEKLY_MONDAY,
+        dtstart=datetime(2025, 1, 1),
+        start=datetime(2025, 7, 1),
+        end=datetime(2025, 7, 31)
+    ))
+
+    assert occurrences == [
+        datetime(2025, 7, 7, 9, 0),
+        datetime(2025, 7, 14, 9, 0),
+        datetime(2025, 7, 21, 9, 0),
+        datetime(2025, 7, 28, 9, 0)
+    ]
+
+def test_next_occurrence_of_exhausted_rule_is_none():
+    rule = "FREQ=DAILY;COUNT=2"
+    assert next_occurrence(rule, datetime(2025, 1, 1), datetime(2025, 1, 1)) == datetime(2025, 1, 2)
+    assert next_occurrence(rule, datetime(2025, 1, 1), datetime(2025, 1, 2)) is None
+
+def test_invalid_rule_raises_value_error():
+    with pytest.raises(ValueError):
+        next_occurrence("FREQ=SOMETIMES", datetime(2025, 1, 1), datetime(2025, 1, 1))
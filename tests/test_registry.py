@@ -0,0 +1,46 @@
+import sys
+import pytest
+from services import registry
+from services.registry import BUILTIN_PLATFORMS, MediaConstraints, PlatformRegistry, PlatformSpec
+
+class _EntryPoint:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return self.value
+
+def test_enabled_platforms_and_limit_overrides(monkeypatch):
+    monkeypatch.setattr(registry, "entry_points", lambda group: [])
+    monkeypatch.setenv("TWITTER_RATE_LIMIT_PER_HOUR", "300")
+    platforms = PlatformRegistry(enabled=["twitter", "linkedin"])
+
+    assert platforms.available() == list(BUILTIN_PLATFORMS)
+    assert platforms.names() == ["twitter", "linkedin"]
+    assert not platforms.is_enabled("instagram")
+    assert platforms.spec("instagram").media.max_items == 10
+    assert platforms.spec("twitter").limit("rate_limit_per_hour") == 300
+    assert platforms.spec("linkedin").limit("bulkhead_size") == 8
+    assert platforms.spec("twitter").limit("missing", 7) == 7
+    assert platforms.find("tiktok") is None
+    with pytest.raises(ValueError):
+        platforms.spec("tiktok")
+
+def test_plugins_are_loaded_lazily_and_override_builtins(monkeypatch):
+    mastodon = PlatformSpec("mastodon", "mastodon_plugin:MastodonIntegration", media=MediaConstraints(max_items=1))
+    linkedin = PlatformSpec("linkedin", "linkedin_plugin:LinkedInIntegration", capabilities=("publish",))
+    plugins = [_EntryPoint("mastodon", lambda: mastodon), _EntryPoint("linkedin", linkedin)]
+    monkeypatch.setattr(registry, "entry_points", lambda group: plugins if group == "test.platforms" else [])
+    platforms = PlatformRegistry(group="test.platforms", enabled=[])
+
+    assert platforms.names() == [*BUILTIN_PLATFORMS, "mastodon"]
+    assert [plugin.loads for plugin in plugins] == [0, 0]
+    assert platforms.spec("mastodon") is mastodon
+    assert platforms.spec("mastodon") is mastodon
+    assert platforms.spec("linkedin").integration == "linkedin_plugin:LinkedInIntegration"
+    assert not platforms.spec("linkedin").supports("sync")
+    assert [plugin.loads for plugin in plugins] == [1, 1]
+    assert "mastodon_plugin" not in sys.modules
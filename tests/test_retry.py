@@ -0,0 +1,18 @@
+import random
+from datetime import timedelta
+from services.retry import PublishError, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, is_retryable, retry_delay
+
+def test_backoff_grows_and_is_capped():
+    rng = random.Random(1)
+    delays = [retry_delay(attempts, rng) for attempts in range(1, 20)]
+
+    assert RETRY_BASE_SECONDS / 2 <= delays[0].total_seconds() <= RETRY_BASE_SECONDS
+    assert delays[3] > delays[0]
+    assert all(delay <= timedelta(seconds=RETRY_MAX_SECONDS) for delay in delays)
+
+def test_only_transient_errors_are_retried():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionError())
+    assert is_retryable(PublishError("503 Service Unavailable"))
+    assert not is_retryable(PublishError("content rejected", retryable=False))
+    assert not is_retryable(ValueError("Account not found"))
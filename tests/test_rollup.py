@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import AccountAnalytics, Engagement, ScheduledPost
+from services import rollup
+from services.leases import claim_job
+from services.registry import get_registry
+from services.rollup import AnalyticsRollup, record_engagement
+
+NOW = datetime(2025, 7, 1, 12, 0)
+
+def test_job_lease_is_held_by_one_worker_until_it_expires(db):
+    now = datetime(2025, 1, 1, 12)
+
+    assert claim_job("compaction", "worker-a", now, 3600)
+    assert not claim_job("compaction", "worker-b", now + timedelta(minutes=30), 3600)
+    # Chi tiene il lease lo rinnova al giro successivo
+    assert claim_job("compaction", "worker-a", now + timedelta(hours=1), 3600)
+    assert not claim_job("compaction", "worker-b", now + timedelta(hours=1, minutes=30), 3600)
+    # Un worker fermo perde il lease allo scadere
+    assert claim_job("compaction", "worker-b", now + timedelta(hours=2), 3600)
+
+def _like(db, post_id: int, likes: int):
+    """Scrittura come quella dei webhook: totale del post e incremento del rollup insieme"""
+    session = db()
+    try:
+        session.execute(update(Engagement).where(Engagement.post_id == post_id).values(likes=Engagement.likes + likes))
+        record_engagement(session, [(1, NOW, {"likes": likes})], NOW)
+        session.commit()
+    finally:
+        session.close()
+
+def _daily_likes(db) -> int:
+    session = db()
+    try:
+        return session.query(AccountAnalytics).filter_by(account_id=1, metric_date=NOW.date()).one().likes
+    finally:
+        session.close()
+
+def test_an_increment_during_the_backfill_is_counted_once(db, monkeypatch):
+    session = db()
+    post = ScheduledPost(account_id=1, content="post", scheduled_time=NOW, status="published")
+    session.add(post)
+    session.flush()
+    session.add(Engagement(post_id=post.id, likes=0, comments=0, shares=0))
+    session.commit()
+    post_id = post.id
+    session.close()
+    # Incremento già nel rollup prima della ricostruzione
+    _like(db, post_id, 5)
+
+    writer = threading.Thread(target=_like, args=(db, post_id, 2))
+    read_totals = rollup._post_totals
+
+    def totals_with_concurrent_write(session, account_id):
+        writer.start()
+        writer.join(timeout=0.3)
+        # La scrittura attende la fine della ricostruzione
+        assert writer.is_alive()
+        return read_totals(session, account_id)
+
+    monkeypatch.setattr(rollup, "_post_totals", totals_with_concurrent_write)
+    assert rollup._backfill_account(1, NOW) == 1
+    writer.join()
+
+    session = db()
+    assert session.query(Engagement).filter_by(post_id=post_id).one().likes == 7
+    session.close()
+    assert _daily_likes(db) == 7
+
+class InsightsManager:
+    registry = get_registry()
+    integrations = {}
+
+    def __init__(self):
+        self.insights_calls = 0
+
+    async def iter_insights(self, account_ids):
+        self.insights_calls += 1
+        return
+        yield
+
+def test_compaction_runs_in_the_worker_holding_the_lease(db):
+    manager = InsightsManager()
+    workers = [AnalyticsRollup(manager, worker_id=f"worker-{index}") for index in range(3)]
+
+    async def compact_everywhere():
+        return await asyncio.gather(*(worker.compact_if_claimed(3600) for worker in workers))
+
+    reports = asyncio.run(compact_everywhere())
+    assert [report is None for report in reports].count(False) == 1
+    assert manager.insights_calls == 1
+    # Al giro successivo lo stesso worker rinnova il lease, gli altri restano fermi
+    leader = workers[[report is not None for report in reports].index(True)]
+    assert asyncio.run(leader.compact_if_claimed(3600)) is not None
+    assert all(asyncio.run(worker.compact_if_claimed(3600)) is None for worker in workers if worker is not leader)
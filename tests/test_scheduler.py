@@ -0,0 +1,259 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from models import CrossPost, DeadLetter, ScheduledPost
+from services.circuit import CircuitOpenError
+from services.dispatch_queue import DispatchQueue
+from services.retry import MAX_PUBLISH_ATTEMPTS, PublishError
+from services.scheduler import CLAIM_BATCH_SIZE, ContentScheduler, decode_cursor, encode_cursor
+
+NOW = datetime(2025, 7, 1, 12, 0)
+
+def _add_posts(db, *rows):
+    session = db()
+    posts = [ScheduledPost(content=f"post {index}", status="scheduled", **row) for index, row in enumerate(rows)]
+    session.add_all(posts)
+    session.commit()
+    ids = [post.id for post in posts]
+    session.close()
+    return ids
+
+def _statuses(db):
+    session = db()
+    try:
+        return {post.id: post.status for post in session.query(ScheduledPost)}
+    finally:
+        session.close()
+
+def test_claimed_posts_are_not_claimed_again_until_the_lease_expires(db):
+    due, _ = _add_posts(db,
+                        {"account_id": 1, "scheduled_time": NOW - timedelta(minutes=1)},
+                        {"account_id": 2, "scheduled_time": NOW + timedelta(minutes=10)})
+    first, second = ContentScheduler("worker-a"), ContentScheduler("worker-b")
+
+    claimed = first.claim_due_posts(now=NOW, lease_seconds=60)
+    assert [post.id for post in claimed] == [due]
+    assert claimed[0].account.platform == "twitter"
+    assert second.claim_due_posts(now=NOW) == []
+
+    reclaimed = second.claim_due_posts(now=NOW + timedelta(seconds=61))
+    assert [post.id for post in reclaimed] == [due]
+    # Il lease ripreso da un altro worker non viene chiuso dal primo
+    assert first.complete_posts(claimed) == 0
+    assert second.complete_posts(reclaimed, platform_post_ids={due: "tweet-1"}) == 1
+
+    session = db()
+    post = session.get(ScheduledPost, due)
+    assert (post.status, post.platform_post_id, post.lease_expires_at) == ("published", "tweet-1", None)
+    session.close()
+
+def test_renewed_leases_are_not_reclaimed(db):
+    post_id, = _add_posts(db, {"account_id": 1, "scheduled_time": NOW - timedelta(minutes=1)})
+    first, second = ContentScheduler("worker-a"), ContentScheduler("worker-b")
+    claimed, = first.claim_due_posts(now=NOW, lease_seconds=60)
+
+    assert first.renew_leases({claimed.claimed_by: [post_id]}, now=NOW + timedelta(seconds=50), lease_seconds=60) == 1
+    assert second.claim_due_posts(now=NOW + timedelta(seconds=61)) == []
+    assert [post.id for post in second.claim_due_posts(now=NOW + timedelta(seconds=111))] == [post_id]
+    # Il lease passato a un altro worker non si rinnova più
+    assert first.renew_leases({claimed.claimed_by: [post_id]}, now=NOW + timedelta(seconds=120)) == 0
+
+def test_deferred_posts_wait_without_spending_an_attempt(db):
+    due, retrying = _add_posts(db, *(
+        {"account_id": 1, "scheduled_time": NOW - timedelta(minutes=1)} for _ in range(2)
+    ))
+    session = db()
+    session.get(ScheduledPost, retrying).attempts = 2
+    session.commit()
+    session.close()
+    scheduler = ContentScheduler("worker-a")
+    posts = {post.id: post for post in scheduler.claim_due_posts(now=NOW)}
+
+    later = NOW + timedelta(minutes=2)
+    assert scheduler.defer_posts([(posts[due], later), (posts[retrying], later)]) == 2
+    assert _statuses(db) == {due: "scheduled", retrying: "retrying"}
+    assert scheduler.claim_due_posts(now=NOW + timedelta(minutes=1)) == []
+    assert [post.id for post in scheduler.claim_due_posts(now=later)] == [due]
+    reclaimed, = scheduler.claim_retry_posts(now=later)
+    assert (reclaimed.id, reclaimed.attempts) == (retrying, 2)
+
+def test_failed_posts_are_retried_or_dead_lettered(db):
+    retryable, invalid, exhausted = _add_posts(db, *(
+        {"account_id": 1, "scheduled_time": NOW - timedelta(minutes=1)} for _ in range(3)
+    ))
+    session = db()
+    session.get(ScheduledPost, exhausted).attempts = MAX_PUBLISH_ATTEMPTS - 1
+    session.commit()
+    session.close()
+    scheduler = ContentScheduler("worker-a")
+    posts = {post.id: post for post in scheduler.claim_due_posts(now=NOW)}
+
+    retried, dead = scheduler.fail_posts([
+        (posts[retryable], PublishError("timeout")),
+        (posts[invalid], ValueError("content too long")),
+        (posts[exhausted], PublishError("timeout"))
+    ], now=NOW)
+
+    assert (retried, dead) == (1, 2)
+    assert _statuses(db) == {retryable: "retrying", invalid: "failed", exhausted: "failed"}
+    assert scheduler.claim_retry_posts(now=NOW) == []
+    assert [post.id for post in scheduler.claim_retry_posts(now=NOW + timedelta(hours=2))] == [retryable]
+    session = db()
+    assert sorted(letter.post_id for letter in session.query(DeadLetter)) == [invalid, exhausted]
+    session.close()
+
+class _StalledDispatcher:
+    """Coda di instagram piena finché `release` non viene impostato; le altre accettano subito"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.submitted = []
+
+    async def submit(self, post, platform, retry=False):
+        if platform == "instagram":
+            await self.release.wait()
+        self.submitted.append(platform)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result({"id": f"{platform}-{post.id}"})
+        return future
+
+def test_a_full_platform_queue_does_not_block_the_others(db):
+    now = datetime.now()
+    _add_posts(db, *(
+        [{"account_id": 2, "scheduled_time": now - timedelta(minutes=10)}] * (CLAIM_BATCH_SIZE + 50) +
+        [{"account_id": 1, "scheduled_time": now - timedelta(minutes=1)}] * 20
+    ))
+    scheduler = ContentScheduler("worker-a")
+    dispatcher = _StalledDispatcher()
+
+    async def dispatch():
+        claimed = await asyncio.wait_for(scheduler.dispatch_due(dispatcher), timeout=5)
+        await asyncio.sleep(0.1)
+        assert dispatcher.submitted == ["twitter"] * 20
+        # instagram ha già un blocco intero in attesa: i suoi altri post restano nel database
+        assert await asyncio.wait_for(scheduler.dispatch_due(dispatcher), timeout=5) == 0
+
+        dispatcher.release.set()
+        stalled = set().union(*scheduler._in_flight.values())
+        assert len(stalled) >= CLAIM_BATCH_SIZE
+        while scheduler._pending:
+            await asyncio.gather(*scheduler._pending)
+        assert not scheduler._in_flight
+        return claimed + await scheduler.dispatch_due(dispatcher)
+
+    assert asyncio.run(dispatch()) == CLAIM_BATCH_SIZE + 70
+    assert list(_statuses(db).values()).count("published") == CLAIM_BATCH_SIZE + 20
+
+class _OpenCircuitDispatcher:
+    async def submit(self, post, platform, retry=False):
+        future = asyncio.get_running_loop().create_future()
+        future.set_exception(CircuitOpenError(f"{platform} circuit open", retry_after=30))
+        return future
+
+def test_fast_failed_posts_wait_for_the_circuit_without_spending_attempts(db):
+    post_id, = _add_posts(db, {"account_id": 1, "scheduled_time": datetime.now() - timedelta(minutes=1)})
+    scheduler = ContentScheduler("worker-a")
+
+    async def dispatch():
+        await scheduler.dispatch_due(_OpenCircuitDispatcher())
+        while scheduler._pending:
+            await asyncio.gather(*scheduler._pending)
+
+    before = datetime.now()
+    asyncio.run(dispatch())
+
+    session = db()
+    post = session.get(ScheduledPost, post_id)
+    assert (post.status, post.attempts) == ("scheduled", 0)
+    assert before + timedelta(seconds=29) < post.next_attempt_at < datetime.now() + timedelta(seconds=31)
+    assert session.query(DeadLetter).count() == 0
+    session.close()
+
+class _RecordingDispatcher:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, post, platform, retry=False):
+        self.submitted.append(post.id)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result({"id": f"{platform}-{post.id}"})
+        return future
+
+def test_queued_posts_are_claimed_by_id_before_the_fallback_scan(db):
+    older, queued = _add_posts(db,
+                               {"account_id": 1, "scheduled_time": NOW - timedelta(minutes=5)},
+                               {"account_id": 2, "scheduled_time": NOW - timedelta(minutes=1)})
+    queue = DispatchQueue()
+    queue.push(NOW - timedelta(minutes=1), queued)
+    scheduler = ContentScheduler("worker-a", clock=lambda: NOW, queue=queue)
+    dispatcher = _RecordingDispatcher()
+
+    async def dispatch():
+        claimed = await scheduler.dispatch_due(dispatcher)
+        while scheduler._pending:
+            await asyncio.gather(*scheduler._pending)
+        return claimed
+
+    # il post in coda passa per primo anche se scade dopo; l'altro, creato
+    # senza passare da questa coda, arriva dalla scansione
+    assert asyncio.run(dispatch()) == 2
+    assert dispatcher.submitted == [queued, older]
+    assert len(queue) == 0
+
+def test_cross_post_content_is_stored_once_and_resolved_when_claimed(db):
+    scheduler = ContentScheduler("worker-a", queue=DispatchQueue())
+    cross_post, post_ids = scheduler.schedule_cross_post(
+        [1, 2, 3], "lancio", ["https://example.com/a.jpg"], scheduled_time=NOW - timedelta(minutes=1)
+    )
+
+    session = db()
+    assert session.query(CrossPost).count() == 1
+    assert {(post.content, post.media_urls) for post in session.query(ScheduledPost)} == {(None, None)}
+    session.close()
+
+    claimed = scheduler.claim_due_posts(now=NOW)
+    assert sorted(post.id for post in claimed) == sorted(post_ids)
+    assert {(post.content, tuple(post.media_urls)) for post in claimed} == {("lancio", ("https://example.com/a.jpg",))}
+    assert scheduler.complete_posts(claimed) == 3
+    # I valori risolti non vengono copiati nelle righe dei post
+    session = db()
+    assert {post.content for post in session.query(ScheduledPost)} == {None}
+    session.close()
+    assert [post.content for post in scheduler.get_scheduled_posts(2)] == ["lancio"]
+
+def test_bulk_insert_returns_ids_in_order_and_rejects_missing_accounts(db):
+    scheduler = ContentScheduler("worker-a", queue=DispatchQueue())
+    posts = [
+        {"account_id": account_id, "content": f"post {index}", "scheduled_time": NOW + timedelta(minutes=index)}
+        for index, account_id in enumerate([1, 2, 3, 4, 1])
+    ]
+
+    post_ids = scheduler.schedule_posts_bulk(posts)
+    session = db()
+    assert [session.get(ScheduledPost, post_id).content for post_id in post_ids] == [post["content"] for post in posts]
+    session.close()
+
+    with pytest.raises(ValueError, match="99"):
+        scheduler.schedule_posts_bulk([{"account_id": 1, "content": "ok"}, {"account_id": 99, "content": "ko"}])
+    # Nessuna riga del blocco rifiutato viene scritta
+    assert len(_statuses(db)) == len(posts)
+
+def test_keyset_pages_cover_every_post_once_including_ties(db):
+    # Tre post nello stesso istante: il cursore distingue per id
+    times = [NOW, NOW, NOW, NOW + timedelta(minutes=5), NOW + timedelta(minutes=10)]
+    expected = _add_posts(db, *({"account_id": 1, "scheduled_time": time} for time in times))
+    _add_posts(db, {"account_id": 2, "scheduled_time": NOW})
+    scheduler = ContentScheduler("worker-a", queue=DispatchQueue())
+
+    seen, cursor = [], None
+    while True:
+        page = scheduler.get_scheduled_posts(1, cursor=cursor, limit=2)
+        seen.extend(post.id for post in page)
+        if len(page) < 2:
+            break
+        cursor = encode_cursor(page[-1])
+        assert decode_cursor(cursor) == (page[-1].scheduled_time, page[-1].id)
+    assert seen == expected
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        scheduler.get_scheduled_posts(1, cursor="not-a-cursor")
@@ -0,0 +1,21 @@
+from datetime import timedelta
+from services.simulation import SIMULATION_EPOCH, LatencyModel, SchedulerSimulation
+from services.smoothing import PLATFORMS
+
+def test_calendar_is_published_by_the_scheduler_in_virtual_time():
+    # 40 post su 4 account (uno per piattaforma), a gruppi di 10 ogni 10 minuti
+    calendar = [
+        {"id": post_id, "account_id": post_id % 4 + 1,
+         "scheduled_time": SIMULATION_EPOCH + timedelta(minutes=10 * (post_id // 10))}
+        for post_id in range(40)
+    ]
+    latencies = {platform: LatencyModel(median=0.5, sigma=0.01) for platform in PLATFORMS}
+    report = SchedulerSimulation(calendar, latencies, sample_interval=60).run()
+
+    assert report["posts"] == report["published"] == 40
+    assert report["failed"] == 0
+    assert report["dispatch_lag"]["count"] == 40
+    # Ogni post esce entro il ciclo dello scheduler e la latenza della piattaforma
+    assert report["dispatch_lag"]["max_seconds"] < 2
+    assert 30 * 60 <= report["virtual_seconds"] <= 32 * 60
+    assert report["wall_seconds"] < 30
@@ -0,0 +1,35 @@
+from services.smoothing import BurstSmoother
+
+def test_offset_is_stable_and_inside_window():
+    smoother = BurstSmoother(windows={"twitter": 60}, rates={"twitter": 0})
+    offsets = {smoother.offset(account_id, "twitter") for account_id in range(200)}
+
+    assert all(0 <= offset < 60 for offset in offsets)
+    assert len(offsets) > 100
+    assert smoother.offset(7, "twitter") == BurstSmoother(windows={"twitter": 60}).offset(7, "twitter")
+
+def test_disabled_window_keeps_posts_on_time():
+    smoother = BurstSmoother(windows={"linkedin": 0}, rates={"linkedin": 0})
+    assert not BurstSmoother(windows={p: 0 for p in ("twitter", "instagram", "facebook", "linkedin")}).enabled
+    assert smoother.delay(1, "linkedin", seconds_until_due=0, now=100.0) == 0.0
+
+def test_platform_rate_is_never_exceeded():
+    smoother = BurstSmoother(windows={"instagram": 0}, rates={"instagram": 2})
+    delays = [smoother.delay(account_id, "instagram", 0, now=100.0) for account_id in range(10)]
+
+    per_second = {}
+    for delay in delays:
+        per_second[int(100.0 + delay)] = per_second.get(int(100.0 + delay), 0) + 1
+    assert max(per_second.values()) <= 2
+    assert max(delays) < 5
+
+def test_overflow_beyond_max_delay_is_not_reserved():
+    smoother = BurstSmoother(windows={"instagram": 600}, rates={"instagram": 2}, max_delay=5)
+    delays = [smoother.delay(account_id, "instagram", 0, now=100.0) for account_id in range(20)]
+
+    assert smoother.windows["instagram"] == 5
+    placed = [delay for delay in delays if delay is not None]
+    assert all(delay <= 5 for delay in placed)
+    assert 0 < len(placed) <= 11 and None in delays
+    # I post rinviati non hanno consumato capacità: più tardi trovano posto
+    assert smoother.delay(0, "instagram", 0, now=200.0) is not None
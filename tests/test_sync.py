@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta
+from models import PostComment, ScheduledPost, SyncCursor
+from services.registry import get_registry
+from services.sync import SyncManager
+
+START = datetime(2025, 7, 1, 12, 0)
+
+class PagedIntegration:
+    """Piattaforma finta: post in ordine di id, due per pagina dopo `since_id`"""
+
+    def __init__(self):
+        self.posts = []
+        self.comments = []
+        self.calls = []
+
+    def publish(self, comments=0):
+        post_id = str(len(self.posts) + 1)
+        self.posts.append({"id": post_id, "content": f"post {post_id}",
+                           "created_at": START + timedelta(minutes=len(self.posts)),
+                           "metrics": {"likes": 0, "comments": comments, "shares": 0}})
+        for number in range(comments):
+            self.comments.append({"id": f"{post_id}-{number}", "post_id": post_id, "text": "bello"})
+
+    async def sync_posts(self, access_token, cursor, since):
+        self.calls.append(("posts", dict(cursor)))
+        since_id = int(cursor.get("since_id", 0))
+        page = [post for post in self.posts if int(post["id"]) > since_id][:2]
+        next_cursor = {"since_id": page[-1]["id"]} if page else dict(cursor)
+        return page, next_cursor, len(page) < 2
+
+    async def fetch_comments(self, access_token, post_ids, since):
+        self.calls.append(("comments", sorted(post_ids)))
+        return [comment for comment in self.comments if comment["post_id"] in post_ids]
+
+class FakeManager:
+    registry = get_registry()
+    # Solo twitter (account 1) viene sincronizzato dal ciclo
+    integrations = {"twitter": "tests:PagedIntegration"}
+
+    def __init__(self, integration):
+        self._integration = integration
+
+    def integration(self, platform):
+        return self._integration
+
+    async def call(self, account, call, pool="publish"):
+        return await call("token")
+
+def test_second_sync_reads_only_what_changed_since_the_cursor(db):
+    integration = PagedIntegration()
+    for comments in (0, 2, 0):
+        integration.publish(comments)
+    sync = SyncManager(manager=FakeManager(integration))
+
+    first = asyncio.run(sync.sync_account(1, ("posts", "comments")))
+    assert (first["posts_imported"], first["comments_imported"]) == (3, 2)
+    assert integration.calls == [("posts", {}), ("posts", {"since_id": "2"}), ("comments", ["2"])]
+
+    integration.calls.clear()
+    integration.publish(comments=1)
+    second = asyncio.run(sync.sync_account(1, ("posts", "comments")))
+    assert (second["posts_imported"], second["comments_imported"]) == (1, 1)
+    # Si riparte dal cursore salvato e si leggono solo i commenti del post nuovo
+    assert integration.calls == [("posts", {"since_id": "3"}), ("comments", ["4"])]
+
+    session = db()
+    assert session.query(ScheduledPost).filter_by(account_id=1, status="published").count() == 4
+    assert session.query(PostComment).count() == 3
+    cursor = session.query(SyncCursor).filter_by(account_id=1, resource="posts").one()
+    assert cursor.cursor == {"since_id": "4"} and cursor.watermark == integration.posts[-1]["created_at"]
+    session.close()
+
+def test_a_stale_account_is_synced_by_one_worker_only(db):
+    integration = PagedIntegration()
+    for comments in (0, 0, 0):
+        integration.publish(comments)
+    workers = [SyncManager(manager=FakeManager(integration)) for _ in range(2)]
+
+    async def both():
+        return await asyncio.gather(*(worker.sync_stale() for worker in workers))
+
+    assert sorted(asyncio.run(both())) == [0, 1]
+    assert [call for call in integration.calls if call[0] == "posts"] == [("posts", {}), ("posts", {"since_id": "2"})]
+    session = db()
+    assert session.query(ScheduledPost).filter_by(account_id=1).count() == 3
+    session.close()
+    # L'account appena sincronizzato non è più da sincronizzare
+    assert asyncio.run(workers[0].sync_stale()) == 0
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from models import SocialAccount
+from services.tokens import TokenManager
+
+class RefreshingIntegration:
+    def __init__(self):
+        self.refreshes = 0
+
+    async def refresh_token(self, access_token, refresh_token):
+        self.refreshes += 1
+        await asyncio.sleep(0.01)
+        return {"access_token": f"token-{self.refreshes}", "refresh_token": "refresh", "expires_in": 3600}
+
+def test_concurrent_callers_share_a_single_refresh(db):
+    session = db()
+    account = session.get(SocialAccount, 1)
+    account.token_expires_at = datetime.now() - timedelta(minutes=1)
+    session.commit()
+    session.close()
+
+    integration = RefreshingIntegration()
+    invalidated = []
+    manager = SimpleNamespace(
+        integration=lambda platform: integration,
+        insights_cache=SimpleNamespace(invalidate=invalidated.append)
+    )
+    tokens = TokenManager(manager)
+    expired = SimpleNamespace(id=1, access_token="token", token_expires_at=datetime.now() - timedelta(minutes=1))
+
+    async def many_callers():
+        return await asyncio.gather(*(tokens.access_token(expired) for _ in range(10)))
+
+    assert asyncio.run(many_callers()) == ["token-1"] * 10
+    assert integration.refreshes == 1
+    assert invalidated == [1]
+
+    session = db()
+    stored = session.get(SocialAccount, 1)
+    assert stored.access_token == "token-1" and stored.token_expires_at > datetime.now()
+    session.close()
+
+def test_only_one_worker_runs_the_proactive_refresh(db):
+    session = db()
+    for account_id in (1, 2):
+        session.get(SocialAccount, account_id).token_expires_at = datetime.now() + timedelta(minutes=5)
+    session.commit()
+    session.close()
+
+    integration = RefreshingIntegration()
+    manager = SimpleNamespace(
+        integration=lambda platform: integration,
+        insights_cache=SimpleNamespace(invalidate=lambda account_id: None)
+    )
+    workers = [TokenManager(manager, worker_id=f"worker-{index}") for index in range(3)]
+
+    async def sweep_everywhere():
+        return await asyncio.gather(*(worker.sweep(60) for worker in workers))
+
+    assert sorted(asyncio.run(sweep_everywhere()), key=str) == [2, None, None]
+    # Un rinnovo per account, non uno per worker
+    assert integration.refreshes == 2
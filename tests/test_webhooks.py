@@ -0,0 +1,105 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import pytest
+from services.webhook_events import challenge_response, delivery_id, parse_events, verify_signature
+from services.webhooks import WebhookBuffer
+
+SECRET = "app-secret"
+
+def _sign(body: bytes) -> bytes:
+    return hmac.new(SECRET.encode(), body, hashlib.sha256).digest()
+
+def test_signatures_and_challenges_per_platform():
+    body = json.dumps({"entry": []}).encode()
+    digest = _sign(body)
+
+    assert verify_signature("facebook", body, {"X-Hub-Signature-256": "sha256=" + digest.hex()}, SECRET)
+    assert verify_signature("twitter", body, {"x-twitter-webhooks-signature": "sha256=" + base64.b64encode(digest).decode()}, SECRET)
+    assert verify_signature("linkedin", body, {"X-LI-Signature": digest.hex()}, SECRET)
+    assert not verify_signature("facebook", body + b" ", {"X-Hub-Signature-256": "sha256=" + digest.hex()}, SECRET)
+    assert not verify_signature("facebook", body, {}, SECRET)
+
+    meta = {"hub.mode": "subscribe", "hub.verify_token": "verify", "hub.challenge": "42"}
+    assert challenge_response("instagram", meta, verify_token="verify") == "42"
+    assert challenge_response("instagram", {**meta, "hub.verify_token": "other"}, verify_token="verify") is None
+    crc = challenge_response("twitter", {"crc_token": "abc"}, secret=SECRET)
+    assert crc == {"response_token": "sha256=" + base64.b64encode(_sign(b"abc")).decode()}
+
+def test_parse_events_normalises_engagement():
+    facebook = parse_events("facebook", {"entry": [{"changes": [
+        {"field": "feed", "value": {"item": "reaction", "verb": "add", "post_id": "1_2"}},
+        {"field": "feed", "value": {"item": "reaction", "verb": "remove", "post_id": "1_2"}},
+        {"field": "feed", "value": {"item": "comment", "verb": "add", "post_id": "1_2", "comment_id": "c1",
+                                    "message": "Bello!", "from": {"name": "Anna"}, "created_time": 1700000000}}
+    ]}]})
+    assert [(event["kind"], event["delta"]) for event in facebook] == [("like", 1), ("like", -1), ("comment", 1)]
+    assert facebook[2]["comment"]["id"] == "c1" and facebook[2]["comment"]["author"] == "Anna"
+
+    twitter = parse_events("twitter", {
+        "tweet_create_events": [
+            {"id_str": "9", "text": "@me ciao", "in_reply_to_status_id_str": "5", "user": {"screen_name": "bob"}},
+            {"id_str": "10", "retweeted_status": {"id_str": "5"}}
+        ],
+        "favorite_events": [{"favorited_status": {"id_str": "5"}}]
+    })
+    assert [(event["kind"], event["post_id"]) for event in twitter] == [("comment", "5"), ("share", "5"), ("like", "5")]
+    assert parse_events("tiktok", {"anything": 1}) == []
+
+def _like(post_id="fb-1"):
+    return {"platform": "facebook", "kind": "like", "post_id": post_id, "delta": 1, "comment": None}
+
+def _published(db):
+    from models import ScheduledPost
+    session = db()
+    session.add(ScheduledPost(account_id=3, content="post", status="published", platform_post_id="fb-1"))
+    session.commit()
+    session.close()
+
+def _likes(db):
+    from models import Engagement
+    session = db()
+    try:
+        return [engagement.likes for engagement in session.query(Engagement)]
+    finally:
+        session.close()
+
+def test_redelivered_events_are_counted_once(db):
+    _published(db)
+    body = json.dumps({"entry": [1]}).encode()
+
+    async def deliver():
+        first, other_worker = WebhookBuffer(), WebhookBuffer()
+        accepted = [await first.add([_like()], delivery_id=delivery_id("facebook", body)),
+                    await first.add([_like()], delivery_id=delivery_id("facebook", body))]
+        await first.flush()
+        accepted.append(await other_worker.add([_like()], delivery_id=delivery_id("facebook", body)))
+        await other_worker.flush()
+        return accepted
+
+    assert asyncio.run(deliver()) == [True, False, True]
+    assert _likes(db) == [1]
+
+def test_failing_deliveries_are_dead_lettered_without_failing_the_request(db):
+    from models import WebhookDeadLetter
+    _published(db)
+    poison = {**_like(), "kind": "follow"}
+
+    async def deliver():
+        buffer = WebhookBuffer(max_events=2, max_attempts=2)
+        await buffer.add([_like()], delivery_id="facebook:good")
+        # Il buffer pieno attende la scrittura, che fallisce: la consegna è comunque accettata
+        assert await buffer.add([poison], delivery_id="facebook:poison")
+        assert len(buffer) == 2
+        with pytest.raises(KeyError):
+            await buffer.flush()
+        return len(buffer)
+
+    assert asyncio.run(deliver()) == 0
+    assert _likes(db) == [1]
+    session = db()
+    letter, = session.query(WebhookDeadLetter)
+    assert (letter.delivery_id, letter.attempts, letter.events[0]["kind"]) == ("facebook:poison", 2, "follow")
+    session.close()